@@ -4,8 +4,81 @@ from dotenv import load_dotenv
 load_dotenv()
 
 KB_PATH="knowledge_base"
+# Размер чанка и перекрытие (в приблизительных токенах)
+CHUNK_SIZE=int(os.getenv("CHUNK_SIZE", "400"))
+CHUNK_OVERLAP=int(os.getenv("CHUNK_OVERLAP", "50"))
+# Разбор PDF/DOCX в пуле процессов (0 — по числу ядер), таймаут на файл в секундах
+PARSER_MAX_WORKERS=int(os.getenv("PARSER_MAX_WORKERS", "0")) or None
+PARSER_TIMEOUT=float(os.getenv("PARSER_TIMEOUT", "120"))
+PDF_PAGES_PER_TASK=int(os.getenv("PDF_PAGES_PER_TASK", "16"))
 CHROMA_DEFAULT_URL="http://localhost:8016"
 YANDEX_API_KEY=os.getenv("YANDEX_CLOUD_API_KEY")
 YANDEX_FOLDER_ID=os.getenv("YANDEX_CLOUD_FOLDER")
 yandex_api_key=os.getenv("YANDEX_CLOUD_API_KEY")
-yandex_folder_id=os.getenv("YANDEX_CLOUD_FOLDER")
\ No newline at end of file
+yandex_folder_id=os.getenv("YANDEX_CLOUD_FOLDER")
+
+# Провайдер эмбеддингов: yandex (Yandex Cloud) или hashing (локальный, без сети).
+# Векторы разных провайдеров несовместимы — для hashing нужна отдельная Chroma.
+EMBEDDING_PROVIDER=os.getenv("EMBEDDING_PROVIDER", "yandex")
+EMBEDDING_HASHING_DIM=int(os.getenv("EMBEDDING_HASHING_DIM", "1024"))
+
+# Yandex: ~10 RPS на эмбеддинги
+EMBEDDING_RPS=float(os.getenv("EMBEDDING_RPS", "10"))
+EMBEDDING_MAX_CONCURRENCY=int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+
+# Дисковый кэш эмбеддингов (пустая строка — отключить)
+EMBEDDING_CACHE_PATH=os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_DTYPE=os.getenv("EMBEDDING_CACHE_DTYPE", "float32")  # float32 | float16
+
+# Загрузка файлов через API: максимальный размер одного файла (в байтах) и размер блока чтения
+MAX_UPLOAD_BYTES=int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES=int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Фоновая очередь загрузки: сколько файлов обрабатывается параллельно и сколько заданий помнить
+INGEST_MAX_WORKERS=int(os.getenv("INGEST_MAX_WORKERS", "2"))
+INGEST_MAX_JOBS=int(os.getenv("INGEST_MAX_JOBS", "1000"))
+# Запись в Chroma пачками не больше стольких чанков
+CHROMA_UPSERT_BATCH=int(os.getenv("CHROMA_UPSERT_BATCH", "256"))
+# Наблюдение за knowledge_base (--watch-kb): период опроса и пауза после последнего изменения, сек
+KB_WATCH_INTERVAL=float(os.getenv("KB_WATCH_INTERVAL", "1"))
+KB_WATCH_DEBOUNCE=float(os.getenv("KB_WATCH_DEBOUNCE", "2"))
+# Изменения базы знаний из других процессов (загрузки через API): период чтения манифеста в MCP-процессе, сек (0 — выключено)
+KB_CHANGES_POLL_INTERVAL=float(os.getenv("KB_CHANGES_POLL_INTERVAL", "5"))
+# Поиск контекста для generate_sql: semantic, hybrid (семантика + BM25) или hybrid_with_prompting
+GENERATE_SQL_SEARCH=os.getenv("GENERATE_SQL_SEARCH", "semantic")
+# Почти-дубликаты при загрузке: порог сходства Жаккара по MinHash (0 — не искать)
+DEDUP_THRESHOLD=float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+# Снимок BM25 на диске (knowledge_base/.bm25), открывается через mmap при старте
+BM25_SNAPSHOT=os.getenv("BM25_SNAPSHOT", "1") == "1"
+# BM25: слияние сегментов, когда их больше N или доля удалённых документов выше порога
+BM25_MAX_SEGMENTS=int(os.getenv("BM25_MAX_SEGMENTS", "8"))
+BM25_MERGE_DELETED_RATIO=float(os.getenv("BM25_MERGE_DELETED_RATIO", "0.2"))
+# Шардированный BM25: число процессов-шардов (0 — поиск в текущем процессе) и минимальный размер индекса для шардирования
+BM25_SHARDS=int(os.getenv("BM25_SHARDS", "0"))
+BM25_SHARD_MIN_DOCS=int(os.getenv("BM25_SHARD_MIN_DOCS", "200000"))
+# Как часто общий BM25-индекс сверяет версию базы знаний на диске, сек
+BM25_VERSION_CHECK_INTERVAL=float(os.getenv("BM25_VERSION_CHECK_INTERVAL", "5"))
+# Гибридный поиск: потоки для параллельных веток (≈ одновременные запросы × 3 ветки; столько же веток в работе максимум)
+# и сколько ждать каждую ветку от её запуска (сек, включая эмбеддинг запроса)
+RETRIEVAL_MAX_WORKERS=int(os.getenv("RETRIEVAL_MAX_WORKERS", "32"))
+RETRIEVAL_SEMANTIC_TIMEOUT=float(os.getenv("RETRIEVAL_SEMANTIC_TIMEOUT", "10"))
+RETRIEVAL_BM25_TIMEOUT=float(os.getenv("RETRIEVAL_BM25_TIMEOUT", "2"))
+# Слияние результатов гибридного поиска: rrf, weighted или normalized, и веса семантики и BM25
+HYBRID_FUSION_MODE=os.getenv("HYBRID_FUSION_MODE", "rrf")
+if HYBRID_FUSION_MODE not in ("rrf", "weighted", "normalized"):  # src.utils.fusion.FUSION_MODES
+    raise ValueError(f"Неизвестный HYBRID_FUSION_MODE: {HYBRID_FUSION_MODE}, доступны rrf, weighted, normalized")
+HYBRID_SEMANTIC_WEIGHT=float(os.getenv("HYBRID_SEMANTIC_WEIGHT", "1"))
+HYBRID_BM25_WEIGHT=float(os.getenv("HYBRID_BM25_WEIGHT", "1"))
+# Локальное зеркало коллекций Chroma для семантического поиска без HTTP: коллекции и сжатие векторов (float32 | float16 | int8, PCA 0 — без PCA)
+VECTOR_MIRROR=os.getenv("VECTOR_MIRROR", "0") == "1"
+VECTOR_MIRROR_COLLECTIONS=os.getenv("VECTOR_MIRROR_COLLECTIONS", "docs,sql_examples,t2t_docs").split(",")
+VECTOR_MIRROR_REFRESH=float(os.getenv("VECTOR_MIRROR_REFRESH", "30"))
+VECTOR_INDEX_DTYPE=os.getenv("VECTOR_INDEX_DTYPE", "int8")
+VECTOR_INDEX_PCA_COMPONENTS=int(os.getenv("VECTOR_INDEX_PCA_COMPONENTS", "0"))
+# Семантический кэш ответов generate_sql и search_knowledge_base_tool: размер (0 — выключен), порог косинусной близости вопросов, TTL в сек
+ANSWER_CACHE_MAX_ENTRIES=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_THRESHOLD=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL=float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Кэш шаблонов SQL (вопросы, различающиеся только числами, датами и именами в кавычках): размер (0 — выключен), TTL в сек
+SQL_TEMPLATE_CACHE_MAX_ENTRIES=int(os.getenv("SQL_TEMPLATE_CACHE_MAX_ENTRIES", "1000"))
+SQL_TEMPLATE_CACHE_TTL=float(os.getenv("SQL_TEMPLATE_CACHE_TTL", "3600"))
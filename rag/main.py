@@ -4,17 +4,26 @@ import asyncio
 import threading
 import time
 
-from src.utils.kb_loader import load_knowledge_base_to_chroma, kb_loader
+from src.utils.kb_loader import load_knowledge_base_to_chroma, kb_loader, KBWatcher, KBChangeFeed
 from src.utils.clients.embedding_client import get_chroma_client
 import src.core.service.generate_sql.only_semantic as sql_only_semantic
 import src.core.service.generate_sql.hybrid as sql_hybrid
 import src.core.service.generate_sql.hybrid_with_prompting as sql_hybrid_with_prompting
-from src.core.service import GenerateTextService
+from src.core.service import GenerateTextService, CachedGenerateService, SQLTemplateCachedService
 from src.core.transport.agents.mcp_server import run_mcp_server
 from langchain_openai import ChatOpenAI
 import psycopg
 
-from config import yandex_api_key, yandex_folder_id
+from src.utils.vector_index import LocalVectorMirror, MirroredChromaClient
+from src.utils.answer_cache import SemanticAnswerCache, question_literals
+from src.utils.sql_template_cache import SQLTemplateCache, question_constraints
+from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME, T2T_DOCS_COLLECTION_NAME
+from config import (
+    yandex_api_key, yandex_folder_id, KB_WATCH_INTERVAL, KB_WATCH_DEBOUNCE, KB_CHANGES_POLL_INTERVAL, GENERATE_SQL_SEARCH,
+    VECTOR_MIRROR, VECTOR_MIRROR_COLLECTIONS, VECTOR_MIRROR_REFRESH, VECTOR_INDEX_DTYPE, VECTOR_INDEX_PCA_COMPONENTS,
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL,
+    SQL_TEMPLATE_CACHE_MAX_ENTRIES, SQL_TEMPLATE_CACHE_TTL,
+)
 
 from fastmcp import Client
 
@@ -27,6 +36,35 @@ async def run_mcp_client():
         result = await client.call_tool("generate_sql", {"query": "Покажи мне всех сотрудников с зарплатой больше 100000"})
         print(f"Result: {result.content[0].text}")
 
+# Коллекции, от которых зависят кэшированные ответы
+KB_COLLECTIONS = (DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME, T2T_DOCS_COLLECTION_NAME)
+
+def with_answer_cache(service, embedding_fn, question_key=question_literals):
+    """Семантический кэш ответов перед сервисом; сбрасывается при изменении базы знаний"""
+    if not ANSWER_CACHE_MAX_ENTRIES:
+        return service
+    cache = SemanticAnswerCache(
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        kb_loader=kb_loader,
+        kb_version=lambda: kb_loader.files_fingerprint(KB_COLLECTIONS),
+        question_key=question_key,
+    )
+    return CachedGenerateService(service, embedding_fn, cache)
+
+def with_sql_template_cache(service):
+    """Кэш шаблонов SQL перед сервисом: отвечает без эмбеддинга, поиска и LLM"""
+    if not SQL_TEMPLATE_CACHE_MAX_ENTRIES:
+        return service
+    cache = SQLTemplateCache(
+        max_entries=SQL_TEMPLATE_CACHE_MAX_ENTRIES,
+        ttl=SQL_TEMPLATE_CACHE_TTL,
+        kb_loader=kb_loader,
+        kb_version=lambda: kb_loader.files_fingerprint(KB_COLLECTIONS),
+    )
+    return SQLTemplateCachedService(service, cache)
+
 def run_app():
     """Create and configure the application."""
     
@@ -37,6 +75,22 @@ def run_app():
         yandex_folder_id=yandex_folder_id
     )
 
+    if KB_CHANGES_POLL_INTERVAL:
+        # Загрузки через API идут в отдельном процессе (uvicorn): их изменения подписчики kb_loader получают через манифест
+        KBChangeFeed(kb_loader, interval=KB_CHANGES_POLL_INTERVAL).start()
+
+    if VECTOR_MIRROR:
+        # Семантический поиск по локальной копии коллекций; запись и источник истины — Chroma
+        mirror = LocalVectorMirror(
+            chroma_client,
+            kb_loader,
+            collections=VECTOR_MIRROR_COLLECTIONS,
+            dtype=VECTOR_INDEX_DTYPE,
+            pca_components=VECTOR_INDEX_PCA_COMPONENTS,
+            refresh_interval=VECTOR_MIRROR_REFRESH,
+        ).load()
+        chroma_client = MirroredChromaClient(chroma_client, mirror)
+
     # Create LLM client
     llm = ChatOpenAI(
         api_key=yandex_api_key,
@@ -48,9 +102,18 @@ def run_app():
     # The actual logic is now in setup.py which serves as the main entry point
     # This file can be used for simple demonstrations or testing
     # Create SQL generation service
-    generate_sql_service = sql_only_semantic.GenerateSQLService(chroma_client, embedding_fn, llm)
-    # generate_sql_service = sql_hybrid_with_prompting.GenerateSQLService(chroma_client, embedding_fn, llm, kb_loader)
+    if GENERATE_SQL_SEARCH == "hybrid":
+        generate_sql_service = sql_hybrid.GenerateSQLService(chroma_client, embedding_fn, llm, kb_loader)
+    elif GENERATE_SQL_SEARCH == "hybrid_with_prompting":
+        generate_sql_service = sql_hybrid_with_prompting.GenerateSQLService(chroma_client, embedding_fn, llm, kb_loader)
+    else:
+        generate_sql_service = sql_only_semantic.GenerateSQLService(chroma_client, embedding_fn, llm)
     generate_text_service = GenerateTextService(chroma_client, embedding_fn, llm)
+    generate_sql_service = with_sql_template_cache(
+        # Похожие по смыслу вопросы с разными условиями («больше»/«меньше», «не») дают разный SQL
+        with_answer_cache(generate_sql_service, embedding_fn, question_key=question_constraints)
+    )
+    generate_text_service = with_answer_cache(generate_text_service, embedding_fn)
 
     db_params = {
         "host": "localhost",
@@ -66,16 +129,25 @@ def run_app():
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--load-kb", action="store_true", help="Load knowledge base to Chroma")
+    parser.add_argument("--sync-kb", action="store_true", help="Sync changed knowledge base files to Chroma and exit")
+    parser.add_argument("--watch-kb", action="store_true", help="Watch knowledge base folder and sync changes in background")
     args = parser.parse_args()
 
-    if args.load_kb:
+    if args.load_kb or args.sync_kb:
         load_knowledge_base_to_chroma(
             kb_path="knowledge_base",
             chroma_url="http://localhost:8016",
             yandex_api_key=os.getenv("YANDEX_CLOUD_API_KEY"),
             yandex_folder_id=os.getenv("YANDEX_CLOUD_FOLDER")
         )
-    
+
+    if args.sync_kb:
+        return
+
+    if args.watch_kb:
+        # Общий kb_loader: его подписчики (BM25 гибридного поиска) обновляются вместе с Chroma
+        KBWatcher(kb_loader, interval=KB_WATCH_INTERVAL, debounce=KB_WATCH_DEBOUNCE).start()
+
     run_app()
 
 if __name__ == "__main__":
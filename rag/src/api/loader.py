@@ -1,17 +1,20 @@
+import hashlib
 import os
-import shutil
+import tempfile
 from pathlib import Path
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from docx import Document as DocxDocument
-import fitz
+from starlette.concurrency import run_in_threadpool
 
 
-from src.utils.kb_loader import kb_loader
+from config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, INGEST_MAX_WORKERS, INGEST_MAX_JOBS
+from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME, T2T_DOCS_COLLECTION_NAME
+from src.utils.kb_loader import kb_loader, IngestionQueue
 
 app = FastAPI()
 chroma_client, embedding_fn = kb_loader.chroma_client, kb_loader.embedding_fn
+ingestion_queue = IngestionQueue(kb_loader, max_workers=INGEST_MAX_WORKERS, max_jobs=INGEST_MAX_JOBS)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +40,36 @@ def safe_join(base: Path, subpath: str) -> Path:
         raise HTTPException(status_code=400, detail="Invalid folder path")
     return resolved
 
+async def spool_upload(file: UploadFile, target_dir: Path) -> tuple[str, Path, str]:
+    """
+    Потоково пишет файл во временный `.upload-*.part` в target_dir: читает блоками
+    по UPLOAD_CHUNK_BYTES, считает sha256 на лету и не даёт превысить MAX_UPLOAD_BYTES.
+    Возвращает временный путь, итоговый путь и sha256; на место файл ставит
+    вызывающий (os.replace), поэтому недокачанный файл не попадёт в базу знаний.
+    """
+    # Берём только имя файла — без путей из клиента
+    file_path = safe_join(target_dir, Path(file.filename).name)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while block := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Файл {file.filename} больше {MAX_UPLOAD_BYTES} байт"
+                    )
+                digest.update(block)
+                await run_in_threadpool(f.write, block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path, file_path, digest.hexdigest()
+
 @app.post("/upload/")
 async def upload_files(
     files: list[UploadFile] = File(...),
@@ -51,39 +84,54 @@ async def upload_files(
     target_dir = safe_join(KNOWLEDGE_BASE_DIR, folder)
     target_dir.mkdir(parents=True, exist_ok=True)
 
-    saved_files = []
-    for file in files:
-        if file.filename:
-            file_path = target_dir / file.filename
-            content = await file.read()
+    # Сначала принимаем все файлы во временные, не держа их в памяти целиком: если какой-то
+    # не прошёл (413, обрыв), в базу знаний не попадает ни один — иначе часть файлов
+    # проиндексировалась бы позже без задания, о котором знает клиент
+    spooled = []
+    try:
+        for file in files:
+            if file.filename:
+                spooled.append(await spool_upload(file, target_dir))
+    except BaseException:
+        for tmp_path, _, _ in spooled:
+            os.remove(tmp_path)
+        raise
 
-            # Сохраняем на диск в папку knowledge_base
-            file_path = target_dir / file.filename
-            with open(file_path, "wb") as f:
-                f.write(content)
-                saved_files.append(str(file_path.relative_to(KNOWLEDGE_BASE_DIR)))
+    saved_files, uploads = [], []
+    for tmp_path, file_path, sha256 in spooled:
+        os.replace(tmp_path, file_path)
+        saved_files.append(str(file_path.relative_to(KNOWLEDGE_BASE_DIR.resolve())))
+        uploads.append({"path": str(file_path), "name": file_path.name, "sha256": sha256})
 
-            # Сохранем в хрому
-            kb_loader.load_file(content, file.filename, doc_type=folder)
-
-    for collection in ['t2t_docs', 'docs', 'sql_examples']:
-        try:
-            collection = chroma_client.get_collection(name=collection)
-            all_data = collection.get()
-
-            # Логи по коллекциям после загрузки дока
-            print("IDs:", all_data['ids'])
-            print("Documents:", all_data['documents'])
-            print("Metadatas:", all_data['metadatas'])
-            print("Embeddings count:", len(all_data['embeddings']) if all_data['embeddings'] else 0)
-        except Exception as e:
-            print('\nEXCEPTION', e)
+    # Разбор, эмбеддинги и запись в хрому — в фоновой очереди, статус по /jobs/{id}
+    job = ingestion_queue.submit(folder, uploads)
 
     return JSONResponse(
         content={
             "message": f"Successfully uploaded {len(saved_files)} files",
             "folder": folder,
-            "files": saved_files
+            "files": saved_files,
+            "job_id": job.id
         },
-        status_code=201
-    )
\ No newline at end of file
+        status_code=202
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/stats")
+async def get_stats():
+    """Размеры коллекций — через count(), без выгрузки документов и эмбеддингов"""
+    collections = {}
+    for name in [T2T_DOCS_COLLECTION_NAME, DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME]:
+        try:
+            collection = await run_in_threadpool(chroma_client.get_collection, name=name)
+            collections[name] = await run_in_threadpool(collection.count)
+        except Exception as e:
+            print(f"❌ Не удалось получить размер коллекции {name}: {e}")
+            collections[name] = None
+    return {"collections": collections}
\ No newline at end of file
@@ -1,4 +1,5 @@
 from .generate_sql import GenerateSQLService
 from .generate_text.generate import GenerateTextService
 
-from .src import GenerateService
\ No newline at end of file
+from .src import GenerateService
+from .cached import CachedGenerateService, SQLTemplateCachedService
\ No newline at end of file
@@ -0,0 +1,78 @@
+from typing import Any, Dict
+
+from src.utils.answer_cache import SemanticAnswerCache
+from src.utils.sql_template_cache import SQLTemplateCache
+from src.utils.clients import QueryEmbeddingContext
+from .src import GenerateService
+
+
+class CachedGenerateService(GenerateService):
+    """
+    Сервис генерации с семантическим кэшем ответов перед ним. Эмбеддинг
+    вопроса считается один раз: по нему ищется кэш, и он же через контекст
+    запроса уходит в поиск обёрнутого сервиса при промахе.
+    """
+
+    def __init__(self, service, embedding_fn, cache: SemanticAnswerCache):
+        self.service = service
+        self.embedding_fn = embedding_fn
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None) -> str:
+        query_context = QueryEmbeddingContext.ensure(query_context, query, self.embedding_fn)
+        embedding = query_context.embed()
+
+        answer = self.cache.get(query, embedding)
+        if answer is not None:
+            return answer
+
+        answer = self.service.generate(query, query_context=query_context)
+        if answer and answer.strip():
+            self.cache.put(query, embedding, answer)
+        return answer
+
+    def cache_stats(self) -> Dict[str, Any]:
+        inner = getattr(self.service, "cache_stats", None)
+        return {**(inner() if inner else {}), "answer_cache": self.cache.stats()}
+
+    def close(self):
+        self.cache.close()
+        if hasattr(self.service, "close"):
+            self.service.close()
+
+
+class SQLTemplateCachedService(GenerateService):
+    """
+    Сервис генерации SQL с кэшем шаблонов перед ним: вопрос той же структуры,
+    что и ранее заданный, получает его SQL с литералами из нового вопроса.
+    Срабатывает раньше семантического кэша — эмбеддинг не нужен.
+    """
+
+    def __init__(self, service, cache: SQLTemplateCache):
+        self.service = service
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None) -> str:
+        sql = self.cache.get(query)
+        if sql is not None:
+            return sql
+
+        answer = self.service.generate(query, query_context=query_context)
+        if answer and answer.strip():
+            self.cache.put(query, answer)
+        return answer
+
+    def cache_stats(self) -> Dict[str, Any]:
+        inner = getattr(self.service, "cache_stats", None)
+        return {**(inner() if inner else {}), "sql_template_cache": self.cache.stats()}
+
+    def close(self):
+        self.cache.close()
+        if hasattr(self.service, "close"):
+            self.service.close()
@@ -1,51 +1,84 @@
 from typing import List, Dict, Any
-from src.utils.semantic_searcher.generate_sql import search_in_knowledge_base
+from src.utils.semantic_searcher.generate_sql import query_collection, merge_collection_results
 from src.utils.bm25_index_builder import BM25IndexBuilder
+from src.utils.clients import QueryEmbeddingContext
+from src.utils.retrieval import Branch, retrieval_orchestrator
+from src.utils.fusion import IdSpace, fuse, RRF
+from config import (
+    RETRIEVAL_SEMANTIC_TIMEOUT, RETRIEVAL_BM25_TIMEOUT,
+    HYBRID_FUSION_MODE, HYBRID_SEMANTIC_WEIGHT, HYBRID_BM25_WEIGHT,
+)
 import numpy as np
 
+# Тип документа по коллекции Chroma — для текстов, которых нет в BM25
+_CHROMA_DOC_TYPES = {"docs": "doc", "sql_examples": "sql_example"}
+
 def reciprocal_rank_fusion(results_list: List[List[Dict]], k: int = 60) -> List[Dict]:
-    all_ids = {doc["id"] for results in results_list for doc in results}
-    rrf_scores = {}
-    for results in results_list:
-        for rank, doc in enumerate(results):
-            doc_id = doc["id"]
-            rrf_scores[doc_id] = rrf_scores.get(doc_id, 0) + 1 / (k + rank + 1)
-    return sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+    space = IdSpace()
+    rankings = [
+        (space.encode([doc["id"] for doc in results]), np.zeros(len(results)))
+        for results in results_list
+    ]
+    ids, scores = fuse(rankings, mode=RRF, top_k=None, k=k)
+    return [(space.extra_id(doc_id), score) for doc_id, score in zip(ids.tolist(), scores.tolist())]
 
 def hybrid_search(
     query: str,
     chroma_client,
     embedding_fn,
     bm25_index_builder: BM25IndexBuilder,
-    top_k: int = 5
+    top_k: int = 5,
+    query_context: QueryEmbeddingContext = None
 ) -> Dict[str, Any]:
-    # 1. Семантический поиск
-    sem_results = search_in_knowledge_base(query, chroma_client, embedding_fn)
-    semantic_docs = [
-        {"id": doc_id, "score": 1 / (1 + dist)}
-        for doc_id, dist in zip(sem_results["ids"], sem_results["distances"])
-    ]
+    query_context = QueryEmbeddingContext.ensure(query_context, query, embedding_fn)
+
+    # 1-2. Семантический поиск по обеим коллекциям и BM25 — параллельно.
+    # Эмбеддинг считается один раз первой семантической веткой, вторая его дожидается
+    branches = retrieval_orchestrator.run({
+        "docs": Branch(lambda: query_collection(chroma_client, "docs", query_context), RETRIEVAL_SEMANTIC_TIMEOUT),
+        "sql_examples": Branch(lambda: query_collection(chroma_client, "sql_examples", query_context), RETRIEVAL_SEMANTIC_TIMEOUT),
+        "bm25": Branch(lambda: bm25_index_builder.search_rows(query, top_k=top_k), RETRIEVAL_BM25_TIMEOUT),
+    })
 
-    # 2. BM25 поиск
-    bm25_docs = bm25_index_builder.search(query, top_k=top_k)
-    bm25_results = [{"id": doc["id"], "score": doc["score"]} for doc in bm25_docs]
+    sem_results = merge_collection_results(branches["docs"].value, branches["sql_examples"].value)
+    if branches["bm25"].ok:
+        store, bm25_rows, bm25_scores = branches["bm25"].value
+    else:
+        store, bm25_rows, bm25_scores = bm25_index_builder.store, np.empty(0, np.int64), np.empty(0)
 
-    # 3. RRF
-    fused = reciprocal_rank_fusion([semantic_docs, bm25_results], k=60)
-    top_ids = [doc_id for doc_id, _ in fused[:top_k]]
+    # 3. Слияние в общем пространстве ID: номера строк BM25, ID Chroma переводятся в них же
+    space = IdSpace(store.row, len(store))
+    semantic_ids = space.encode(sem_results["ids"])
+    semantic_scores = 1 / (1 + np.asarray(sem_results["distances"], dtype=np.float64))
+    fused_ids, _ = fuse(
+        [(semantic_ids, semantic_scores), (bm25_rows, bm25_scores)],
+        mode=HYBRID_FUSION_MODE,
+        weights=[HYBRID_SEMANTIC_WEIGHT, HYBRID_BM25_WEIGHT],
+        top_k=top_k,
+    )
 
-    # 4. Собираем тексты
-    id_to_doc = {doc["id"]: doc for doc in bm25_index_builder.corpus}
+    # 4. Собираем тексты: из хранилища BM25, иначе — из ответа Chroma
+    chroma_docs = {
+        doc_id: (text, _CHROMA_DOC_TYPES.get(collection))
+        for doc_id, text, collection in zip(sem_results["ids"], sem_results["documents"], sem_results["doc_types"])
+    }
+    top_ids = []
     final_docs = []
     sql_examples = []
 
-    for doc_id in top_ids:
-        if doc_id in id_to_doc:
-            text = id_to_doc[doc_id]["text"]
-            doc_type = id_to_doc[doc_id]["metadata"]["type"]
-            final_docs.append(text)
-            if doc_type == "sql_example":
-                sql_examples.append(text)
+    for number in fused_ids.tolist():
+        if number < space.size:
+            doc = store.doc(number)
+            if doc is None:  # удалён из базы знаний уже после поиска
+                continue
+            doc_id, text, doc_type = doc["id"], doc["text"], doc["metadata"]["type"]
+        else:
+            doc_id = space.extra_id(number)
+            text, doc_type = chroma_docs[doc_id]
+        top_ids.append(doc_id)
+        final_docs.append(text)
+        if doc_type == "sql_example":
+            sql_examples.append(text)
 
     return {
         "docs": final_docs,
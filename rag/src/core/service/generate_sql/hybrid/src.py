@@ -1,4 +1,5 @@
-from src.utils.bm25_index_builder import BM25IndexBuilder
+from src.utils.bm25_index_builder import bm25_index_registry
+from src.utils.clients import QueryEmbeddingContext
 from .hybrid_searcher import hybrid_search
 from src.utils.prompts.generate_sql import RAG_SQL_PROMPT_TEMPLATE
 from langchain_core.prompts import ChatPromptTemplate
@@ -17,16 +18,20 @@ class GenerateSQLService:
         self.embedding_fn = embedding_fn
         self.llm_client = llm_client
 
-        # Строим BM25 индекс, используя kb_loader, НО не изменяя его
-        self.bm25_index_builder = BM25IndexBuilder(kb_loader).build_index()
+        # BM25 индекс общий для всех сервисов процесса: строится один раз на версию базы знаний
+        self.bm25_index_builder = bm25_index_registry.acquire(kb_loader)
 
-    def generate(self, query: str):
+    def close(self):
+        bm25_index_registry.release(self.bm25_index_builder)
+
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None):
         context = hybrid_search(
             query=query,
             chroma_client=self.chroma_client,
             embedding_fn=self.embedding_fn,
             bm25_index_builder=self.bm25_index_builder,
-            top_k=5
+            top_k=5,
+            query_context=query_context
         )
 
         sql_examples = context["sql_examples"] if context["sql_examples"] else ["No SQL examples found"]
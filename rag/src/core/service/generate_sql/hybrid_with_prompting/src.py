@@ -1,7 +1,8 @@
 # src/services/generate_sql_service.py
 
 from src.utils.query_enhancer import QueryEnhancer
-from src.utils.bm25_index_builder import BM25IndexBuilder
+from src.utils.bm25_index_builder import bm25_index_registry
+from src.utils.clients import QueryEmbeddingContext
 from .hybrid_searcher import hybrid_search
 from src.utils.prompts.generate_sql import RAG_SQL_PROMPT_TEMPLATE, RAG_SQL_HYBRID_TEMPLATE
 from langchain_core.prompts import ChatPromptTemplate
@@ -19,12 +20,16 @@ class GenerateSQLService:
         self.chroma_client = chroma_client
         self.embedding_fn = embedding_fn
         self.llm_client = llm_client
-        self.bm25_index_builder = BM25IndexBuilder(kb_loader).build_index()
+        # BM25 индекс общий для всех сервисов процесса: строится один раз на версию базы знаний
+        self.bm25_index_builder = bm25_index_registry.acquire(kb_loader)
 
         # Добавляем QueryEnhancer
         self.query_enhancer = QueryEnhancer(llm_client)
 
-    def generate(self, query: str):
+    def close(self):
+        bm25_index_registry.release(self.bm25_index_builder)
+
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None):
         # 1. Улучшаем запрос
         enhanced = self.query_enhancer.enhance(query)
 
@@ -39,7 +44,8 @@ class GenerateSQLService:
             chroma_client=self.chroma_client,
             embedding_fn=self.embedding_fn,
             bm25_index_builder=self.bm25_index_builder,
-            top_k=5
+            top_k=5,
+            query_context=query_context  # эмбеддинги кэшируются по тексту, так что переформулировка тоже посчитается один раз
         )
 
         sql_examples = context["sql_examples"] if context["sql_examples"] else ["No SQL examples found"]
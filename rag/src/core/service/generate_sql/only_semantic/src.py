@@ -1,5 +1,6 @@
 
 from src.utils.semantic_searcher.generate_sql import search_in_knowledge_base
+from src.utils.clients import QueryEmbeddingContext
 from src.utils.prompts.generate_sql import RAG_SQL_PROMPT_TEMPLATE
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
@@ -13,13 +14,14 @@ class GenerateSQLService:
         self.embedding_fn = embedding_fn
         self.llm_client = llm_client
 
-    def generate(self, query: str):
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None):
         # Search in knowledge base
         context = search_in_knowledge_base(
             query=query,
             chroma_client=self.chroma_client,
             embedding_fn=self.embedding_fn,
             top_k=3,
+            query_context=query_context,
         )
 
         # Categorize documents based on their type
@@ -1,5 +1,6 @@
 from src.utils.semantic_searcher.generate_text.search import search_in_knowledge_base
 from src.utils.prompts.generate_text import RAG_TEXT_PROMPT_TEMPLATE
+from src.utils.clients import QueryEmbeddingContext
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
@@ -14,12 +15,13 @@ class GenerateTextService:
         self.embedding_fn = embedding_fn
         self.llm_client = llm_client
 
-    def generate(self, query: str):
+    def generate(self, query: str, query_context: QueryEmbeddingContext = None):
         # Search in knowledge base
         context = search_in_knowledge_base(
             query=query,
             chroma_client=self.chroma_client,
-            embedding_fn=self.embedding_fn
+            embedding_fn=self.embedding_fn,
+            query_context=query_context
         )
         
         # Format context - handle empty results
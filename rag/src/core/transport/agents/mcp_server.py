@@ -13,6 +13,9 @@ def create_mcp_app(sql_service, text_service, db_conn: Connection) -> FastMCP:
     # logging.basicConfig(level=logging.DEBUG)
     # Раскоментировать для логов fastmcp. Может быть полезно при ошибках
 
+    # Статистика кэшей перед сервисами генерации (если они обёрнуты кэшем)
+    cache_stats_sources = {"generate_sql": sql_service, "search_knowledge_base_tool": text_service}
+
     sql_service = SQLService(sql_service, db_conn)
     text_service = TextService(text_service)
 
@@ -40,6 +43,16 @@ def create_mcp_app(sql_service, text_service, db_conn: Connection) -> FastMCP:
         """Выполни безопасный SELECT-запрос и верни результаты."""
         return sql_service.run_sql_safely(sql)
 
+    # --- Статистика кэшей: ресурс, а не инструмент — агенту она не нужна ---
+    @mcp.resource("stats://caches")
+    def cache_stats() -> dict:
+        """Попадания, промахи, доля попаданий и размер кэшей ответов"""
+        return {
+            name: service.cache_stats()
+            for name, service in cache_stats_sources.items()
+            if hasattr(service, "cache_stats")
+        }
+
     return mcp
 
 
@@ -0,0 +1 @@
+from .src import SemanticAnswerCache, question_literals
\ No newline at end of file
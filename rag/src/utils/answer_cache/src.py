@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+# Числа (в том числе даты и суммы) и имена в кавычках: вопросы, различающиеся ими, — разные вопросы
+_LITERAL_RE = re.compile(r"\d+(?:[.,]\d+)*|«[^»]*»|\"[^\"]*\"|'[^']*'")
+
+
+def question_literals(question: str) -> Tuple[str, ...]:
+    return tuple(_LITERAL_RE.findall(question))
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов по смыслу вопроса.
+
+    Ответ отдаётся для ранее заданного вопроса с косинусной близостью
+    эмбеддингов не ниже `threshold`, если у вопросов совпадает ключ
+    `question_key` и запись моложе `ttl` секунд. По умолчанию ключ — литералы
+    (числа, даты, имена в кавычках); для SQL, где «больше» и «меньше» дают
+    близкие эмбеддинги и разные запросы, к литералам добавляются направление
+    сравнения, отрицание и порядок (`src.utils.sql_template_cache.question_constraints`).
+
+    Ответы зависят от базы знаний, поэтому кэш очищается при её изменении:
+    сразу — по подписке на KnowledgeBaseLoader, а изменения из других
+    процессов замечаются сверкой `kb_version()` не чаще раза в
+    `version_check_interval` секунд.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_entries: int = 10_000,
+        kb_loader=None,
+        kb_version: Callable[[], str] = None,
+        version_check_interval: float = 5.0,
+        question_key: Callable[[str], Hashable] = question_literals,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.kb_loader = kb_loader
+        self.kb_version = kb_version
+        self.version_check_interval = version_check_interval
+        self.question_key = question_key
+
+        self._lock = threading.Lock()
+        # Нормированные эмбеддинги вопросов и время записи; буферы растут с запасом, заняты первые len(_entries) строк
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._created = np.zeros(0, dtype=np.float64)
+        self._entries: List[Dict[str, Any]] = []  # question, answer, key
+        self._version = kb_version() if kb_version else None
+        self._version_checked_at = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+        if kb_loader is not None:
+            kb_loader.subscribe(self._on_kb_change)
+
+    def close(self):
+        if self.kb_loader is not None:
+            self.kb_loader.unsubscribe(self._on_kb_change)
+
+    def _on_kb_change(self, collection_name: str, upserted, removed_ids):
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._clear_locked()
+
+    def _clear_locked(self):
+        self._entries = []
+
+    def _check_version(self):
+        if self.kb_version is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = self.kb_version()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def get(self, question: str, embedding) -> Optional[str]:
+        self._check_version()
+        query = self._normalize(embedding)
+        key = self.question_key(question)
+        with self._lock:
+            size = len(self._entries)
+            if not size or self._vectors.shape[1] != len(query):
+                self.misses += 1
+                return None
+            similarities = self._vectors[:size] @ query
+            fresh = self._created[:size] >= time.time() - self.ttl
+            matches = np.flatnonzero(similarities >= self.threshold)
+            for index in matches[np.argsort(-similarities[matches], kind="stable")].tolist():
+                entry = self._entries[index]
+                if entry["key"] != key:
+                    continue
+                if not fresh[index]:
+                    self.expired += 1
+                    continue
+                self.hits += 1
+                return entry["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding, answer: str):
+        vector = self._normalize(embedding)
+        key = self.question_key(question)
+        with self._lock:
+            if self._vectors.shape[1] != len(vector):
+                self._entries = []
+                self._vectors = np.zeros((0, len(vector)), dtype=np.float32)
+            if len(self._entries) >= self.max_entries:
+                self._evict_locked()
+            size = len(self._entries)
+            if size == len(self._vectors):
+                self._grow_locked(max(64, 2 * size))
+            self._vectors[size] = vector
+            self._created[size] = time.time()
+            self._entries.append({"question": question, "answer": answer, "key": key})
+
+    def _grow_locked(self, capacity: int):
+        capacity = min(capacity, max(self.max_entries, 1))
+        size = len(self._entries)
+        vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+        created = np.zeros(capacity, dtype=np.float64)
+        vectors[:size], created[:size] = self._vectors[:size], self._created[:size]
+        self._vectors, self._created = vectors, created
+
+    def _evict_locked(self):
+        # Выбрасываем просроченные, а если их мало — старейшую четверть
+        size = len(self._entries)
+        keep = self._created[:size] >= time.time() - self.ttl
+        if keep.sum() >= self.max_entries:
+            keep[:size - self.max_entries * 3 // 4] = False
+        rows = np.flatnonzero(keep)
+        # Сдвигаем оставшиеся к началу буферов на месте
+        self._vectors[:len(rows)] = self._vectors[rows]
+        self._created[:len(rows)] = self._created[rows]
+        self._entries = [self._entries[row] for row in rows.tolist()]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -1 +1,5 @@
-from .src import BM25IndexBuilder
\ No newline at end of file
+from .src import BM25IndexBuilder
+from .inverted_index import InvertedIndex
+from .doc_store import DocStore
+from .sharded import ShardedIndex
+from .registry import BM25IndexRegistry, bm25_index_registry
\ No newline at end of file
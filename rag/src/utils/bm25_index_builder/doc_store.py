@@ -0,0 +1,145 @@
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+class DocStore:
+    """
+    Компактное хранилище документов индекса.
+
+    Тексты лежат в одном UTF-8 буфере (основа может быть mmap снимка, новые
+    документы дописываются в bytearray) со смещениями в `array('q')`.
+    Метаданные хранятся по колонкам, повторяющиеся строки (source, type,
+    doc_id) интернируются — на документ не заводится ни dict, ни str, пока
+    его не запросили. ID -> строка — постоянный словарь, поиск O(1).
+    Удалённые строки остаются в хранилище до пересборки (`extend` живых
+    строк в новое хранилище).
+    """
+
+    def __init__(self, base: np.ndarray = None, offsets: array = None, ids: List[str] = None,
+                 columns: Dict[str, list] = None):
+        self._base = base if base is not None else np.zeros(0, dtype=np.uint8)
+        self._extra = bytearray()
+        self._offsets = offsets if offsets is not None else array("q", [0])
+        self._ids: List[Optional[str]] = ids or []
+        self._columns: Dict[str, list] = columns or {}
+        self._strings: Dict[str, str] = {}
+        for values in self._columns.values():
+            for i, value in enumerate(values):
+                values[i] = self._column_value(value, self._ids[i])
+        self._rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self._ids) if doc_id is not None}
+
+    def _column_value(self, value: Any, doc_id: Optional[str]) -> Any:
+        if not isinstance(value, str):
+            return value
+        # chunk_id совпадает с ID документа — храним одну строку
+        if value == doc_id:
+            return doc_id
+        return self._strings.setdefault(value, value)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def live_count(self) -> int:
+        return len(self._rows)
+
+    def append(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> int:
+        return self._append(doc_id, text.encode("utf-8"), metadata)
+
+    def _append(self, doc_id: Optional[str], encoded: bytes, metadata: Dict[str, Any]) -> int:
+        row = len(self._ids)
+        self._extra += encoded
+        self._offsets.append(self._offsets[-1] + len(encoded))
+        self._ids.append(doc_id)
+        for key in metadata.keys() - self._columns.keys():
+            self._columns[key] = [_MISSING] * row
+        for key, values in self._columns.items():
+            value = metadata.get(key, _MISSING)
+            values.append(self._column_value(value, doc_id))
+        if doc_id is not None:
+            self._rows[doc_id] = row
+        return row
+
+    def extend(self, source: 'DocStore', rows: Iterable[int]) -> int:
+        """
+        Дописывает строки `rows` другого хранилища в том же порядке; удалённые
+        переносятся удалёнными, чтобы номера строк сдвигались предсказуемо.
+        Возвращает номер первой дописанной строки.
+        """
+        first = len(self._ids)
+        for row in rows:
+            self._append(source._ids[row], source._text_bytes(row), source.metadata(row))
+        return first
+
+    def delete(self, doc_id: str) -> Optional[int]:
+        """Убирает документ из выдачи; место освобождается при пересборке хранилища"""
+        row = self._rows.pop(doc_id, None)
+        if row is not None:
+            self._ids[row] = None
+        return row
+
+    def delete_row(self, row: int):
+        doc_id = self._ids[row]
+        if doc_id is not None and self._rows.get(doc_id) == row:
+            del self._rows[doc_id]
+        self._ids[row] = None
+
+    def row(self, doc_id: str) -> Optional[int]:
+        return self._rows.get(doc_id)
+
+    def _text_bytes(self, row: int) -> bytes:
+        start, stop = self._offsets[row], self._offsets[row + 1]
+        base_len = len(self._base)
+        if stop <= base_len:
+            return self._base[start:stop].tobytes()
+        return bytes(self._extra[start - base_len:stop - base_len])
+
+    def text(self, row: int) -> str:
+        return self._text_bytes(row).decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        return {key: values[row] for key, values in self._columns.items() if values[row] is not _MISSING}
+
+    def doc(self, row: int) -> Optional[Dict[str, Any]]:
+        doc_id = self._ids[row]
+        if doc_id is None:
+            return None
+        return {"id": doc_id, "text": self.text(row), "metadata": self.metadata(row)}
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(doc_id)
+        return None if row is None else self.doc(row)
+
+    def rows(self) -> Iterator[int]:
+        """Строки живых документов по возрастанию"""
+        return (row for row, doc_id in enumerate(self._ids) if doc_id is not None)
+
+    def save(self, directory: str):
+        """Сохраняет живые документы (удалённые не попадают в снимок)"""
+        rows = list(self.rows())
+        encoded = [self.text(row).encode("utf-8") for row in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, "texts.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        np.save(os.path.join(directory, "text_offsets.npy"), offsets)
+        columns = {
+            key: [None if values[row] is _MISSING else values[row] for row in rows]
+            for key, values in self._columns.items()
+        }
+        with open(os.path.join(directory, "corpus.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": [self._ids[row] for row in rows], "columns": columns}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'DocStore':
+        texts = np.load(os.path.join(directory, "texts.npy"), mmap_mode="r" if mmap else None)
+        offsets = array("q", np.load(os.path.join(directory, "text_offsets.npy")).tolist())
+        with open(os.path.join(directory, "corpus.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        columns = {key: [_MISSING if value is None else value for value in values] for key, values in data["columns"].items()}
+        return cls(texts, offsets, data["ids"], columns)
@@ -0,0 +1,146 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс BM25 на массивах NumPy.
+
+    Постинги всех термов лежат подряд (CSR): для терма `t` документы —
+    `doc_ids[offsets[t]:offsets[t + 1]]`, а в `weights` — уже посчитанный при
+    построении вклад терма в BM25 документа (IDF × насыщенный TF с нормировкой
+    по длине). Поиск суммирует только постинги термов запроса и берёт top-k
+    через argpartition, поэтому время зависит от числа затронутых постингов,
+    а не от размера корпуса.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.doc_lengths = doc_lengths
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(
+        cls,
+        tokenized_corpus: Sequence[List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        collection_stats: Optional[Tuple[int, float, Mapping[str, int]]] = None,
+    ) -> 'InvertedIndex':
+        """
+        `collection_stats` — (число документов, средняя длина, df термов) всего корпуса,
+        если индекс строится как сегмент: тогда веса считаются по общим статистикам.
+        """
+        num_docs = len(tokenized_corpus)
+        doc_lengths = np.fromiter((len(tokens) for tokens in tokenized_corpus), dtype=np.int32, count=num_docs)
+        avgdl = float(doc_lengths.mean()) if num_docs and doc_lengths.any() else 1.0
+
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        for doc_id, tokens in enumerate(tokenized_corpus):
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        # Группируем постинги по термам (внутри терма документы идут по возрастанию)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        if collection_stats is not None:
+            num_docs, avgdl, collection_df = collection_stats
+            avgdl = avgdl or 1.0
+            terms = sorted(vocab, key=vocab.get)
+            df = np.maximum(df, np.fromiter((collection_df.get(term, 0) for term in terms), dtype=np.int64, count=len(terms)))
+            num_docs = max(num_docs, int(df.max(initial=0)))
+
+        # IDF как в Lucene: всегда положительный, в том числе на маленьком корпусе
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / avgdl)
+        weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        return cls(vocab, offsets, doc_ids, weights, doc_lengths)
+
+    def search(self, query_tokens: Sequence[str], top_k: Optional[int] = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Номера документов и их BM25 (по убыванию), только с ненулевым счётом.
+        `top_k=None` — все затронутые документы без сортировки.
+        """
+        ids_parts, weight_parts = [], []
+        for term, qtf in Counter(query_tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            ids_parts.append(self.doc_ids[start:stop])
+            weight_parts.append(self.weights[start:stop] * qtf if qtf > 1 else self.weights[start:stop])
+
+        if not ids_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        if len(ids_parts) == 1:
+            rows, scores = ids_parts[0], weight_parts[0]
+        else:
+            # Складываем вклады термов по документам: сортировка затронутых постингов + reduceat
+            ids = np.concatenate(ids_parts)
+            weights = np.concatenate(weight_parts)
+            order = np.argsort(ids, kind="stable")
+            ids, weights = ids[order], weights[order]
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            rows, scores = ids[starts], np.add.reduceat(weights, starts)
+
+        if top_k is None:
+            return rows, scores
+        if top_k < len(scores):
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "doc_ids.npy"), self.doc_ids)
+        np.save(os.path.join(directory, "weights.npy"), self.weights)
+        np.save(os.path.join(directory, "doc_lengths.npy"), self.doc_lengths)
+        # Номер терма — его позиция в списке
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'InvertedIndex':
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, "vocab.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        return cls(
+            vocab={term: term_id for term_id, term in enumerate(terms)},
+            offsets=np.load(os.path.join(directory, "offsets.npy"), mmap_mode=mmap_mode),
+            doc_ids=np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode=mmap_mode),
+            weights=np.load(os.path.join(directory, "weights.npy"), mmap_mode=mmap_mode),
+            doc_lengths=np.load(os.path.join(directory, "doc_lengths.npy"), mmap_mode=mmap_mode),
+        )
@@ -0,0 +1,95 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+from config import BM25_VERSION_CHECK_INTERVAL
+from src.utils.text_analyzer import Analyzer, default_analyzer
+from .src import BM25IndexBuilder, BM25_COLLECTIONS
+
+
+class _Entry:
+    def __init__(self, builder: BM25IndexBuilder, version: str):
+        self.builder = builder
+        self.version = version
+        self.updates = builder.updates
+        self.checked_at = time.monotonic()
+        self.refs = 0
+
+    def is_fresh(self, interval: float) -> bool:
+        """Версия сверялась недавно и с тех пор загрузчик ничего не присылал"""
+        return self.builder.updates == self.updates and time.monotonic() - self.checked_at < interval
+
+
+class BM25IndexRegistry:
+    """
+    Общие на процесс BM25-индексы: один на (загрузчик, анализатор, версию базы знаний).
+
+    Сервисы берут индекс через `acquire` и отдают через `release`. Повторное
+    получение при неизменной базе знаний ничего не перечитывает. Индекс,
+    обновлённый на месте через подписку на загрузчик, считается актуальным.
+    Если база изменилась в обход загрузчика (другой процесс, --sync-kb),
+    строится новый индекс, а старый живёт, пока его не отпустят все держатели.
+    Текущий индекс остаётся в реестре и без держателей — следующий сервис получит его сразу.
+
+    Версия базы (`files_fingerprint`, stat всех файлов и чтение манифеста)
+    сверяется не на каждом `acquire`, а после уведомления загрузчика или не
+    чаще раза в `version_check_interval` секунд.
+    """
+
+    def __init__(self, version_check_interval: float = 5.0):
+        self.version_check_interval = version_check_interval
+        self._entries: Dict[Tuple[int, str], _Entry] = {}
+        self._by_builder: Dict[int, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, kb_loader, analyzer: Analyzer = None) -> BM25IndexBuilder:
+        analyzer = analyzer or default_analyzer
+        key = (id(kb_loader), analyzer.name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_fresh(self.version_check_interval):
+                entry.refs += 1
+                return entry.builder
+
+        version = kb_loader.files_fingerprint(BM25_COLLECTIONS)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version != version and entry.builder.updates != entry.updates:
+                # Изменения пришли через загрузчик и уже применены к индексу
+                entry.version, entry.updates = version, entry.builder.updates
+            if entry is not None:
+                entry.checked_at = time.monotonic()
+            if entry is None or entry.version != version:
+                if entry is not None:
+                    self._retire(key, entry)
+                entry = _Entry(BM25IndexBuilder(kb_loader, analyzer=analyzer).build_index(), version)
+                self._entries[key] = entry
+                self._by_builder[id(entry.builder)] = entry
+            entry.refs += 1
+            return entry.builder
+
+    def release(self, builder: BM25IndexBuilder):
+        with self._lock:
+            entry = self._by_builder.get(id(builder))
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            if entry.refs == 0 and entry not in self._entries.values():
+                self._drop(entry)
+
+    def _retire(self, key, entry: _Entry):
+        del self._entries[key]
+        if entry.refs == 0:
+            self._drop(entry)
+
+    def _drop(self, entry: _Entry):
+        self._by_builder.pop(id(entry.builder), None)
+        entry.builder.close()
+
+    def clear(self):
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                self._retire(key, entry)
+
+
+bm25_index_registry = BM25IndexRegistry(version_check_interval=BM25_VERSION_CHECK_INTERVAL)
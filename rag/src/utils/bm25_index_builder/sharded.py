@@ -0,0 +1,149 @@
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .inverted_index import InvertedIndex
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    # Один пул на процесс: шарды всех индексов ищутся одними и теми же воркерами
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+        return _executor
+
+
+@functools.lru_cache(maxsize=64)
+def _open_shard(directory: str) -> InvertedIndex:
+    # В воркере шард открывается один раз; страницы mmap общие для всех процессов
+    return InvertedIndex.load(directory, mmap=True)
+
+
+def _search_shard(directory: str, query_tokens: Tuple[str, ...], top_k: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    rows, scores = _open_shard(directory).search(query_tokens, top_k=top_k)
+    return np.asarray(rows), np.asarray(scores)
+
+
+def split_index(index: InvertedIndex, bounds: np.ndarray) -> List[InvertedIndex]:
+    """
+    Делит индекс на части по диапазонам документов `bounds[i]:bounds[i + 1]`.
+    Веса постингов уже посчитаны по статистикам всего корпуса, поэтому счёт
+    документа в шарде совпадает со счётом в исходном индексе.
+    """
+    terms = np.array(sorted(index.vocab, key=index.vocab.get), dtype=object)
+    doc_ids = np.asarray(index.doc_ids)
+    posting_terms = np.repeat(np.arange(len(terms), dtype=np.int32), np.diff(index.offsets))
+
+    parts = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        mask = (doc_ids >= lo) & (doc_ids < hi)
+        counts = np.bincount(posting_terms[mask], minlength=len(terms))
+        kept = np.flatnonzero(counts)
+        offsets = np.zeros(len(kept) + 1, dtype=np.int64)
+        np.cumsum(counts[kept], out=offsets[1:])
+        parts.append(InvertedIndex(
+            vocab={term: term_id for term_id, term in enumerate(terms[kept].tolist())},
+            offsets=offsets,
+            doc_ids=(doc_ids[mask] - lo).astype(np.int32),
+            weights=np.asarray(index.weights)[mask],
+            doc_lengths=np.asarray(index.doc_lengths[lo:hi]),
+        ))
+    return parts
+
+
+class ShardedIndex:
+    """
+    InvertedIndex, разделённый по документам на шарды в отдельных каталогах.
+
+    Запрос рассылается во все шарды через общий ProcessPoolExecutor, каждый
+    шард возвращает свой top-k, итог — top-k из объединения. Интерфейс поиска
+    тот же, что у InvertedIndex, поэтому шардированный индекс подставляется
+    в сегмент BM25IndexBuilder без изменений поиска.
+    """
+
+    def __init__(self, directories: Sequence[str], bounds: np.ndarray, max_workers: int, owned_root: str = None):
+        self.directories = list(directories)
+        self.bounds = bounds
+        self.max_workers = max_workers
+        if owned_root is not None:
+            # Временные шарды удаляются, когда индекс больше никому не нужен
+            weakref.finalize(self, shutil.rmtree, owned_root, True)
+
+    @property
+    def num_docs(self) -> int:
+        return int(self.bounds[-1])
+
+    @classmethod
+    def create(cls, index: InvertedIndex, shards: int, directory: str = None, max_workers: int = None) -> 'ShardedIndex':
+        """
+        Делит индекс на `shards` частей и сохраняет в `directory` (обычно внутри
+        снимка, тогда шарды переиспользуются после перезапуска). Без каталога
+        шарды пишутся во временный, который удаляется вместе с индексом.
+        """
+        max_workers = max_workers or shards
+        owned_root = None
+        if directory is None:
+            directory = owned_root = tempfile.mkdtemp(prefix="bm25-shards-")
+            build_directory = directory
+        else:
+            build_directory = f"{directory}.tmp-{uuid.uuid4().hex}"
+
+        bounds = np.linspace(0, index.num_docs, shards + 1).astype(np.int64)
+        for i, part in enumerate(split_index(index, bounds)):
+            part.save(os.path.join(build_directory, f"shard-{i}"))
+        np.save(os.path.join(build_directory, "bounds.npy"), bounds)
+
+        if build_directory != directory:
+            try:
+                os.rename(build_directory, directory)
+            except OSError:
+                # Эти же шарды уже сохранил другой процесс
+                shutil.rmtree(build_directory, ignore_errors=True)
+                return cls.open(directory, max_workers)
+        return cls(cls._shard_directories(directory, shards), bounds, max_workers, owned_root)
+
+    @classmethod
+    def open(cls, directory: str, max_workers: int = None) -> Optional['ShardedIndex']:
+        """Ранее сохранённые шарды или None"""
+        try:
+            bounds = np.load(os.path.join(directory, "bounds.npy"))
+        except (OSError, ValueError):
+            return None
+        shards = len(bounds) - 1
+        return cls(cls._shard_directories(directory, shards), bounds, max_workers or shards)
+
+    @staticmethod
+    def _shard_directories(directory: str, shards: int) -> List[str]:
+        return [os.path.join(directory, f"shard-{i}") for i in range(shards)]
+
+    def search(self, query_tokens: Sequence[str], top_k: Optional[int] = 5) -> Tuple[np.ndarray, np.ndarray]:
+        executor = _get_executor(self.max_workers)
+        query_tokens = tuple(query_tokens)
+        futures = [executor.submit(_search_shard, directory, query_tokens, top_k) for directory in self.directories]
+
+        rows_parts, score_parts = [], []
+        for start, future in zip(self.bounds[:-1].tolist(), futures):
+            rows, scores = future.result()
+            rows_parts.append(rows.astype(np.int64) + start)
+            score_parts.append(scores)
+        rows, scores = np.concatenate(rows_parts), np.concatenate(score_parts)
+
+        if top_k is None:
+            return rows, scores
+        if top_k < len(scores):
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
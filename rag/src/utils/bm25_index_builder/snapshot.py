@@ -0,0 +1,59 @@
+import os
+import shutil
+import uuid
+from typing import Optional, Tuple
+
+from .doc_store import DocStore
+from .inverted_index import InvertedIndex
+
+# Меняется при несовместимых изменениях формата или токенизации
+SNAPSHOT_FORMAT = 3
+
+
+def snapshot_dir(root: str, fingerprint: str) -> str:
+    return os.path.join(root, f"{SNAPSHOT_FORMAT}-{fingerprint}")
+
+
+def save_snapshot(root: str, fingerprint: str, index: InvertedIndex, store: DocStore) -> str:
+    """
+    Сохраняет индекс и корпус в `root/<формат>-<fingerprint>/`.
+
+    Тексты лежат одним UTF-8 буфером со смещениями, массивы — в .npy, поэтому
+    снимок открывается через mmap и общий для всех процессов на машине.
+    Каталог собирается во временном месте и переименовывается целиком;
+    старые снимки удаляются (у уже открывших их процессов mmap остаётся рабочим).
+    """
+    directory = snapshot_dir(root, fingerprint)
+    tmp_directory = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+    index.save(tmp_directory)
+    store.save(tmp_directory)
+
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Этот же снимок уже успел сохранить другой процесс
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if path != directory and not name.startswith(".tmp-"):
+            shutil.rmtree(path, ignore_errors=True)
+    return directory
+
+
+def load_snapshot(root: str, fingerprint: str, mmap: bool = True) -> Optional[Tuple[InvertedIndex, DocStore]]:
+    """
+    Индекс и хранилище документов из снимка с этим fingerprint; None — снимка
+    нет или он повреждён. Тексты не декодируются, пока их не запросят.
+    """
+    directory = snapshot_dir(root, fingerprint)
+    if not os.path.isdir(directory):
+        return None
+
+    try:
+        index = InvertedIndex.load(directory, mmap=mmap)
+        store = DocStore.load(directory, mmap=mmap)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Снимок BM25 {directory} повреждён, индекс будет построен заново: {e}")
+        return None
+    return index, store
@@ -1,27 +1,121 @@
 # src/utils/bm25_index_builder.py
 
 import hashlib
-import re
-from typing import List, Dict, Any
-from rank_bm25 import BM25Okapi
+import os
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
 from langchain_core.documents import Document
 
+from config import BM25_SNAPSHOT, BM25_MAX_SEGMENTS, BM25_MERGE_DELETED_RATIO, BM25_SHARDS, BM25_SHARD_MIN_DOCS
+from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME
+from src.utils.text_analyzer import Analyzer, default_analyzer
+from .doc_store import DocStore
+from .inverted_index import InvertedIndex
+from .sharded import ShardedIndex
+from .snapshot import load_snapshot, save_snapshot, snapshot_dir
+
+# Коллекции, которые попадают в BM25, и тип их документов
+BM25_COLLECTIONS = {DOCS_COLLECTION_NAME: "doc", SQL_EXAMPLES_COLLECTION_NAME: "sql_example"}
+
+
+class _Segment:
+    """Неизменяемая часть индекса: InvertedIndex (или ShardedIndex) над строками корпуса `rows`."""
+
+    def __init__(self, index, rows: np.ndarray):
+        self.index = index
+        self.rows = rows
+
+
 class BM25IndexBuilder:
-    def __init__(self, kb_loader):
+    """
+    BM25 по документам и SQL-примерам базы знаний.
+
+    Индекс состоит из сегментов: полная сборка даёт один сегмент, а
+    `add_documents` дописывает новый маленький, не трогая остальные.
+    Удалённые и заменённые документы помечаются в маске и отбрасываются
+    при поиске. IDF старых сегментов не пересчитываются при изменениях —
+    актуальные статистики корпуса получают новые сегменты и результат
+    слияния. Когда сегментов больше `BM25_MAX_SEGMENTS` или удалённых
+    больше `BM25_MERGE_DELETED_RATIO`, сегменты сливаются в фоновом потоке.
+    Сегменты от `BM25_SHARD_MIN_DOCS` документов при `BM25_SHARDS` > 1
+    ищутся шардами в пуле процессов.
+    Документы лежат в компактном `DocStore`, поиск по ID — `get`.
+    """
+
+    def __init__(self, kb_loader, analyzer: Analyzer = None):
         self.kb_loader = kb_loader
-        self.corpus = []  # [{"id": str, "text": str, "metadata": dict}]
-        self.bm25 = None
+        # Один анализатор (и его кэш стемов) на построение и запросы всех индексов
+        self.analyzer = analyzer or default_analyzer
+        self._store = DocStore()  # строка -> документ, id -> строка
+        self._deleted = np.zeros(0, dtype=bool)
+        self._segments: List[_Segment] = []
+        # Статистики живых документов для IDF новых сегментов
+        self._df = Counter()
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._merging = False
+        self._generation = 0  # растёт при пересборке индекса и хранилища: результат старого слияния отбрасывается
+        self.updates = 0  # сколько изменений базы знаний применено на месте
+        # Изменения базы знаний (загрузка, синхронизация, наблюдатель) применяются на месте
+        kb_loader.subscribe(self.apply_changes)
 
     def _generate_id(self, doc_type: str, filename: str) -> str:
         file_hash = hashlib.sha256(filename.encode()).hexdigest()[:16]
         return f"{doc_type}_{file_hash}"
 
     def _tokenize(self, text: str) -> List[str]:
-        return re.findall(r"\w+", text.lower())
+        return self.analyzer.tokenize(text)
+
+    def _corpus_entry(self, doc_type: str, doc: Document) -> Dict[str, Any]:
+        source = doc.metadata["source"]
+        # ID чанка совпадает с ID в Chroma, чтобы RRF сводил оба поиска
+        doc_id = doc.metadata.get("chunk_id") or self._generate_id(doc_type, source)
+        return {
+            "id": doc_id,
+            "text": doc.page_content,
+            "metadata": {
+                "source": source,
+                "type": doc_type,
+                **doc.metadata
+            }
+        }
+
+    @property
+    def corpus(self) -> List[Dict[str, Any]]:
+        """Живые документы индекса (собираются заново при каждом обращении — для поиска по ID есть `get`)"""
+        store = self._store
+        return [store.doc(row) for row in store.rows()]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Документ {"id", "text", "metadata"} по ID или None"""
+        return self._store.get(doc_id)
+
+    @property
+    def snapshot_root(self) -> str:
+        return os.path.join(self.kb_loader.kb_path, ".bm25")
 
     def build_index(self) -> 'BM25IndexBuilder':
-        """Строим индекс, используя методы kb_loader"""
-        self.corpus = []
+        """
+        Строим индекс, используя методы kb_loader. Если база знаний не менялась
+        с прошлого построения, индекс открывается из снимка на диске (mmap).
+        """
+        fingerprint = None
+        if BM25_SNAPSHOT:
+            fingerprint = f"{self.kb_loader.files_fingerprint(BM25_COLLECTIONS)}-{self.analyzer.name}"
+        snapshot = load_snapshot(self.snapshot_root, fingerprint) if fingerprint else None
+        if snapshot is not None:
+            index, store = snapshot
+            searchable = self._sharded(index, self._shards_dir(fingerprint))
+            with self._lock:
+                self._reset(store, index, searchable)
+            print(f"✅ BM25 индекс открыт из снимка: {len(store)} документов")
+            return self
+
+        store = DocStore()
+        tokens = []
 
         # Загружаем все типы документов
         doc_type_map = [
@@ -29,46 +123,244 @@ class BM25IndexBuilder:
             ("sql_example", self.kb_loader.load_sql_examples())
         ]
 
+        # Почти-дубликаты, не попавшие в Chroma, не индексируем и здесь
+        duplicate_ids = self.kb_loader.duplicate_chunk_ids()
+
         for doc_type, docs in doc_type_map:
             try:
                 for doc in docs:
-                    source = doc.metadata["source"]
-                    doc_id = self._generate_id(doc_type, source)
-                    self.corpus.append({
-                        "id": doc_id,
-                        "text": doc.page_content,
-                        "metadata": {
-                            "source": source,
-                            "type": doc_type,
-                            **doc.metadata
-                        }
-                    })
+                    entry = self._corpus_entry(doc_type, doc)
+                    if entry["id"] in duplicate_ids or store.row(entry["id"]) is not None:
+                        continue
+                    store.append(entry["id"], entry["text"], entry["metadata"])
+                    tokens.append(self._tokenize(entry["text"]))
             except Exception as e:
                 print(f"⚠️ Ошибка при загрузке {doc_type}: {e}")
 
         # Строим BM25
-        tokenized_corpus = [self._tokenize(doc["text"]) for doc in self.corpus]
-        self.bm25 = BM25Okapi(tokenized_corpus)
-        print(f"✅ BM25 индекс построен: {len(self.corpus)} документов")
+        index = InvertedIndex.build(tokens)
+        if fingerprint:
+            try:
+                save_snapshot(self.snapshot_root, fingerprint, index, store)
+            except OSError as e:
+                print(f"⚠️ Не удалось сохранить снимок BM25: {e}")
+                fingerprint = None
+
+        searchable = self._sharded(index, self._shards_dir(fingerprint) if fingerprint else None)
+        with self._lock:
+            self._reset(store, index, searchable)
+        print(f"✅ BM25 индекс построен: {len(store)} документов")
         return self
 
+    def _shards_dir(self, fingerprint: str) -> str:
+        return os.path.join(snapshot_dir(self.snapshot_root, fingerprint), f"shards-{BM25_SHARDS}")
+
+    def _sharded(self, index: InvertedIndex, directory: str = None):
+        """Большой индекс делится на шарды (в каталоге снимка или во временном), иначе возвращается как есть"""
+        if BM25_SHARDS < 2 or index.num_docs < BM25_SHARD_MIN_DOCS:
+            return index
+        sharded = ShardedIndex.open(directory) if directory else None
+        if sharded is None:
+            try:
+                sharded = ShardedIndex.create(index, BM25_SHARDS, directory)
+            except OSError as e:
+                print(f"⚠️ Не удалось разделить BM25 индекс на шарды: {e}")
+                return index
+        return sharded
+
+    def _reset(self, store: DocStore, index: InvertedIndex, searchable=None):
+        self._store = store
+        self._deleted = np.zeros(len(store), dtype=bool)
+        self._segments = [_Segment(searchable or index, np.arange(len(store), dtype=np.int64))]
+        self._generation += 1
+        self._df = Counter()
+        self._total_length = int(np.sum(index.doc_lengths))
+        for term, term_id in index.vocab.items():
+            self._df[term] = int(index.offsets[term_id + 1] - index.offsets[term_id])
+
+    def close(self):
+        """Отписывается от изменений базы знаний (индекс больше не обновляется)"""
+        self.kb_loader.unsubscribe(self.apply_changes)
+
+    def apply_changes(self, collection_name: str, upserted: List[Document], removed_ids: List[str]):
+        """Обновляет индекс по изменениям одной коллекции (подписка на KnowledgeBaseLoader)"""
+        doc_type = BM25_COLLECTIONS.get(collection_name)
+        if doc_type is None:
+            return
+        removed = self.remove_documents(removed_ids)
+        added = self.add_documents(upserted, doc_type)
+        self.updates += 1
+        print(f"🔄 BM25 индекс обновлён: +{added} / -{removed}, сегментов {len(self._segments)}")
+
+    def add_documents(self, documents: List[Document], doc_type: str = "doc") -> int:
+        """Добавляет (или заменяет по ID) документы одним новым сегментом"""
+        entries = list({entry["id"]: entry for entry in (self._corpus_entry(doc_type, doc) for doc in documents)}.values())
+        if not entries:
+            return 0
+
+        tokens = [self._tokenize(entry["text"]) for entry in entries]
+        with self._lock:
+            self._remove_locked(entry["id"] for entry in entries)
+
+            start = len(self._store)
+            rows = np.arange(start, start + len(entries), dtype=np.int64)
+            for entry, doc_tokens in zip(entries, tokens):
+                self._store.append(entry["id"], entry["text"], entry["metadata"])
+                self._df.update(set(doc_tokens))
+                self._total_length += len(doc_tokens)
+            self._grow_deleted(len(self._store))
+
+            index = InvertedIndex.build(tokens, collection_stats=self._collection_stats())
+            self._segments = self._segments + [_Segment(index, rows)]
+            self._maybe_merge()
+        return len(entries)
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        with self._lock:
+            removed = self._remove_locked(doc_ids)
+            if removed:
+                self._maybe_merge()
+        return removed
+
+    def _remove_locked(self, doc_ids: Iterable[str]) -> int:
+        rows = []
+        for doc_id in doc_ids:
+            row = self._store.delete(doc_id)
+            if row is None:
+                continue
+            # Токены не храним: слова удаляемого документа уже в кэше анализатора
+            doc_tokens = self._tokenize(self._store.text(row))
+            self._df.subtract(set(doc_tokens))
+            self._total_length -= len(doc_tokens)
+            rows.append(row)
+        if rows:
+            # Маску не меняем на месте: идущий поиск работает со своей копией и своим числом удалённых
+            deleted = self._deleted.copy()
+            deleted[rows] = True
+            self._deleted = deleted
+        return len(rows)
+
+    def _grow_deleted(self, size: int):
+        # Маску удалённых наращиваем с запасом, чтобы не копировать её на каждое добавление
+        if size > len(self._deleted):
+            grown = np.zeros(max(size, 2 * len(self._deleted)), dtype=bool)
+            grown[:len(self._deleted)] = self._deleted
+            self._deleted = grown
+
+    def _collection_stats(self):
+        live = self._store.live_count
+        return live, (self._total_length / live if live else 1.0), self._df
+
+    def _maybe_merge(self):
+        if self._merging:
+            return
+        total = len(self._store)
+        deleted_ratio = (total - self._store.live_count) / total if total else 0.0
+        if len(self._segments) > BM25_MAX_SEGMENTS or deleted_ratio > BM25_MERGE_DELETED_RATIO:
+            self._merging = True
+            threading.Thread(target=self._merge, name="bm25-merge", daemon=True).start()
+
+    def _merge(self):
+        """
+        Сливает все текущие сегменты в один по живым документам (с актуальными IDF)
+        и пересобирает хранилище без удалённых строк — место удалённых документов освобождается.
+        """
+        try:
+            with self._lock:
+                generation, segments, store = self._generation, self._segments, self._store
+                rows = np.concatenate([segment.rows for segment in segments]) if segments else np.zeros(0, np.int64)
+                rows = np.sort(rows[~self._deleted[rows]])
+                merged_count = len(store)
+
+            # Токенизация, сборка и копирование живых строк — без блокировки, поиск в это время
+            # идёт по старым сегментам и хранилищу. Текст удалённого за это время документа ещё на месте
+            tokens = [self._tokenize(store.text(row)) for row in rows.tolist()]
+            index = self._sharded(InvertedIndex.build(tokens))
+            compacted = DocStore()
+            compacted.extend(store, rows.tolist())
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                # Удалённое во время слияния удаляем и в новом хранилище, добавленное — дописываем
+                for row in np.flatnonzero(self._deleted[rows]).tolist():
+                    compacted.delete_row(row)
+                tail = np.arange(merged_count, len(store), dtype=np.int64)
+                compacted.extend(store, tail.tolist())
+
+                remap = np.full(len(store), -1, dtype=np.int64)
+                remap[rows] = np.arange(len(rows), dtype=np.int64)
+                remap[tail] = np.arange(len(rows), len(rows) + len(tail), dtype=np.int64)
+                deleted = np.zeros(len(compacted), dtype=bool)
+                deleted[len(rows):] = self._deleted[tail]
+                deleted[:len(rows)] = self._deleted[rows]
+
+                self._store, self._deleted = compacted, deleted
+                # Сегменты, добавленные во время слияния, остаются как есть — с перенумерованными строками
+                self._segments = [_Segment(index, np.arange(len(rows), dtype=np.int64))] + [
+                    _Segment(segment.index, remap[segment.rows]) for segment in self._segments[len(segments):]
+                ]
+                self._generation += 1
+        finally:
+            self._merging = False
+        print(f"✅ BM25 сегменты слиты: {len(rows)} документов")
+
+    @property
+    def store(self) -> DocStore:
+        return self._store
+
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        if self.bm25 is None:
-            return []
-
-        tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        top_indices = scores.argsort()[::-1][:top_k]
-
-        results = []
-        for i in top_indices:
-            score = float(scores[i])
-            if score > 0:
-                doc = self.corpus[i]
+        # Документ могут удалить между поиском и чтением из хранилища — тогда ищем ещё раз
+        for _ in range(3):
+            store, rows, scores = self.search_rows(query, top_k)
+            results = []
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                doc = store.doc(row)
+                if doc is None:
+                    continue
                 results.append({
                     "id": doc["id"],
                     "text": doc["text"],
                     "score": score,
                     "metadata": doc["metadata"]
                 })
+            if len(results) == len(rows):
+                break
         return results
+
+    def search_rows(self, query: str, top_k: int = 5) -> Tuple[DocStore, np.ndarray, np.ndarray]:
+        """
+        Строки хранилища и счета без сборки документов (для слияния с другими
+        ретриверами). Строки относятся к возвращённому хранилищу: при
+        пересборке индекса или слиянии сегментов оно заменяется новым.
+        Результат согласован на момент поиска; документ, удалённый после него,
+        `store.doc` уже не вернёт — `search` в этом случае ищет заново.
+        """
+        # Индекс могут менять из потока синхронизации — работаем со снимком
+        with self._lock:
+            store, segments, deleted = self._store, self._segments, self._deleted
+            deleted_count = len(store) - store.live_count
+        if not segments:
+            return store, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query_tokens = self.analyzer.analyze_query(query)
+        if len(segments) == 1 and not deleted_count:
+            local, scores = segments[0].index.search(query_tokens, top_k=top_k)
+            rows = segments[0].rows[local]
+        else:
+            # Среди первых top_k + число удалённых в каждом сегменте точно есть его живой top_k
+            limit = top_k + deleted_count
+            rows_parts, score_parts = [], []
+            for segment in segments:
+                local, segment_scores = segment.index.search(query_tokens, top_k=limit)
+                rows_parts.append(segment.rows[local])
+                score_parts.append(segment_scores)
+            rows, scores = np.concatenate(rows_parts), np.concatenate(score_parts)
+            alive = ~deleted[rows]
+            rows, scores = rows[alive], scores[alive]
+            if top_k < len(scores):
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            rows, scores = rows[order], scores[order]
+        return store, rows, scores
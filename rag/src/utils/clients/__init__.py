@@ -1 +1,5 @@
-from .embedding_client import YandexEmbeddingFunction, get_chroma_client
\ No newline at end of file
+from .embedding_client import YandexEmbeddingFunction, get_chroma_client
+from .hashing_embedding import HashingEmbeddingFunction
+from .providers import EMBEDDING_PROVIDERS, register_embedding_provider, create_embedding_function
+from .embedding_cache import EmbeddingCache, CachedEmbeddingFunction
+from .query_context import QueryEmbeddingContext
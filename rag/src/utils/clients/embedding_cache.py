@@ -0,0 +1,202 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Дисковый кэш эмбеддингов на SQLite.
+
+    Ключ — (URI модели, sha256 текста). При превышении `max_entries`
+    вытесняются записи, к которым дольше всего не обращались (LRU).
+    Векторы можно хранить в float16 — вдвое компактнее, наружу всегда отдаётся float32.
+    """
+
+    # SQLite ограничивает число параметров в одном запросе
+    _BATCH_SIZE = 500
+
+    def __init__(self, path: str, max_entries: int = 200_000, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Неподдерживаемый тип хранения: {dtype}")
+        self.path = path
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_uri TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model_uri, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_uri: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Возвращает векторы в порядке `texts`; None — промах."""
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(hashes), self._BATCH_SIZE):
+                batch = list(set(hashes[start:start + self._BATCH_SIZE]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dim, vector FROM embeddings WHERE model_uri = ? AND text_hash IN ({placeholders})",
+                    [model_uri, *batch],
+                ).fetchall()
+                for text_hash, dim, vector in rows:
+                    # Тип хранения определяем по размеру blob: в файле могут быть записи разных dtype
+                    stored_dtype = np.float16 if len(vector) == dim * 2 else np.float32
+                    found[text_hash] = np.frombuffer(vector, dtype=stored_dtype).astype(np.float32)
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model_uri = ? AND text_hash = ?",
+                    [(now, model_uri, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+
+            result = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(vector is not None for vector in result)
+            self.hits += hit_count
+            self.misses += len(result) - hit_count
+
+        return result
+
+    def put_many(self, model_uri: str, texts: List[str], vectors: List[np.ndarray]):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((model_uri, self.text_hash(text), vector.shape[0], vector.astype(self.dtype).tobytes(), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_uri, text_hash, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+            "dtype": self.dtype.name,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddingFunction:
+    """
+    Обёртка над функцией эмбеддингов: сначала смотрит в EmbeddingCache,
+    в сеть уходят только промахи (и каждый уникальный текст — один раз).
+    """
+
+    def __init__(self, embedding_fn, cache: EmbeddingCache):
+        self.embedding_fn = embedding_fn
+        self.cache = cache
+
+    @property
+    def model_uri(self) -> str:
+        return self.embedding_fn.model_uri
+
+    def _split_misses(self, texts: List[str]):
+        cached = self.cache.get_many(self.model_uri, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        return cached, missing
+
+    def _merge(self, texts, cached, missing, embeddings) -> List[np.ndarray]:
+        if missing:
+            self.cache.put_many(self.model_uri, missing, embeddings)
+        computed = dict(zip(missing, embeddings))
+        return [vector if vector is not None else computed[text] for text, vector in zip(texts, cached)]
+
+    def embed_documents(self, texts: list):
+        """Embed multiple document texts."""
+        texts = list(texts)
+        if not texts:
+            return []
+        cached, missing = self._split_misses(texts)
+        embeddings = self.embedding_fn.embed_documents(missing) if missing else []
+        return self._merge(texts, cached, missing, embeddings)
+
+    async def aembed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        texts = list(texts)
+        if not texts:
+            return []
+        cached, missing = self._split_misses(texts)
+        embeddings = await self.embedding_fn.aembed_documents(missing) if missing else []
+        return self._merge(texts, cached, missing, embeddings)
+
+    def embed_query(self, input: str):
+        """Embed a single query text."""
+        return self.embed_documents([input])[0]
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        embeddings = await self.aembed_documents([text])
+        return embeddings[0]
+
+    def __call__(self, input):
+        if isinstance(input, list):
+            return self.embed_documents(input)
+        elif isinstance(input, str):
+            return self.embed_query(input)
+        else:
+            raise ValueError("wrong type for call embedding function")
+
+    def close(self):
+        self.embedding_fn.close()
+        self.cache.close()
+
+    def name(self):
+        return self.embedding_fn.name()
@@ -1,3 +1,7 @@
+import asyncio
+import threading
+from typing import List
+
 from chromadb import HttpClient
 
 from chromadb.api.types import (
@@ -6,68 +10,192 @@ from chromadb.api.types import (
     Embeddings
 )
 
-import requests
-import time
+import httpx
 import numpy as np
 
+from config import (
+    EMBEDDING_PROVIDER,
+    EMBEDDING_RPS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_DTYPE,
+)
+from .embedding_cache import EmbeddingCache, CachedEmbeddingFunction
+from .hashing_embedding import HashingEmbeddingFunction
+from .providers import register_embedding_provider, create_embedding_function
+from .rate_limiter import TokenBucket
+
+
 class YandexEmbeddingFunction:
-    def __init__(self, api_key: str, folder_id: str):
+    """
+    Клиент эмбеддингов Yandex Cloud.
+
+    Все запросы выполняются на собственном фоновом event loop через один
+    httpx.AsyncClient (пул соединений переиспользуется), с ограничением
+    параллелизма и token bucket вместо sleep после каждого запроса.
+    Синхронные методы — фасад над асинхронными.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        folder_id: str,
+        rps: float = EMBEDDING_RPS,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+    ):
         self.doc_uri = f"emb://{folder_id}/text-search-doc/latest"
         self.query_uri = f"emb://{folder_id}/text-search-query/latest"
         self.embed_url = "https://llm.api.cloud.yandex.net:443/foundationModels/v1/textEmbedding"
         self.headers = {"Content-Type": "application/json", "Authorization": f"Api-Key {api_key}", "x-folder-id": f"{folder_id}"}
         self.query_model = f"emb://{folder_id}/text-search-query/latest"
 
-    def _embed_text(self, text: str):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self._rate_limiter = TokenBucket(rate=rps)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def model_uri(self) -> str:
+        # И документы, и запросы эмбеддятся query-моделью — так исторически лежат векторы в Chroma
+        return self.query_uri
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="yandex-embeddings",
+                    daemon=True,
+                )
+                self._thread.start()
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Вызывается только внутри фонового loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+        return self._client
+
+    async def _aembed_text(self, text: str) -> np.ndarray:
         query_data = {
-            "modelUri": self.query_uri,
+            "modelUri": self.model_uri,
             "text": text,
         }
 
-        response = requests.post(self.embed_url, json=query_data, headers=self.headers)
-        response.raise_for_status()
-        embedding_list = response.json()["embedding"]
-        embedding = np.array(embedding_list, dtype=np.float32)
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._rate_limiter.acquire()
+                try:
+                    response = await self._get_client().post(self.embed_url, json=query_data)
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
 
-        # Задержка для соблюдения рейт-лимита (Yandex: ~10 RPS)
-        time.sleep(0.1)
+                # 429 и 5xx — повторяем с экспоненциальной задержкой
+                if (response.status_code == 429 or response.status_code >= 500) and attempt < self.max_retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+
+                response.raise_for_status()
+                embedding_list = response.json()["embedding"]
+                return np.array(embedding_list, dtype=np.float32)
+
+    async def _aembed_many(self, texts: List[str]) -> List[np.ndarray]:
+        return list(await asyncio.gather(*(self._aembed_text(text) for text in texts)))
+
+    async def aembed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """Асинхронно эмбеддит пачку текстов (параллельно, в пределах рейт-лимита)."""
+        if not texts:
+            return []
+        return await asyncio.wrap_future(self._submit(self._aembed_many(list(texts))))
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Асинхронно эмбеддит один запрос."""
+        embeddings = await self.aembed_documents([text])
+        return embeddings[0]
 
-        return embedding
-    
     def __call__(self, input) -> Embeddings:
         if isinstance(input, list):
-            
-            return [self._embed_text(text) for text in input]
+            return self.embed_documents(input)
         elif isinstance(input, str):
-            return self._embed_text(input)
+            return self.embed_query(input)
         else:
             raise ValueError("wrong type for call embedding function")
-        
-        
+
     def embed_query(self, input: str):
         """Embed a single query text."""
-        output = self(input)
-        return output
-        
+        return self.embed_documents([input])[0]
+
     def embed_documents(self, texts: list):
         """Embed multiple document texts."""
-        pass
-    
+        if not texts:
+            return []
+        return self._submit(self._aembed_many(list(texts))).result()
+
+    def close(self):
+        """Закрывает пул соединений и останавливает фоновый loop."""
+        if self._loop is None:
+            return
+        if self._client is not None:
+            self._submit(self._client.aclose()).result()
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
     def name(self):
         return f"yandex-embeddings-"
 
+
+@register_embedding_provider("yandex")
+def create_yandex_embedding_function(yandex_api_key: str = None, yandex_folder_id: str = None, **kwargs) -> YandexEmbeddingFunction:
+    return YandexEmbeddingFunction(api_key=yandex_api_key, folder_id=yandex_folder_id)
+
+
 def get_chroma_client(
     chroma_url: str = "http://localhost:8000",
     yandex_api_key: str = None,
-    yandex_folder_id: str = None
+    yandex_folder_id: str = None,
+    embedding_provider: str = EMBEDDING_PROVIDER
 ):
     client = HttpClient(host="localhost", port=8016)
 
-    embedding_function = YandexEmbeddingFunction(
-        api_key=yandex_api_key,
-        folder_id=yandex_folder_id
+    embedding_function = create_embedding_function(
+        embedding_provider,
+        yandex_api_key=yandex_api_key,
+        yandex_folder_id=yandex_folder_id
     )
 
+    if EMBEDDING_CACHE_PATH:
+        embedding_function = CachedEmbeddingFunction(
+            embedding_function,
+            EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, dtype=EMBEDDING_CACHE_DTYPE)
+        )
+
     return client, embedding_function
 
 
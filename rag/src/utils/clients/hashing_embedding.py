@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_HASHING_DIM
+from .providers import register_embedding_provider
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddingFunction:
+    """
+    Локальные эмбеддинги без сети (hashing trick).
+
+    Признаки — слова и символьные n-граммы слов (n-граммы сглаживают
+    русские окончания), хешируются со знаком в вектор фиксированной
+    размерности, tf берётся сублинейно, вектор нормируется по L2.
+    Подходит для офлайн-запусков, CI и замеров задержек.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_HASHING_DIM, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self._feature_slot = lru_cache(maxsize=200_000)(self._hash_feature)
+
+    @property
+    def model_uri(self) -> str:
+        return f"local://hashing/{self.dim}/{self.ngram}"
+
+    def _hash_feature(self, feature: str) -> Tuple[int, float]:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        sign = 1.0 if digest & 1 else -1.0
+        return (digest >> 1) % self.dim, sign
+
+    def _features(self, text: str):
+        for word in _WORD_RE.findall(text.lower()):
+            yield word
+            padded = f"<{word}>"
+            for i in range(len(padded) - self.ngram + 1):
+                yield padded[i:i + self.ngram]
+
+    def _embed_text(self, text: str) -> np.ndarray:
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+
+        embedding = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            slot, sign = self._feature_slot(feature)
+            embedding[slot] += sign * (1.0 + np.log(count))
+
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding /= norm
+        return embedding
+
+    def __call__(self, input):
+        if isinstance(input, list):
+            return self.embed_documents(input)
+        elif isinstance(input, str):
+            return self.embed_query(input)
+        else:
+            raise ValueError("wrong type for call embedding function")
+
+    def embed_query(self, input: str):
+        """Embed a single query text."""
+        return self._embed_text(input)
+
+    def embed_documents(self, texts: list):
+        """Embed multiple document texts."""
+        return [self._embed_text(text) for text in texts]
+
+    async def aembed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        return await asyncio.to_thread(self.embed_documents, list(texts))
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def close(self):
+        pass
+
+    def name(self):
+        return f"hashing-embeddings-{self.dim}"
+
+
+@register_embedding_provider("hashing")
+def create_hashing_embedding_function(dim: int = EMBEDDING_HASHING_DIM, **kwargs) -> HashingEmbeddingFunction:
+    return HashingEmbeddingFunction(dim=dim)
@@ -0,0 +1,23 @@
+from typing import Callable, Dict, Any
+
+# Реестр провайдеров эмбеддингов: имя -> фабрика.
+# Фабрика принимает общие параметры (ключи Yandex и т.п.) через kwargs
+# и возвращает объект с контрактом __call__/embed_query/embed_documents.
+EMBEDDING_PROVIDERS: Dict[str, Callable[..., Any]] = {}
+
+
+def register_embedding_provider(name: str):
+    def decorator(factory: Callable[..., Any]):
+        EMBEDDING_PROVIDERS[name] = factory
+        return factory
+    return decorator
+
+
+def create_embedding_function(provider: str, **kwargs):
+    try:
+        factory = EMBEDDING_PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный провайдер эмбеддингов: {provider}. Доступны: {', '.join(sorted(EMBEDDING_PROVIDERS))}"
+        )
+    return factory(**kwargs)
@@ -0,0 +1,46 @@
+import threading
+from typing import Dict
+
+import numpy as np
+
+
+class QueryEmbeddingContext:
+    """
+    Эмбеддинги в рамках одного пользовательского запроса.
+
+    Каждый текст эмбеддится не больше одного раза, дальше вектор переиспользуется
+    во всех коллекциях, на этапах гибридного поиска и при поиске в кэшах.
+    """
+
+    def __init__(self, query: str, embedding_fn):
+        self.query = query
+        self.embedding_fn = embedding_fn
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, text: str = None) -> np.ndarray:
+        """Вектор для `text` (по умолчанию — для исходного запроса)."""
+        text = self.query if text is None else text
+        with self._lock:
+            if text not in self._embeddings:
+                self._embeddings[text] = self.embedding_fn.embed_query(text)
+            return self._embeddings[text]
+
+    async def aembed(self, text: str = None) -> np.ndarray:
+        text = self.query if text is None else text
+        if text not in self._embeddings:
+            embedding = await self.embedding_fn.aembed_query(text)
+            with self._lock:
+                self._embeddings.setdefault(text, embedding)
+        return self._embeddings[text]
+
+    @property
+    def embedding(self) -> np.ndarray:
+        return self.embed()
+
+    @classmethod
+    def ensure(cls, query_context, query: str, embedding_fn) -> 'QueryEmbeddingContext':
+        """Возвращает переданный контекст или создаёт новый для запроса."""
+        if query_context is None:
+            return cls(query, embedding_fn)
+        return query_context
@@ -0,0 +1,3 @@
+from .src import MinHashLSH
+
+__all__ = ["MinHashLSH"]
@@ -0,0 +1,131 @@
+# src/utils/dedup.py
+
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+# Простое число Мерсенна 2^31 - 1: (a * x + b) с 32-битными a, x помещается в uint64
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+class MinHashLSH:
+    """
+    Поиск почти-дубликатов текста: MinHash по шинглам из `shingle_size` слов
+    и LSH по `bands` полосам сигнатуры.
+
+    Кандидаты из общих корзин LSH проверяются по оценке сходства Жаккара
+    (доля совпавших позиций сигнатуры) — дубликатом считается кандидат
+    со сходством не ниже `threshold`.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 16,
+        threshold: float = 0.9,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm должен делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def _shingles(self, text: str) -> Set[str]:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash-сигнатура текста (uint32[num_perm]); None для текста без слов."""
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        ) % _PRIME
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray, prefix: str = "") -> Optional[Tuple[str, float]]:
+        """Самый похожий из сохранённых (ID, сходство) с ID на `prefix` — или None."""
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates |= self._buckets[band].get(key, set())
+
+        best = None
+        for candidate in candidates:
+            if not candidate.startswith(prefix):
+                continue
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def insert(self, key: str, signature: np.ndarray):
+        self.remove([key])
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, set()).add(key)
+
+    def remove(self, keys: Iterable[str]):
+        for key in keys:
+            signature = self.signatures.pop(key, None)
+            if signature is None:
+                continue
+            for band, band_key in self._band_keys(signature):
+                bucket = self._buckets[band].get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band][band_key]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def save(self, path: str):
+        keys = sorted(self.signatures)
+        signatures = np.stack([self.signatures[key] for key in keys]) if keys else np.empty((0, self.num_perm), np.uint32)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=np.array(keys, dtype=str), signatures=signatures)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str, keep: Set[str] = None) -> 'MinHashLSH':
+        """Загружает сигнатуры из файла; `keep` — оставить только эти ID (остальные устарели)."""
+        if not os.path.exists(path):
+            return self
+        try:
+            with np.load(path) as data:
+                keys, signatures = data["keys"], data["signatures"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Сигнатуры дубликатов {path} повреждены, будут пересозданы: {e}")
+            return self
+        if signatures.shape[1:] != (self.num_perm,):
+            return self
+        for key, signature in zip(keys.tolist(), signatures):
+            if keep is None or key in keep:
+                self.insert(key, signature)
+        return self
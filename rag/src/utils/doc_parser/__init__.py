@@ -0,0 +1 @@
+from .src import DocumentParser, ParseJob, BINARY_EXTENSIONS
\ No newline at end of file
@@ -0,0 +1,244 @@
+# src/utils/doc_parser.py
+
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import fitz
+from docx import Document as DocxDocument
+
+# Форматы, которые разбираются в пуле процессов (текстовые читаются потоково в основном процессе)
+BINARY_EXTENSIONS = {".pdf", ".docx"}
+
+Source = Union[bytes, str]
+
+
+def _extract_pdf_head(path: str, stop: int) -> Tuple[int, List[str]]:
+    """Число страниц и текст первых страниц: PDF открывается только в воркере"""
+    with fitz.open(path) as doc:
+        return doc.page_count, [doc[i].get_text() for i in range(min(stop, doc.page_count))]
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, min(stop, doc.page_count))]
+
+
+def _extract_docx(source: Source) -> List[str]:
+    doc = DocxDocument(BytesIO(source) if isinstance(source, bytes) else source)
+    paragraphs = []
+    for para in doc.paragraphs:
+        # Заголовки Word превращаем в markdown, чтобы чанкер резал по разделам
+        style = para.style.name if para.style is not None else ""
+        if style.startswith("Heading") and para.text.strip():
+            level = style.split()[-1]
+            level = int(level) if level.isdigit() else 1
+            paragraphs.append(f"{'#' * min(level, 6)} {para.text}")
+        else:
+            paragraphs.append(para.text)
+    return paragraphs
+
+
+class ParseJob:
+    """
+    Разбор одного файла в пуле. Для PDF первая задача возвращает число страниц
+    и первый диапазон, остальные диапазоны отправляются в пул после неё.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        parser: 'DocumentParser',
+        executor: ProcessPoolExecutor,
+        ext: str,
+        path: str,
+        temp_path: Optional[str] = None,
+    ):
+        self.name = name
+        self.parser = parser
+        self.executor = executor
+        self.ext = ext
+        self.path = path
+        self.temp_path = temp_path  # bytes, сброшенные на диск один раз для всех задач
+        self.released = False
+        if ext == ".pdf":
+            self.futures = [executor.submit(_extract_pdf_head, path, parser.pdf_pages_per_task)]
+        else:
+            self.futures = [executor.submit(_extract_docx, path)]
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+        self.cleanup()
+
+    def cleanup(self):
+        if not self.released:
+            self.released = True
+            self.parser.release_pool(self.executor)
+        if self.temp_path is not None:
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+            self.temp_path = None
+
+    def result(self) -> List[str]:
+        timeout = self.parser.timeout
+        deadline = time.monotonic() + timeout
+        try:
+            if self.ext != ".pdf":
+                return self.futures[0].result(timeout=timeout)
+
+            page_count, parts = self.futures[0].result(timeout=timeout)
+            step = self.parser.pdf_pages_per_task
+            self.futures.extend(
+                self.executor.submit(_extract_pdf_pages, self.path, start, start + step)
+                for start in range(step, page_count, step)
+            )
+            for future in self.futures[1:]:
+                parts.extend(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            return parts
+        except TimeoutError:
+            # Отмена future не останавливает уже идущую задачу: зависший файл держал бы воркер,
+            # поэтому пул выводится из работы и завершается, когда его отпустят остальные файлы
+            self.parser.retire_pool(self.executor)
+            raise TimeoutError(f"Разбор {self.name} не уложился в {timeout} сек")
+        finally:
+            self.cleanup()
+
+
+class DocumentParser:
+    """
+    Извлечение текста из PDF/DOCX в ограниченном ProcessPoolExecutor.
+
+    Большие PDF режутся на диапазоны по `pdf_pages_per_task` страниц и
+    разбираются параллельно; на каждый файл действует таймаут. После
+    таймаута новые файлы идут в новый пул, а старый дорабатывает уже
+    начатые в нём файлы других потоков и только потом завершает свои
+    воркеры (вместе с зависшим). Через
+    `prefetch` можно заранее отправить в пул файлы директории: в работе
+    держится не больше `prefetch_window` из них, следующие отправляются по
+    мере разбора, невостребованные снимаются `cancel_prefetch`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        timeout: float = 120.0,
+        pdf_pages_per_task: int = 16,
+        prefetch_window: int = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.prefetch_window = prefetch_window or 2 * self.max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._users: Dict[ProcessPoolExecutor, int] = {}  # пул -> сколько незавершённых файлов в нём
+        self._retired = set()
+        # Очередь заблаговременного разбора общая для потоков загрузки
+        self._prefetch_lock = threading.Lock()
+        self._queued: "OrderedDict[str, str]" = OrderedDict()  # путь -> расширение, ещё не отправлены
+        self._prefetched: "OrderedDict[str, ParseJob]" = OrderedDict()
+
+    def _acquire_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._users[self._executor] = self._users.get(self._executor, 0) + 1
+            return self._executor
+
+    def release_pool(self, executor: ProcessPoolExecutor):
+        """Файл в пуле разобран или снят; выведенный из работы пул без файлов завершается"""
+        with self._lock:
+            self._users[executor] -= 1
+            if self._users[executor] or executor not in self._retired:
+                return
+            del self._users[executor]
+            self._retired.discard(executor)
+        self._terminate(executor)
+
+    def retire_pool(self, executor: ProcessPoolExecutor):
+        """Новые файлы пойдут в новый пул; этот завершится, когда его отпустят все начатые в нём файлы"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+            if self._users.get(executor):
+                self._retired.add(executor)
+                return
+            self._users.pop(executor, None)
+        self._terminate(executor)
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        # shutdown не прерывает идущие задачи — зависший воркер завершаем явно
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, source: Source, ext: str, name: str = None) -> ParseJob:
+        if ext not in BINARY_EXTENSIONS:
+            raise ValueError(f"Формат {ext} не разбирается в пуле процессов")
+        name = name or (source if isinstance(source, str) else "<bytes>")
+        temp_path = None
+        if isinstance(source, bytes):
+            # В задачи передаём путь, а не содержимое: иначе файл копировался бы в каждый диапазон страниц
+            fd, temp_path = tempfile.mkstemp(suffix=ext)
+            with os.fdopen(fd, "wb") as f:
+                f.write(source)
+        path = temp_path or source
+        executor = self._acquire_executor()
+        try:
+            return ParseJob(name, self, executor, ext, path, temp_path)
+        except Exception:
+            self.release_pool(executor)
+            if temp_path is not None:
+                os.remove(temp_path)
+            raise
+
+    def prefetch(self, items: Iterable[Tuple[str, str]]):
+        """Ставит в очередь заблаговременного разбора файлы (путь, расширение)."""
+        with self._prefetch_lock:
+            for path, ext in items:
+                if ext in BINARY_EXTENSIONS and path not in self._prefetched:
+                    self._queued[path] = ext
+            self._fill_prefetch_locked()
+
+    def _fill_prefetch_locked(self):
+        while self._queued and len(self._prefetched) < self.prefetch_window:
+            path, ext = self._queued.popitem(last=False)
+            self._prefetched[path] = self.submit(path, ext)
+
+    def cancel_prefetch(self):
+        """Снимает заблаговременный разбор файлов, которые так и не понадобились"""
+        with self._prefetch_lock:
+            self._queued.clear()
+            jobs = list(self._prefetched.values())
+            self._prefetched.clear()
+        for job in jobs:
+            job.cancel()
+
+    def parse(self, source: Source, ext: str) -> List[str]:
+        """Текст документа: страницы для PDF, абзацы для DOCX."""
+        job = None
+        if isinstance(source, str):
+            with self._prefetch_lock:
+                self._queued.pop(source, None)
+                # Файл мог уйти в пул, выведенный из работы после чужого таймаута: пул дорабатывает начатое
+                job = self._prefetched.pop(source, None)
+                self._fill_prefetch_locked()
+        if job is None:
+            job = self.submit(source, ext)
+        return job.result()
+
+    def shutdown(self):
+        self.cancel_prefetch()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1 @@
+from .src import IdSpace, fuse, RRF, WEIGHTED, NORMALIZED, FUSION_MODES
\ No newline at end of file
@@ -0,0 +1,104 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RRF = "rrf"
+WEIGHTED = "weighted"
+NORMALIZED = "normalized"
+FUSION_MODES = (RRF, WEIGHTED, NORMALIZED)
+
+# Ранжирование одного ретривера: целые ID и счета, лучшие первыми
+Ranking = Tuple[np.ndarray, np.ndarray]
+
+
+class IdSpace:
+    """
+    Общее для всех ретриверов пространство целых ID.
+
+    Постоянные номера даёт `row_of` (строки DocStore индекса BM25): ID,
+    известные индексу, получают номер своей строки без построения словарей
+    на запрос. Остальные ID получают номера начиная с `size` — только в
+    пределах этого экземпляра (одного запроса).
+    """
+
+    def __init__(self, row_of: Callable[[str], Optional[int]] = None, size: int = 0):
+        self._row_of = row_of
+        self.size = size
+        self._extra: Dict[str, int] = {}
+        self._extra_ids: List[str] = []
+
+    def encode(self, doc_ids: Sequence[str]) -> np.ndarray:
+        encoded = np.empty(len(doc_ids), dtype=np.int64)
+        for i, doc_id in enumerate(doc_ids):
+            row = self._row_of(doc_id) if self._row_of is not None else None
+            if row is None:
+                row = self._extra.get(doc_id)
+                if row is None:
+                    row = self._extra[doc_id] = self.size + len(self._extra_ids)
+                    self._extra_ids.append(doc_id)
+            encoded[i] = row
+        return encoded
+
+    def extra_id(self, number: int) -> Optional[str]:
+        """Строковый ID для номера вне постоянного пространства"""
+        index = number - self.size
+        return self._extra_ids[index] if 0 <= index < len(self._extra_ids) else None
+
+
+def _contributions(scores: np.ndarray, mode: str, k: int) -> np.ndarray:
+    if mode == RRF:
+        return 1.0 / (k + 1 + np.arange(len(scores), dtype=np.float64))
+    scores = np.asarray(scores, dtype=np.float64)
+    if mode == WEIGHTED:
+        return scores
+    if mode == NORMALIZED:
+        # min-max в [0, 1]; у единственного (или одинаковых) результата — 1
+        if not len(scores):
+            return scores
+        low, high = scores.min(), scores.max()
+        if high - low <= 0:
+            return np.ones_like(scores)
+        return (scores - low) / (high - low)
+    raise ValueError(f"Неизвестный режим слияния: {mode}, доступны {', '.join(FUSION_MODES)}")
+
+
+def fuse(
+    rankings: Sequence[Ranking],
+    mode: str = RRF,
+    weights: Sequence[float] = None,
+    top_k: Optional[int] = 5,
+    k: int = 60,
+) -> Ranking:
+    """
+    Сливает ранжирования нескольких ретриверов в одно (ID и итоговые счета по убыванию).
+
+    rrf — сумма `w / (k + ранг)`, weighted — сумма `w * счёт`,
+    normalized — сумма `w * счёт`, где счета каждого ретривера сведены min-max к [0, 1].
+    При равных счетах выше документ с меньшим ID. `top_k <= 0` — пустой результат.
+    """
+    if top_k is not None and top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    weights = weights or [1.0] * len(rankings)
+    id_parts, contribution_parts = [], []
+    for (ids, scores), weight in zip(rankings, weights):
+        if len(ids) == 0:
+            continue
+        id_parts.append(np.asarray(ids, dtype=np.int64))
+        contribution_parts.append(weight * _contributions(scores, mode, k))
+    if not id_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    ids, positions = np.unique(np.concatenate(id_parts), return_inverse=True)
+    fused = np.bincount(positions, weights=np.concatenate(contribution_parts), minlength=len(ids))
+
+    # top_k не больше числа кандидатов: иначе отбирать нечего
+    top_k = len(fused) if top_k is None else min(top_k, len(fused))
+    if top_k < len(fused):
+        # Порог — top_k-й по величине счёт; из равных порогу берём меньшие ID (ids отсортированы)
+        cut = np.partition(fused, len(fused) - top_k)[len(fused) - top_k]
+        above = np.flatnonzero(fused > cut)
+        tied = np.flatnonzero(fused == cut)[:top_k - len(above)]
+        top = np.sort(np.concatenate([above, tied]))
+        ids, fused = ids[top], fused[top]
+    order = np.argsort(-fused, kind="stable")
+    return ids[order], fused[order]
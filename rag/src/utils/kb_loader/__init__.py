@@ -1,6 +1,9 @@
 from config import YANDEX_API_KEY, YANDEX_FOLDER_ID, CHROMA_DEFAULT_URL, KB_PATH
+from .jobs import IngestionJob, IngestionQueue
 from .loader import KnowledgeBaseLoader
-from .loader_to_chroma import load_knowledge_base_to_chroma
+from .loader_to_chroma import load_knowledge_base_to_chroma, sync_knowledge_base
+from .watcher import KBWatcher
+from .changes import KBChangeFeed
 
 
 kb_loader = KnowledgeBaseLoader(
@@ -10,4 +13,5 @@ kb_loader = KnowledgeBaseLoader(
     yandex_folder_id=YANDEX_FOLDER_ID
 )
 
-__all__ = ['kb_loader', 'load_knowledge_base_to_chroma', 'KnowledgeBaseLoader']
\ No newline at end of file
+__all__ = ['kb_loader', 'load_knowledge_base_to_chroma', 'KnowledgeBaseLoader', 'IngestionJob', 'IngestionQueue',
+           'sync_knowledge_base', 'KBWatcher', 'KBChangeFeed']
\ No newline at end of file
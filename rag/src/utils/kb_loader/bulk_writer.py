@@ -0,0 +1,126 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+
+class ChromaBulkWriter:
+    """
+    Пакетная запись чанков в Chroma.
+
+    Чанки копятся по коллекциям и уходят в `upsert` пачками не больше
+    `batch_size`. Пачка эмбеддится целиком (клиент эмбеддингов сам
+    распараллеливает запросы в пределах лимитов), а запись в Chroma идёт в
+    фоновом потоке — пока пишется одна пачка, эмбеддится следующая.
+    Колбэк из `add` вызывается в потоке вызывающего, когда все чанки
+    документа записаны.
+    """
+
+    def __init__(self, chroma_client, embedding_fn, batch_size: int = 256, max_pending: int = 2):
+        self.chroma_client = chroma_client
+        self.embedding_fn = embedding_fn
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.chunks_written = 0
+        self._collections = {}
+        self._buffers: Dict[str, List[Document]] = {}
+        self._callbacks: Dict[str, List[Callable[[], None]]] = {}
+        self._pending: Deque[Tuple[Future, List[Callable[[], None]]]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
+
+    def _collection(self, name: str):
+        if name not in self._collections:
+            self._collections[name] = self.chroma_client.get_collection(name)
+        return self._collections[name]
+
+    def existing_ids(self, collection_name: str, ids: Iterable[str]) -> Set[str]:
+        """Какие из `ids` уже есть в коллекции — одним `get` на пачку, без документов и векторов."""
+        ids = list(dict.fromkeys(ids))
+        collection = self._collection(collection_name)
+        existing = set()
+        for start in range(0, len(ids), self.batch_size):
+            existing.update(collection.get(ids=ids[start:start + self.batch_size], include=[])["ids"])
+        return existing
+
+    def add(self, collection_name: str, chunks: List[Document], callback: Optional[Callable[[], None]] = None):
+        buffer = self._buffers.setdefault(collection_name, [])
+        callbacks = self._callbacks.setdefault(collection_name, [])
+
+        for chunk in chunks:
+            buffer.append(chunk)
+            if len(buffer) >= self.batch_size:
+                self._flush_collection(collection_name)
+                buffer = self._buffers[collection_name]
+                callbacks = self._callbacks[collection_name]
+
+        if callback is not None:
+            # Пачка с последним чанком документа уже ушла — ждём её завершения
+            if not buffer and self._pending:
+                self._pending[-1][1].append(callback)
+            elif not buffer:
+                callback()
+            else:
+                callbacks.append(callback)
+        self._collect(wait=False)
+
+    def delete(self, collection_name: str, ids: Iterable[str]):
+        ids = list(ids)
+        collection = self._collection(collection_name)
+        for start in range(0, len(ids), self.batch_size):
+            collection.delete(ids=ids[start:start + self.batch_size])
+
+    def flush(self):
+        for collection_name in list(self._buffers):
+            self._flush_collection(collection_name)
+        self._collect(wait=True)
+
+    def _flush_collection(self, collection_name: str):
+        batch = self._buffers.get(collection_name) or []
+        callbacks = self._callbacks.get(collection_name) or []
+        self._buffers[collection_name], self._callbacks[collection_name] = [], []
+        if not batch:
+            for callback in callbacks:
+                callback()
+            return
+
+        embeddings = self.embedding_fn.embed_documents([chunk.page_content for chunk in batch])
+
+        # Ограничиваем число пачек в очереди записи, чтобы не копить векторы в памяти
+        while len(self._pending) >= self.max_pending:
+            self._collect_one()
+
+        future = self._executor.submit(
+            self._collection(collection_name).upsert,
+            ids=[chunk.metadata["chunk_id"] for chunk in batch],
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+            embeddings=[embedding.tolist() for embedding in embeddings],
+        )
+        self._pending.append((future, callbacks))
+        self.chunks_written += len(batch)
+
+    def _collect_one(self):
+        future, callbacks = self._pending.popleft()
+        future.result()
+        for callback in callbacks:
+            callback()
+
+    def _collect(self, wait: bool):
+        while self._pending and (wait or self._pending[0][0].done()):
+            self._collect_one()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,105 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+from langchain_core.documents import Document
+
+from .loader import KnowledgeBaseLoader
+from .manifest import KBManifest
+
+
+class KBChangeFeed:
+    """
+    Изменения базы знаний, сделанные другими процессами (загрузки через API,
+    `--sync-kb`, `--watch-kb` в отдельном процессе), для подписчиков загрузчика
+    этого процесса: индекса BM25, зеркала векторов, кэшей ответов.
+
+    Общий для процессов источник — манифест рядом с базой знаний. Раз в
+    `interval` секунд он перечитывается и сравнивается с состоянием, о котором
+    подписчики уже знают (`KnowledgeBaseLoader.mark_notified`); чанки
+    изменённых файлов читаются из Chroma по ID и рассылаются через `notify`.
+    Изменения, сделанные в этом же процессе, повторно не рассылаются.
+    Документы, загруженные в обход манифеста (не из папки базы знаний),
+    другие процессы не видят.
+    """
+
+    def __init__(self, loader: KnowledgeBaseLoader, interval: float = 5.0):
+        self.loader = loader
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _state(manifest: KBManifest) -> Dict[str, Dict[str, Any]]:
+        return {
+            relpath: {"collection": entry["collection"], "sha256": entry["sha256"], "chunk_ids": list(entry["chunk_ids"])}
+            for relpath, entry in manifest.entries.items()
+        }
+
+    def poll(self) -> int:
+        """Рассылает изменения с прошлого опроса; возвращает число изменившихся файлов"""
+        # Под блокировкой манифеста: синхронизация этого процесса не должна попасть в ленту наполовину
+        with self.loader.manifest_lock:
+            current = self._state(KBManifest.load(self.loader.kb_path))
+            with self.loader.notified_lock:
+                known = self.loader.notified
+                if known is None:
+                    # Первый опрос: подписчики построены по текущему состоянию базы знаний
+                    self.loader.notified = current
+                    return 0
+                changes, changed_files = self._diff(known, current)
+                self.loader.notified = current
+
+        for collection_name, (upserted_ids, removed_ids) in changes.items():
+            self.loader.notify(collection_name, self._fetch(collection_name, upserted_ids), sorted(removed_ids))
+        return changed_files
+
+    @staticmethod
+    def _diff(known: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]):
+        # Коллекция -> (ID записанных чанков, ID удалённых чанков)
+        changes: Dict[str, Tuple[Set[str], Set[str]]] = defaultdict(lambda: (set(), set()))
+        changed_files = 0
+        for relpath in set(known) | set(current):
+            before, after = known.get(relpath), current.get(relpath)
+            if before == after:
+                continue
+            changed_files += 1
+            if before is not None:
+                changes[before["collection"]][1].update(before["chunk_ids"])
+            if after is not None:
+                changes[after["collection"]][0].update(after["chunk_ids"])
+        for upserted_ids, removed_ids in changes.values():
+            removed_ids -= upserted_ids
+        return changes, changed_files
+
+    def _fetch(self, collection_name: str, ids: Set[str]) -> List[Document]:
+        if not ids:
+            return []
+        result = self.loader.chroma_client.get_collection(collection_name).get(
+            ids=sorted(ids), include=["documents", "metadatas"]
+        )
+        return [
+            Document(page_content=document or "", metadata=metadata or {})
+            for document, metadata in zip(result["documents"], result["metadatas"])
+        ]
+
+    def run(self):
+        while True:
+            try:
+                changed = self.poll()
+                if changed:
+                    print(f"🔄 Изменения базы знаний из других процессов: {changed} файлов")
+            except Exception as e:
+                print(f"⚠️ Не удалось прочитать изменения базы знаний: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> 'KBChangeFeed':
+        self._thread = threading.Thread(target=self.run, name="kb-change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,119 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .loader import KnowledgeBaseLoader
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class IngestionJob:
+    """Задание на загрузку пачки файлов в Chroma с прогрессом по каждому файлу."""
+
+    def __init__(self, doc_type: str, files: List[Dict[str, Any]]):
+        self.id = uuid.uuid4().hex
+        self.doc_type = doc_type
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # path, name, sha256 и статус обработки каждого файла
+        self.files = [{**file, "status": QUEUED, "error": None, "chunks": None} for file in files]
+        self._lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        statuses = {file["status"] for file in self.files}
+        if statuses <= {QUEUED}:
+            return QUEUED
+        if statuses & {QUEUED, RUNNING}:
+            return RUNNING
+        return FAILED if FAILED in statuses else DONE
+
+    def _set_file(self, index: int, **fields):
+        with self._lock:
+            self.files[index].update(fields)
+            if self.started_at is None:
+                self.started_at = time.time()
+            if self.status in (DONE, FAILED) and self.finished_at is None:
+                self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            processed = sum(file["status"] in (DONE, FAILED) for file in self.files)
+            return {
+                "id": self.id,
+                "status": self.status,
+                "doc_type": self.doc_type,
+                "progress": {"processed": processed, "total": len(self.files)},
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "files": [
+                    {key: file[key] for key in ("name", "status", "chunks", "error")}
+                    for file in self.files
+                ],
+            }
+
+
+class IngestionQueue:
+    """
+    Фоновая очередь загрузки в базу знаний.
+
+    Файлы обрабатываются пулом из `max_workers` потоков (разбор PDF/DOCX
+    дальше уходит в пул процессов загрузчика), так что запрос на загрузку
+    сразу получает ID задания. Хранятся последние `max_jobs` заданий.
+    """
+
+    def __init__(self, loader: KnowledgeBaseLoader, max_workers: int = 2, max_jobs: int = 1000):
+        self.loader = loader
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, doc_type: str, files: List[Dict[str, Any]]) -> IngestionJob:
+        """`files` — словари с ключами path, name и (необязательно) sha256."""
+        job = IngestionJob(doc_type, files)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        for index in range(len(job.files)):
+            self._executor.submit(self._run, job, index)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict(self):
+        # Вытесняем самые старые завершённые задания; выполняющиеся не трогаем
+        overflow = len(self._jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)][:max(overflow, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestionJob, index: int):
+        file = job.files[index]
+        job._set_file(index, status=RUNNING)
+        try:
+            result = self.loader.load_file(
+                Path(file["path"]), file["name"], doc_type=job.doc_type, sha256=file.get("sha256")
+            )
+        except Exception as e:
+            print(f"❌ Ошибка загрузки {file['name']}: {e}")
+            job._set_file(index, status=FAILED, error=str(e))
+            return
+
+        if "error" in result:
+            job._set_file(index, status=FAILED, error=result["error"])
+        else:
+            job._set_file(index, status=DONE, chunks=result.get("chunks"))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -1,15 +1,46 @@
 import os
 import json
-from typing import List, Dict, Any
+import threading
+from functools import partial
+from io import StringIO
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Union
 from pathlib import Path
 
 from langchain_core.documents import Document
 import hashlib
-import fitz
-from docx import Document as DocxDocument
 
+from config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, PARSER_MAX_WORKERS, PARSER_TIMEOUT, PDF_PAGES_PER_TASK, CHROMA_UPSERT_BATCH,
+    DEDUP_THRESHOLD,
+)
 from src.utils.clients import get_chroma_client
+from src.utils.dedup import MinHashLSH
+from src.utils.doc_parser import DocumentParser, BINARY_EXTENSIONS
+from src.utils.text_chunker import TextChunker
 from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME, T2T_DOCS_COLLECTION_NAME
+from .bulk_writer import ChromaBulkWriter
+from .manifest import KBManifest, file_sha256, scan_kb_files, DEDUP_FILENAME
+
+SUPPORTED_DOC_EXTENSIONS = {".txt", ".md", ".pdf", ".docx"}
+
+# Коллекция -> значение metadata["type"] её документов
+DOC_TYPES = {
+    DOCS_COLLECTION_NAME: 'doc',
+    SQL_EXAMPLES_COLLECTION_NAME: 'sql_example',
+    T2T_DOCS_COLLECTION_NAME: T2T_DOCS_COLLECTION_NAME,
+}
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Списки по `size` элементов из итератора (последний — короче)"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 class KnowledgeBaseLoader:
     def __init__(
@@ -18,6 +49,8 @@ class KnowledgeBaseLoader:
         chroma_url: str,
         yandex_api_key: str,
         yandex_folder_id: str,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
     ):
         self.kb_path = kb_path
         self.chroma_url = chroma_url,
@@ -27,14 +60,57 @@ class KnowledgeBaseLoader:
             yandex_api_key=yandex_api_key,
             yandex_folder_id=yandex_folder_id
         )
+        self.chunker = TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.parser = DocumentParser(
+            max_workers=PARSER_MAX_WORKERS,
+            timeout=PARSER_TIMEOUT,
+            pdf_pages_per_task=PDF_PAGES_PER_TASK
+        )
+        self.manifest_lock = threading.Lock()
+        self._listeners: List[Callable[[str, List[Document], List[str]], None]] = []
+        # Файлы, о состоянии которых подписчики уже знают (для KBChangeFeed; None — лента не запущена)
+        self.notified: Optional[Dict[str, Dict[str, Any]]] = None
+        self.notified_lock = threading.Lock()
+        self._dedup = None
         self._init_collections()
 
+    def subscribe(self, listener: Callable[[str, List[Document], List[str]], None]):
+        """
+        Подписка на изменения базы знаний: `listener(collection_name, upserted, removed_ids)`
+        вызывается после записи в Chroma — так локальные индексы (BM25) обновляются на месте.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, collection_name: str, upserted: List[Document] = (), removed_ids: List[str] = ()):
+        if not upserted and not removed_ids:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(collection_name, list(upserted), list(removed_ids))
+            except Exception as e:
+                print(f"⚠️ Ошибка обработчика изменений базы знаний: {e}")
+
+    def mark_notified(self, relpath: str, entry: Optional[Dict[str, Any]]):
+        """Подписчики получили состояние файла из манифеста (None — файл удалён)"""
+        with self.notified_lock:
+            if self.notified is None:
+                return
+            if entry is None:
+                self.notified.pop(relpath, None)
+            else:
+                self.notified[relpath] = {
+                    "collection": entry["collection"], "sha256": entry["sha256"], "chunk_ids": list(entry["chunk_ids"]),
+                }
+
     def load_sql_examples(self, file: Any = None, filename: str = None) -> List[Document]:
         examples = []
 
         if file:
-            document = self.get_document(file, filename, 'sql_example')
-            examples.append(document)
+            examples.append(self._sql_example_document(json.loads(file), filename))
         else:
             sql_dir = os.path.join(self.kb_path, SQL_EXAMPLES_COLLECTION_NAME)
 
@@ -44,18 +120,24 @@ class KnowledgeBaseLoader:
                     with open(filepath, "r", encoding="utf-8") as f:
                         data = json.load(f)
 
-                    examples.append(
-                        Document(
-                            page_content=f"Question: {data['question']}\nSQL: {data['sql']}",
-                            metadata={
-                                "source": filename,
-                                "type": "sql_example",
-                                "question": data["question"]
-                            }
-                        )
-                    )
+                    examples.append(self._sql_example_document(data, filename))
         return examples
 
+    def _sql_example_document(self, data: Dict[str, Any], filename: str) -> Document:
+        # SQL-пример короткий, не режем его: один документ — один чанк
+        doc_id = self.make_doc_id(SQL_EXAMPLES_COLLECTION_NAME, filename)
+        return Document(
+            page_content=f"Question: {data['question']}\nSQL: {data['sql']}",
+            metadata={
+                "source": filename,
+                "type": "sql_example",
+                "question": data["question"],
+                "doc_id": doc_id,
+                "chunk": 0,
+                "chunk_id": f"{doc_id}#0",
+            }
+        )
+
     def load_docs(
             self,
             file: Any = None,
@@ -63,65 +145,109 @@ class KnowledgeBaseLoader:
             docs_type: str = T2T_DOCS_COLLECTION_NAME,
             docs_dir: str = T2T_DOCS_COLLECTION_NAME
     ) -> List[Document]:
-        """Загружает документы в зависимости от параметров в docs или t2t_docs"""
+        """Загружает документы в зависимости от параметров в docs или t2t_docs (по чанкам)"""
+        return list(self.iter_docs(file, filename, docs_type, docs_dir))
 
-        docs = []
+    def iter_docs(
+            self,
+            file: Any = None,
+            filename: str = None,
+            docs_type: str = T2T_DOCS_COLLECTION_NAME,
+            docs_dir: str = T2T_DOCS_COLLECTION_NAME
+    ) -> Iterator[Document]:
+        """Генератор чанков: файлы читаются потоково и режутся на ходу"""
+        collection_name = docs_dir
 
         if file is not None:
             if not isinstance(file, bytes):
                 raise TypeError("`file` must be bytes (result of UploadFile.read())")
 
             ext = Path(filename).suffix.lower()
-            content_str = self._read_text_from_bytes(file, ext)
-
-            if content_str.strip():
-                document = Document(
-                    page_content=content_str,
-                    metadata={"source": filename, "type": docs_type}
-                )
-                docs.append(document)
+            yield from self._chunk_documents(self._iter_lines(file, ext), filename, docs_type, collection_name)
 
         else:
             # Загрузка из директории
             docs_dir = os.path.join(self.kb_path, docs_dir)
             if not os.path.exists(docs_dir):
-                return docs
+                return
 
-            for fname in os.listdir(docs_dir):
+            files = []
+            for fname in sorted(os.listdir(docs_dir)):
                 fpath = os.path.join(docs_dir, fname)
-                if not os.path.isfile(fpath):
-                    continue
-
                 ext = Path(fname).suffix.lower()
-                if ext not in {".txt", ".md", ".pdf", ".docx"}:
-                    continue
-
-                try:
-                    with open(fpath, "rb") as f:  # читаем как байты для единообразия
-                        raw = f.read()
-                    content_str = self._read_text_from_bytes(raw, ext)
-
-                    if content_str.strip():
-                        document = Document(
-                            page_content=content_str,
-                            metadata={"source": fname, "type": docs_type}
-                        )
-                        docs.append(document)
-                except Exception as e:
-                    print(f"❌ Ошибка чтения {fname}: {e}")
-                    continue
-
-        return docs
+                if os.path.isfile(fpath) and ext in SUPPORTED_DOC_EXTENSIONS:
+                    files.append((fname, fpath, ext))
+
+            # PDF/DOCX сразу отправляем в пул процессов — разбираются параллельно, пока чанкуются остальные
+            self.parser.prefetch((fpath, ext) for _, fpath, ext in files)
+
+            try:
+                for fname, fpath, ext in files:
+                    try:
+                        yield from self._chunk_documents(self._iter_lines(fpath, ext), fname, docs_type, collection_name)
+                    except Exception as e:
+                        print(f"❌ Ошибка чтения {fname}: {e}")
+                        continue
+            finally:
+                self.parser.cancel_prefetch()
+
+    def load_path(self, path: str, collection_name: str) -> List[Document]:
+        """Чанки одного файла базы знаний, прочитанного с диска"""
+        return list(self.iter_path(path, collection_name))
+
+    def iter_path(self, path: str, collection_name: str) -> Iterator[Document]:
+        """Чанки файла по мере чтения (файл целиком в памяти не держится)"""
+        fname = os.path.basename(path)
+        if collection_name == SQL_EXAMPLES_COLLECTION_NAME:
+            with open(path, "r", encoding="utf-8") as f:
+                yield self._sql_example_document(json.load(f), fname)
+            return
+
+        ext = Path(fname).suffix.lower()
+        yield from self._chunk_documents(self._iter_lines(path, ext), fname, DOC_TYPES[collection_name], collection_name)
+
+    def _chunk_documents(
+            self,
+            lines: Iterable[str],
+            source: str,
+            docs_type: str,
+            collection_name: str
+    ) -> Iterator[Document]:
+        doc_id = self.make_doc_id(collection_name, source)
+        n = 0
+        for text in self.chunker.split(lines):
+            if not text.strip():
+                continue
+            yield Document(
+                page_content=text,
+                metadata={
+                    "source": source,
+                    "type": docs_type,
+                    "doc_id": doc_id,
+                    "chunk": n,
+                    "chunk_id": f"{doc_id}#{n}",
+                }
+            )
+            n += 1
 
     def load_file(
             self,
             file: Any,
             file_name: str,
-            doc_type: str = None
+            doc_type: str = None,
+            sha256: str = None
     ):
+        """
+        Загружает один файл в Chroma. `file` — байты или путь к уже сохранённому
+        в knowledge_base файлу: тогда он читается с диска потоково и учитывается
+        в манифесте (`sha256` можно передать, если он уже посчитан при записи).
+        """
         if not doc_type:
             return {'error': 'Не указан тип документа'}
 
+        if isinstance(file, (str, Path)):
+            return self._load_path_to_chroma(str(file), doc_type, sha256)
+
         doc = []
         filename = file_name
 
@@ -134,31 +260,123 @@ class KnowledgeBaseLoader:
         else:
             return {'error': f'Указан недопустимый тип документа: {doc_type}'}
 
-        doc_id = f'{doc_type}_{self.hash_filename(filename)}'
-        doc_text = doc[0].page_content
-
-        chroma_collection = self.chroma_client.get_collection(doc_type)
-        existing = chroma_collection.get(ids=[doc_id])
+        doc_id = self.make_doc_id(doc_type, filename)
+        if not doc:
+            return {'error': f'Документ {filename} пуст'}
 
-        embedding = self.embedding_fn(doc_text).tolist()
+        with self.bulk_writer() as writer:
+            existing = writer.existing_ids(doc_type, [chunk.metadata["chunk_id"] for chunk in doc])
+            new_chunks = [chunk for chunk in doc if chunk.metadata["chunk_id"] not in existing]
 
-        if existing['ids']:
-            print(f"⚠️ Документ с ID '{doc_id}' уже существует. Пропускаем.")
-        else:
-            chroma_collection.add(
-                ids=[doc_id],
-                documents=[doc_text],
-                metadatas=[doc[0].metadata],
-                embeddings=[embedding], # явно добавляем. чтобы не было багов
-            )
-            print(f"✅ Добавлен новый документ: {doc_id}")
+            if not new_chunks:
+                print(f"⚠️ Документ с ID '{doc_id}' уже существует. Пропускаем.")
+            else:
+                # Эмбеддим и пишем только новые чанки
+                writer.add(doc_type, new_chunks)
+                print(f"✅ Добавлен документ {doc_id}: {len(new_chunks)} из {len(doc)} чанков")
 
+        self.notify(doc_type, new_chunks)
         return {'ok': True}
 
+    def _load_path_to_chroma(self, path: str, doc_type: str, sha256: str = None):
+        if doc_type not in DOC_TYPES:
+            return {'error': f'Указан недопустимый тип документа: {doc_type}'}
+
+        sha256 = sha256 or file_sha256(path)
+        relpath = self._manifest_relpath(path)
+        with self.manifest_lock:
+            entry = KBManifest.load(self.kb_path).get(relpath) if relpath else None
+
+        doc_id = self.make_doc_id(doc_type, os.path.basename(path))
+        if entry and entry["sha256"] == sha256:
+            print(f"⚠️ Документ с ID '{doc_id}' не изменился. Пропускаем.")
+            return {'ok': True, 'chunks': len(entry["chunk_ids"]), 'skipped': True}
+
+        if relpath:
+            # Файл базы знаний — через ту же синхронизацию, что и --sync-kb
+            # (манифест, дедупликация, удаление пропавших чанков)
+            from .loader_to_chroma import sync_knowledge_base
+            stats = sync_knowledge_base(self, [relpath], known_sha256={relpath: sha256})
+            with self.manifest_lock:
+                entry = KBManifest.load(self.kb_path).get(relpath)
+            if entry is None:
+                return {'error': f'Документ {os.path.basename(path)} не поддерживается в {doc_type}'}
+            return {'ok': True, 'chunks': len(entry["chunk_ids"]), 'duplicates': stats["chunks_deduplicated"]}
+
+        # Чанки уходят в Chroma пачками по мере чтения, подписчики получают каждую записанную пачку
+        chunks = 0
+        with self.bulk_writer() as writer:
+            for part in batched(self.iter_path(path, doc_type), writer.batch_size):
+                writer.add(doc_type, part, callback=partial(self.notify, doc_type, part))
+                chunks += len(part)
+        if not chunks:
+            return {'error': f'Документ {os.path.basename(path)} пуст'}
+
+        print(f"✅ Загружен документ {doc_id}: {chunks} чанков")
+        return {'ok': True, 'chunks': chunks}
+
+    def dedup_index(self, manifest: KBManifest) -> Optional[MinHashLSH]:
+        """
+        LSH-индекс сигнатур записанных чанков (None — дедупликация выключена): живёт
+        в памяти между синхронизациями, при первом обращении читается с диска и сверяется с манифестом.
+        """
+        if not DEDUP_THRESHOLD:
+            return None
+        if self._dedup is None:
+            written_ids = {chunk_id for entry in manifest.entries.values() for chunk_id in entry["chunk_ids"]}
+            self._dedup = MinHashLSH(threshold=DEDUP_THRESHOLD).load(self.dedup_path, keep=written_ids)
+        return self._dedup
+
+    def drop_dedup_index(self):
+        """Забыть несохранённые изменения LSH-индекса: следующее обращение прочитает его с диска"""
+        self._dedup = None
+
+    def files_fingerprint(self, collection_names: Iterable[str]) -> str:
+        """
+        Отпечаток содержимого коллекций для кэшей производных индексов: версия манифеста,
+        mtime и размеры файлов (без чтения содержимого) и настройки чанкера.
+        """
+        collection_names = set(collection_names)
+        with self.manifest_lock:
+            manifest = KBManifest.load(self.kb_path)
+        digest = hashlib.sha256(
+            f"{manifest.version}\0{self.chunker.chunk_size}\0{self.chunker.chunk_overlap}\n".encode("utf-8")
+        )
+        for relpath, (collection_name, path) in sorted(scan_kb_files(self.kb_path).items()):
+            if collection_name in collection_names:
+                stat = os.stat(path)
+                digest.update(f"{relpath}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def duplicate_chunk_ids(self) -> set:
+        """ID чанков, пропущенных при синхронизации как почти-дубликаты (их нет в Chroma)"""
+        with self.manifest_lock:
+            manifest = KBManifest.load(self.kb_path)
+        return {chunk_id for entry in manifest.entries.values() for chunk_id in entry.get("duplicates", {})}
+
+    @property
+    def dedup_path(self) -> str:
+        return os.path.join(self.kb_path, DEDUP_FILENAME)
+
+    def bulk_writer(self) -> ChromaBulkWriter:
+        return ChromaBulkWriter(self.chroma_client, self.embedding_fn, batch_size=CHROMA_UPSERT_BATCH)
+
+    def _manifest_relpath(self, path: str):
+        """Путь файла относительно knowledge_base в формате манифеста (None — файл вне базы)"""
+        relpath = os.path.relpath(os.path.abspath(path), os.path.abspath(self.kb_path))
+        if relpath.startswith(".."):
+            return None
+        return relpath.replace(os.sep, "/")
+
     @staticmethod
     def hash_filename(filename: str, length: int = 16) -> str:
         return hashlib.sha256(filename.encode()).hexdigest()[:length]
 
+    @classmethod
+    def make_doc_id(cls, collection_name: str, filename: str) -> str:
+        """ID документа; чанки получают ID вида `{doc_id}#{n}`"""
+        return f'{collection_name}_{cls.hash_filename(filename)}'
+
     @staticmethod
     def get_document(file_content: Any, file_name: str, doc_type: str,) -> Document:
         document = Document(
@@ -180,20 +398,17 @@ class KnowledgeBaseLoader:
         for collection_name in collections_names:
             self.chroma_client.get_or_create_collection(name=collection_name)
 
-    @staticmethod
-    def _read_text_from_bytes(content: bytes, ext: str) -> str:
-        """Читает текст из байтов в зависимости от расширения."""
-        try:
-            if ext == ".pdf":
-                with fitz.open(stream=content, filetype="pdf") as doc:
-                    return "".join(page.get_text() for page in doc)
-            elif ext == ".docx":
-                from io import BytesIO
-                doc = DocxDocument(BytesIO(content))
-                return "\n".join(para.text for para in doc.paragraphs)
-            else:
-                # .txt, .md и прочие текстовые — декодируем как UTF-8
-                return content.decode("utf-8")
-        except UnicodeDecodeError:
-            # Попытка с игнорированием ошибок для текстовых файлов
-            return content.decode("utf-8", errors="replace")
+    def _iter_lines(self, source: Union[bytes, str], ext: str) -> Iterator[str]:
+        """
+        Потоково отдаёт текст документа: строки для текстовых файлов,
+        страницы для PDF, абзацы для DOCX. `source` — путь к файлу или байты.
+        PDF и DOCX разбираются в пуле процессов.
+        """
+        if ext in BINARY_EXTENSIONS:
+            yield from self.parser.parse(source, ext)
+        elif isinstance(source, bytes):
+            # .txt, .md и прочие текстовые — декодируем как UTF-8
+            yield from StringIO(source.decode("utf-8", errors="replace"))
+        else:
+            with open(source, "r", encoding="utf-8", errors="replace") as f:
+                yield from f
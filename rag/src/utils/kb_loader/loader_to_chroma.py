@@ -1,7 +1,242 @@
-from .loader import KnowledgeBaseLoader
+import os
+import re
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+from src.utils.dedup import MinHashLSH
+from .loader import KnowledgeBaseLoader, DOC_TYPES, batched
+from .manifest import KBManifest, scan_kb_files, file_sha256
 from ..clients import get_chroma_client
-from typing import Any
-import hashlib
+
+
+# Позиционные ID первой версии загрузчика (doc_{i}, sql_{i})
+_LEGACY_ID_RE = re.compile(r"^(?:doc|sql)_\d+$")
+# Сколько ID читаем из Chroma за один запрос при миграции
+_MIGRATION_PAGE = 1000
+
+
+def sync_knowledge_base(loader: KnowledgeBaseLoader, relpaths: Iterable[str] = None,
+                        known_sha256: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    Инкрементальная синхронизация knowledge_base с Chroma по манифесту.
+
+    Эмбеддятся и upsert-ятся только новые и изменённые файлы, векторы удалённых
+    файлов (и пропавших чанков изменённых) удаляются. Файлы с теми же mtime и
+    размером не читаются вовсе, с тем же sha256 — не переэмбеддятся.
+    `relpaths` ограничивает синхронизацию этими файлами (пути как в манифесте),
+    `known_sha256` — уже посчитанные хэши файлов (например, при загрузке через API).
+    Подписчики загрузчика получают изменения каждого файла после его записи.
+    Синхронизации разных потоков и процессов выполняются по очереди.
+    """
+    with loader.manifest_lock, KBManifest.file_lock(loader.kb_path):
+        return _sync_knowledge_base(loader, relpaths, known_sha256 or {})
+
+
+def _sync_knowledge_base(loader: KnowledgeBaseLoader, relpaths: Iterable[str],
+                         known_sha256: Dict[str, str]) -> Dict[str, Any]:
+    manifest = KBManifest.load(loader.kb_path)
+    dedup = loader.dedup_index(manifest)
+    current_files = scan_kb_files(loader.kb_path)
+    known_files = set(manifest.entries)
+    if relpaths is not None:
+        relpaths = set(relpaths)
+        current_files = {relpath: item for relpath, item in current_files.items() if relpath in relpaths}
+        known_files &= relpaths
+    # Манифеста ещё нет — база знаний проиндексирована старым загрузчиком (или не проиндексирована).
+    # Переход на манифест делает только полная синхронизация; частичная (загрузка через API, --watch-kb)
+    # записывает свои файлы, но манифест не создаёт, иначе остальные файлы выглядели бы удалёнными
+    persist = relpaths is None or os.path.exists(manifest.path)
+    if not os.path.exists(manifest.path):
+        _migrate_legacy_ids(loader, current_files, positional=relpaths is None)
+        if not persist:
+            print("⚠️ Манифеста базы знаний нет: выполните полную синхронизацию (--sync-kb)")
+    stats = {
+        "added": 0, "updated": 0, "unchanged": 0, "removed": 0,
+        "chunks_upserted": 0, "chunks_deleted": 0, "chunks_deduplicated": 0,
+    }
+
+    writer = loader.bulk_writer()
+    # ID чанков, которые исчезнут из Chroma: от них зависят дубликаты в других файлах
+    vanishing = set()
+
+    # 1. Удалённые файлы
+    for relpath in sorted(known_files - set(current_files)):
+        entry = manifest.remove(relpath)
+        vanishing.update(entry["chunk_ids"])
+        if entry["chunk_ids"]:
+            writer.delete(entry["collection"], entry["chunk_ids"])
+            loader.notify(entry["collection"], removed_ids=entry["chunk_ids"])
+        loader.mark_notified(relpath, None)
+        stats["removed"] += 1
+        stats["chunks_deleted"] += len(entry["chunk_ids"])
+        print(f"🗑 Удалён из индекса: {relpath}")
+
+    # 2. Ищем новые и изменённые файлы
+    changed = []
+    for relpath, (collection_name, path) in current_files.items():
+        stat = os.stat(path)
+        entry = manifest.get(relpath)
+
+        if entry and KBManifest.is_unchanged_stat(entry, stat):
+            stats["unchanged"] += 1
+            continue
+
+        sha256 = known_sha256.get(relpath) or file_sha256(path)
+        if entry and entry["sha256"] == sha256:
+            # Файл «потрогали», но содержимое то же — только обновляем mtime
+            manifest.set(relpath, collection_name, stat, sha256, entry["chunk_ids"], entry.get("duplicates"))
+            stats["unchanged"] += 1
+            continue
+
+        changed.append((relpath, collection_name, path, stat, sha256, entry))
+
+    # Файлы, чьи дубликаты ссылаются на исчезающие чанки, разбираем заново:
+    # их чанки снова проходят дедупликацию и при необходимости записываются сами
+    changed_paths = {item[0] for item in changed}
+    vanishing.update(chunk_id for item in changed if item[5] for chunk_id in item[5]["chunk_ids"])
+    dependents = True
+    while dependents:
+        dependents = [
+            (relpath, entry) for relpath, entry in manifest.entries.items()
+            if relpath not in changed_paths and vanishing & set(entry.get("duplicates", {}).values())
+        ]
+        for relpath, entry in dependents:
+            path = os.path.join(loader.kb_path, relpath)
+            if not os.path.isfile(path):
+                continue
+            changed.append((relpath, entry["collection"], path, os.stat(path), entry["sha256"], entry))
+            changed_paths.add(relpath)
+            vanishing.update(entry["chunk_ids"])
+            stats["unchanged"] -= relpath in current_files
+
+    if dedup is not None:
+        dedup.remove(vanishing)
+
+    # PDF/DOCX разбираются параллельно в пуле процессов, пока обрабатываются остальные файлы
+    loader.parser.prefetch((path, Path(path).suffix.lower()) for _, _, path, _, _, _ in changed)
+
+    def on_written(relpath, collection_name, stat, sha256, entry, chunk_ids, duplicates):
+        stale_ids = sorted(set(entry["chunk_ids"]) - set(chunk_ids)) if entry else []
+        if stale_ids:
+            writer.delete(collection_name, stale_ids)
+            loader.notify(collection_name, removed_ids=stale_ids)
+
+        manifest.set(relpath, collection_name, stat, sha256, chunk_ids, duplicates)
+        if persist:
+            loader.mark_notified(relpath, manifest.get(relpath))
+            # Сохраняем по мере записи: прерванная синхронизация продолжится с того же места
+            manifest.save()
+
+        stats["updated" if entry else "added"] += 1
+        stats["chunks_upserted"] += len(chunk_ids)
+        stats["chunks_deleted"] += len(stale_ids)
+        stats["chunks_deduplicated"] += len(duplicates)
+        skipped = f", {len(duplicates)} дубликатов пропущено" if duplicates else ""
+        print(f"✅ {'Обновлён' if entry else 'Добавлен'}: {relpath} ({len(chunk_ids)} чанков{skipped})")
+
+    def on_failed(collection_name, entry, chunk_ids):
+        # Уже записанные чанки нового содержимого убираем; файл останется изменённым до следующей синхронизации
+        new_ids = sorted(set(chunk_ids) - set(entry["chunk_ids"] if entry else ()))
+        if new_ids:
+            writer.delete(collection_name, new_ids)
+            loader.notify(collection_name, removed_ids=new_ids)
+
+    # 3. Эмбеддим и записываем изменённые файлы: чанки читаются потоком и уходят в общие
+    # пачки по мере чтения — в памяти не больше нескольких пачек независимо от размера файла.
+    # Подписчики получают каждую записанную пачку, файл попадает в манифест после записи всех его чанков
+    with writer:
+        try:
+            for relpath, collection_name, path, stat, sha256, entry in changed:
+                chunk_ids, duplicates = [], {}
+                try:
+                    for part in batched(loader.iter_path(path, collection_name), writer.batch_size):
+                        part, part_duplicates = _drop_near_duplicates(dedup, collection_name, part)
+                        chunk_ids.extend(chunk.metadata["chunk_id"] for chunk in part)
+                        duplicates.update(part_duplicates)
+                        writer.add(collection_name, part, callback=partial(loader.notify, collection_name, part))
+                except Exception as e:
+                    print(f"❌ Ошибка чтения {relpath}: {e}")
+                    if dedup is not None:
+                        dedup.remove(set(chunk_ids))
+                    writer.add(collection_name, [], callback=partial(on_failed, collection_name, entry, chunk_ids))
+                    continue
+
+                writer.add(
+                    collection_name,
+                    [],
+                    callback=partial(on_written, relpath, collection_name, stat, sha256, entry, chunk_ids, duplicates),
+                )
+        finally:
+            loader.parser.cancel_prefetch()
+
+    if persist:
+        manifest.save()
+        if dedup is not None:
+            dedup.save(loader.dedup_path)
+    else:
+        # Без манифеста сигнатуры этих чанков не сохраняются: полная синхронизация запишет
+        # файлы заново, и их чанки не должны оказаться дубликатами самих себя
+        loader.drop_dedup_index()
+    stats["version"] = manifest.version
+    return stats
+
+
+def _migrate_legacy_ids(loader: KnowledgeBaseLoader, current_files: Dict[str, Any], positional: bool = True) -> int:
+    """
+    Синхронизация без манифеста: удаляет из Chroma записи со старыми ID целого
+    файла без номера чанка (`{коллекция}_{sha16}`) для файлов `current_files`,
+    которые будут записаны заново по чанкам, а при `positional` (только полная
+    синхронизация: все файлы базы записываются заново) — и позиционные
+    (`doc_{i}`, `sql_{i}`). Иначе старые записи остались бы рядом с новыми дублями.
+    """
+    file_doc_ids = {
+        loader.make_doc_id(collection_name, os.path.basename(path))
+        for collection_name, path in current_files.values()
+    }
+    removed = 0
+    for collection_name in DOC_TYPES:
+        collection = loader.chroma_client.get_collection(collection_name)
+        ids, offset = [], 0
+        while True:
+            page = collection.get(include=[], limit=_MIGRATION_PAGE, offset=offset)["ids"]
+            if not page:
+                break
+            ids.extend(page)
+            offset += len(page)
+        legacy = [doc_id for doc_id in ids if (positional and _LEGACY_ID_RE.match(doc_id)) or doc_id in file_doc_ids]
+        for start in range(0, len(legacy), _MIGRATION_PAGE):
+            collection.delete(ids=legacy[start:start + _MIGRATION_PAGE])
+        removed += len(legacy)
+    if removed:
+        print(f"🧹 Удалено записей со старыми ID: {removed}")
+    return removed
+
+
+def _drop_near_duplicates(dedup: Optional[MinHashLSH], collection_name: str, chunks: List[Document]):
+    """
+    Убирает чанки, почти совпадающие с уже записанными в той же коллекции (до эмбеддинга).
+    Возвращает оставшиеся чанки и {ID дубликата: ID оригинала}.
+    """
+    if dedup is None:
+        return chunks, {}
+
+    kept, duplicates = [], {}
+    for chunk in chunks:
+        chunk_id = chunk.metadata["chunk_id"]
+        signature = dedup.signature(chunk.page_content)
+        if signature is None:
+            kept.append(chunk)
+            continue
+        match = dedup.query(signature, prefix=f"{collection_name}_")
+        if match is not None:
+            duplicates[chunk_id] = match[0]
+            continue
+        dedup.insert(chunk_id, signature)
+        kept.append(chunk)
+    return kept, duplicates
 
 
 def load_knowledge_base_to_chroma(
@@ -10,38 +245,19 @@ def load_knowledge_base_to_chroma(
     yandex_api_key: str,
     yandex_folder_id: str
 ):
-    # 1. Загрузка файлов
     loader = KnowledgeBaseLoader(kb_path, chroma_url, yandex_api_key, yandex_folder_id)
-    t2t_docs = loader.load_docs()
-    docs = loader.load_docs(docs_type='doc', docs_dir='docs')
-    sql_examples = loader.load_sql_examples()
-
-    collection_docs = loader.chroma_client.get_collection(name="docs")
+    stats = sync_knowledge_base(loader)
 
-    embeddings = [loader.embedding_fn(doc.page_content) for doc in docs]
+    print(f"✅ База знаний синхронизирована с удалённым Chroma: {stats}")
 
-    collection_docs.add(
-        ids=[f"doc_{i}" for i in range(len(docs))],
-        documents=[doc.page_content for doc in docs],
-        metadatas=[doc.metadata for doc in docs],
-        embeddings=embeddings,
-    )
-
-    collection_sql = loader.chroma_client.get_collection(name="sql_examples")
-    embeddings = [loader.embedding_fn(doc.page_content) for doc in sql_examples]
-
-    collection_sql.add(
-        ids=[f"sql_{i}" for i in range(len(sql_examples))],
-        documents=[doc.page_content for doc in sql_examples],
-        metadatas=[doc.metadata for doc in sql_examples],
-        embeddings=embeddings,
-    )
-
-    print("✅ База знаний загружена в удалённый Chroma")
+    cache = getattr(loader.embedding_fn, "cache", None)
+    if cache is not None:
+        print(f"📦 Кэш эмбеддингов: {cache.stats()}")
+    return stats
 
 if __name__ == "__main__":
 
-    
+
 
     import chromadb
 
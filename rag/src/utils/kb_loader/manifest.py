@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME, T2T_DOCS_COLLECTION_NAME
+
+MANIFEST_FILENAME = ".manifest.json"
+# Межпроцессная блокировка синхронизации (API, MCP/--watch-kb и --sync-kb пишут один манифест)
+MANIFEST_LOCK_FILENAME = ".manifest.lock"
+# MinHash-сигнатуры записанных чанков для поиска почти-дубликатов
+DEDUP_FILENAME = ".dedup.npz"
+
+# Какие расширения индексируются в каждой коллекции (подпапка knowledge_base == имя коллекции)
+COLLECTION_EXTENSIONS = {
+    DOCS_COLLECTION_NAME: {".txt", ".md", ".pdf", ".docx"},
+    T2T_DOCS_COLLECTION_NAME: {".txt", ".md", ".pdf", ".docx"},
+    SQL_EXAMPLES_COLLECTION_NAME: {".json"},
+}
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_kb_files(kb_path: str) -> Dict[str, Tuple[str, str]]:
+    """Все индексируемые файлы базы знаний: {относительный путь: (коллекция, абсолютный путь)}"""
+    files = {}
+    for collection_name, extensions in COLLECTION_EXTENSIONS.items():
+        collection_dir = os.path.join(kb_path, collection_name)
+        if not os.path.isdir(collection_dir):
+            continue
+        for fname in sorted(os.listdir(collection_dir)):
+            fpath = os.path.join(collection_dir, fname)
+            if fname.startswith(".") or not os.path.isfile(fpath):
+                continue
+            if Path(fname).suffix.lower() not in extensions:
+                continue
+            files[f"{collection_name}/{fname}"] = (collection_name, fpath)
+    return files
+
+
+class KBManifest:
+    """
+    Манифест проиндексированной базы знаний (лежит рядом с ней, `.manifest.json`).
+
+    Для каждого файла хранит коллекцию, mtime, размер, sha256 содержимого
+    и ID чанков в Chroma — по нему синхронизация понимает, что добавить,
+    переэмбеддить или удалить. Чанки, пропущенные как почти-дубликаты,
+    лежат в `duplicates`: ID чанка -> ID записанного чанка-оригинала.
+    """
+
+    def __init__(self, path: str, entries: Dict[str, Dict[str, Any]] = None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, kb_path: str) -> 'KBManifest':
+        path = os.path.join(kb_path, MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(path, data.get("files", {}))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Манифест {path} повреждён, будет пересоздан: {e}")
+            return cls(path)
+
+    @staticmethod
+    @contextmanager
+    def file_lock(kb_path: str) -> Iterator[None]:
+        """
+        Эксклюзивная блокировка манифеста между процессами на время синхронизации:
+        без неё два процесса читают один манифест и последний записавший
+        теряет файлы, добавленные другим.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(kb_path, MANIFEST_LOCK_FILENAME), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def save(self):
+        # Пишем во временный файл и атомарно подменяем, чтобы не оставить битый манифест
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, relpath: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(relpath)
+
+    def set(self, relpath: str, collection_name: str, stat: os.stat_result, sha256: str, chunk_ids, duplicates=None):
+        self.entries[relpath] = {
+            "collection": collection_name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "chunk_ids": list(chunk_ids),
+            "duplicates": dict(duplicates or {}),
+        }
+
+    def remove(self, relpath: str) -> Optional[Dict[str, Any]]:
+        return self.entries.pop(relpath, None)
+
+    @staticmethod
+    def is_unchanged_stat(entry: Dict[str, Any], stat: os.stat_result) -> bool:
+        return entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    @property
+    def version(self) -> str:
+        """Хеш состояния базы знаний: меняется при любом изменении содержимого файлов"""
+        digest = hashlib.sha256()
+        for relpath in sorted(self.entries):
+            digest.update(f"{relpath}\0{self.entries[relpath]['sha256']}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
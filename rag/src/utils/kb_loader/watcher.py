@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from typing import Dict, Set, Tuple
+
+from .loader import KnowledgeBaseLoader
+from .loader_to_chroma import sync_knowledge_base
+from .manifest import scan_kb_files
+
+
+class KBWatcher:
+    """
+    Наблюдение за knowledge_base опросом файловой системы.
+
+    Раз в `interval` секунд сравнивает (mtime, размер) файлов с прошлым
+    снимком. Изменения копятся, пока папка не «успокоится» на `debounce`
+    секунд (копирование пачки файлов даёт одну синхронизацию), после чего
+    в инкрементальную синхронизацию уходят только изменённые пути —
+    она обновляет Chroma и через подписку загрузчика локальные индексы.
+    """
+
+    def __init__(self, loader: KnowledgeBaseLoader, interval: float = 1.0, debounce: float = 2.0):
+        self.loader = loader
+        self.interval = interval
+        self.debounce = debounce
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for relpath, (_, path) in scan_kb_files(self.loader.kb_path).items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[relpath] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _diff(self, snapshot: Dict[str, Tuple[int, int]]) -> Set[str]:
+        changed = {relpath for relpath, sig in snapshot.items() if self._snapshot.get(relpath) != sig}
+        return changed | (set(self._snapshot) - set(snapshot))
+
+    def run(self):
+        # Первый проход — полная синхронизация: догоняем изменения, сделанные без наблюдателя
+        self._snapshot = self._scan()
+        self._sync(None)
+
+        pending: Set[str] = set()
+        last_change = 0.0
+        while not self._stop.wait(self.interval):
+            snapshot = self._scan()
+            changed = self._diff(snapshot)
+            self._snapshot = snapshot
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+                continue
+            if pending and time.monotonic() - last_change >= self.debounce:
+                self._sync(pending)
+                pending = set()
+
+    def _sync(self, relpaths):
+        try:
+            stats = sync_knowledge_base(self.loader, relpaths)
+        except Exception as e:
+            print(f"❌ Ошибка синхронизации базы знаний: {e}")
+            return
+        if stats["added"] or stats["updated"] or stats["removed"]:
+            print(f"🔄 База знаний обновлена: {stats}")
+
+    def start(self) -> 'KBWatcher':
+        self._thread = threading.Thread(target=self.run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1 @@
+from .src import Branch, BranchResult, RetrievalOrchestrator, retrieval_orchestrator
\ No newline at end of file
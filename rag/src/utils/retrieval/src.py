@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from config import RETRIEVAL_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class Branch:
+    """Ветка поиска: функция без аргументов и время, которое её ждём (сек, от запуска ветки)"""
+
+    def __init__(self, fn: Callable[[], Any], timeout: float):
+        self.fn = fn
+        self.timeout = timeout
+
+
+class BranchResult:
+    def __init__(self, name: str, value: Any = None, error: Optional[BaseException] = None, elapsed: float = 0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _Task:
+    """Ветка в пуле: запоминает момент, когда поток за неё взялся"""
+
+    def __init__(self, fn: Callable[[], Any], slots: threading.BoundedSemaphore):
+        self.fn = fn
+        self.slots = slots  # слот пула отдаётся по завершении ветки
+        self.started_at = None
+        self.started = threading.Event()
+
+
+class RetrievalOrchestrator:
+    """
+    Параллельный запуск веток поиска (семантика по коллекциям, BM25) в общем
+    пуле потоков.
+
+    Каждую ветку ждём не дольше её таймаута, считая от её запуска в потоке,
+    поэтому время поиска — время самой медленной успевшей ветки, а не сумма
+    всех. Упавшая или не успевшая ветка возвращает ошибку в своём результате и
+    не мешает остальным. Не успевшая ветка дорабатывает в фоне (прервать поток
+    нельзя) и до конца занимает поток пула, поэтому в работе одновременно не
+    больше `max_workers` веток: новая ветка ждёт свободный поток не дольше
+    своего таймаута и не встаёт в очередь за зависшими. Пул рассчитывают на
+    ожидаемую нагрузку: одновременные запросы × число веток.
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retrieval")
+            return self._executor
+
+    def run(self, branches: Dict[str, Branch]) -> Dict[str, BranchResult]:
+        executor = self._get_executor()
+        slots = self._slots
+        started = time.monotonic()
+        results, futures = {}, {}
+        for name, branch in branches.items():
+            # Свободный поток ждём из того же бюджета, что и саму ветку
+            if not slots.acquire(timeout=max(0.0, started + branch.timeout - time.monotonic())):
+                error = TimeoutError(f"Ветка поиска {name}: нет свободного потока за {branch.timeout} сек")
+                results[name] = BranchResult(name, error=error, elapsed=time.monotonic() - started)
+                continue
+            task = _Task(branch.fn, slots)
+            futures[name] = (executor.submit(self._run_task, task), task)
+
+        for name, (future, task) in futures.items():
+            timeout = branches[name].timeout
+            try:
+                # Поток свободен (держим слот), так что ветка стартует сразу; срок считаем от её старта
+                deadline = task.started_at + timeout if task.started.wait(timeout) else time.monotonic()
+                value, elapsed = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                results[name] = BranchResult(name, value, elapsed=elapsed)
+            except FutureTimeoutError:
+                if future.cancel():
+                    slots.release()
+                error = TimeoutError(f"Ветка поиска {name} не уложилась в {timeout} сек")
+                results[name] = BranchResult(name, error=error, elapsed=time.monotonic() - started)
+            except Exception as e:
+                results[name] = BranchResult(name, error=e, elapsed=time.monotonic() - started)
+
+        failed = [result for result in results.values() if not result.ok]
+        for result in failed:
+            logger.warning("Ветка поиска %s пропущена (%.2f сек): %s", result.name, result.elapsed, result.error)
+        if failed and len(failed) == len(results):
+            # Без единой ветки искать нечего — отдаём первую ошибку
+            raise failed[0].error
+        return results
+
+    def _run_task(self, task: _Task):
+        task.started_at = time.monotonic()
+        task.started.set()
+        try:
+            return task.fn(), time.monotonic() - task.started_at
+        finally:
+            task.slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                # Слоты отменённых веток не вернутся — новый пул начинает с новыми
+                self._slots = threading.BoundedSemaphore(self.max_workers)
+
+
+retrieval_orchestrator = RetrievalOrchestrator(RETRIEVAL_MAX_WORKERS)
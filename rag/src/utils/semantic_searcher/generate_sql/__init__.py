@@ -1,2 +1,2 @@
 # generate_sql semantic searcher initialization
-from .search import search_in_knowledge_base
\ No newline at end of file
+from .search import search_in_knowledge_base, query_collection, merge_collection_results
\ No newline at end of file
@@ -1,22 +1,33 @@
 # src/utils/semantic_searcher/generate_sql.py
 
-def search_in_knowledge_base(query: str, chroma_client, embedding_fn, top_k=5):
-    # Получаем коллекции
-    collection_docs = chroma_client.get_collection("docs")        # или другое имя
-    collection_sql = chroma_client.get_collection("sql_examples") # или другое имя
-
-    # Поиск по документации
-    results_docs = collection_docs.query(
-        query_embeddings=embedding_fn([query]),
-        n_results=top_k
-    )
+from src.utils.clients import QueryEmbeddingContext
+
+_EMPTY_RESULTS = {"ids": [], "distances": [], "documents": []}
 
-    # Поиск по SQL-примерам
-    results_sql = collection_sql.query(
-        query_embeddings=embedding_fn([query]),
+
+def query_collection(chroma_client, collection_name: str, query_context: QueryEmbeddingContext, top_k=5):
+    """Поиск в одной коллекции (эмбеддинг берётся из контекста запроса — считается один раз)"""
+    return chroma_client.get_collection(collection_name).query(
+        query_embeddings=[query_context.embed()],
         n_results=top_k
     )
 
+
+def search_in_knowledge_base(query: str, chroma_client, embedding_fn, top_k=5, query_context=None):
+    # Эмбеддинг запроса считаем один раз на обе коллекции
+    query_context = QueryEmbeddingContext.ensure(query_context, query, embedding_fn)
+
+    # Поиск по документации и по SQL-примерам
+    results_docs = query_collection(chroma_client, "docs", query_context, top_k)
+    results_sql = query_collection(chroma_client, "sql_examples", query_context, top_k)
+    return merge_collection_results(results_docs, results_sql, top_k)
+
+
+def merge_collection_results(results_docs, results_sql, top_k=5):
+    """Сводит ответы двух коллекций; None — коллекция не ответила (ветка поиска упала или не успела)"""
+    results_docs = results_docs or _EMPTY_RESULTS
+    results_sql = results_sql or _EMPTY_RESULTS
+
     # Собираем ID и расстояния
     all_ids = []
     all_distances = []
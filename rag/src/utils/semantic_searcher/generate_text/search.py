@@ -1,14 +1,18 @@
+from src.utils.clients import QueryEmbeddingContext
+
 def search_in_knowledge_base(
     query: str,
     chroma_client,
     embedding_fn,
-    k_docs=3
+    k_docs=3,
+    query_context=None
 ):
+    query_context = QueryEmbeddingContext.ensure(query_context, query, embedding_fn)
     collection_t2t_docs = chroma_client.get_collection("docs")
 
+    # Передаём только готовый вектор: query_texts заставил бы Chroma эмбеддить запрос ещё раз
     results_t2t_docs = collection_t2t_docs.query(
-        query_texts=[query],
-        query_embeddings=embedding_fn([query]),
+        query_embeddings=[query_context.embed(query)],
         n_results=k_docs
     )
 
@@ -0,0 +1 @@
+from .src import SQLTemplateCache, SQLTemplate, canonicalize, question_constraints
\ No newline at end of file
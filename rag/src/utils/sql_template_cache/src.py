@@ -0,0 +1,286 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from src.utils.text_analyzer import Analyzer, RussianStemFilter
+
+NUM = "num"
+DATE = "date"
+STR = "str"
+
+# Кавычки, даты (ISO и дд.мм.гггг) и числа («1,5», «100 000» — разряды только через неразрывный пробел:
+# в «в отделе 5 100 сотрудников» обычный пробел разделяет два числа, а не разряды)
+_SLOT_RE = re.compile(
+    r"«(?P<q1>[^»]+)»|\"(?P<q2>[^\"]+)\"|'(?P<q3>[^']+)'"
+    r"|(?P<date>\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}\.\d{1,2}\.\d{4}\b)"
+    r"|(?P<num>\b\d{1,3}(?:[\u00a0\u202f]\d{3})+(?:[.,]\d+)?\b|\b\d+(?:[.,]\d+)?\b)"
+)
+_SQL_FENCE_RE = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+# Без стоп-слов: «не больше 100» и «больше 100» — разные шаблоны
+_analyzer = Analyzer(token_filters=[RussianStemFilter()], name="ru-stem")
+
+
+# Стеммы слов, меняющих смысл условия, -> вид условия (синонимы сводятся к одному виду)
+_CONSTRAINT_TERMS = {
+    **dict.fromkeys(("больш", "бол", "выш", "свыш", "превыша", "старш", "дорож", "позж", "посл", "от"), ">"),
+    **dict.fromkeys(("меньш", "мен", "ниж", "младш", "дешевл", "раньш", "до"), "<"),
+    **dict.fromkeys(("не", "ни", "нет", "без", "кром", "исключ"), "not"),
+    **dict.fromkeys(("минимум", "минимальн", "наименьш"), "min"),
+    **dict.fromkeys(("максимум", "максимальн", "наибольш"), "max"),
+    **dict.fromkeys(("возрастан", "перв"), "asc"),
+    **dict.fromkeys(("убыван", "последн"), "desc"),
+}
+
+
+class Slot:
+    def __init__(self, kind: str, raw: str, value: str):
+        self.kind = kind
+        self.raw = raw
+        self.value = value  # NUM — десятичная запись, DATE — ISO, STR — как в вопросе
+
+
+def _slot(match: re.Match) -> Slot:
+    groups = match.groupdict()
+    quoted = groups["q1"] or groups["q2"] or groups["q3"]
+    if quoted is not None:
+        return Slot(STR, quoted, quoted)
+    if groups["date"] is not None:
+        raw = groups["date"]
+        if "." in raw:
+            day, month, year = raw.split(".")
+            return Slot(DATE, raw, f"{year}-{int(month):02d}-{int(day):02d}")
+        return Slot(DATE, raw, raw)
+    raw = groups["num"]
+    return Slot(NUM, raw, str(Decimal(re.sub(r"[\u00a0\u202f]", "", raw).replace(",", "."))))
+
+
+def canonicalize(question: str) -> Tuple[Tuple[str, ...], List[Slot]]:
+    """
+    Ключ шаблона и литералы вопроса: термы текста (со стеммингом) вперемешку
+    с типами слотов. «зарплатой больше 100000» и «зарплата больше 150 000»
+    дают один ключ и разные слоты.
+    """
+    key, slots, position = [], [], 0
+    for match in _SLOT_RE.finditer(question):
+        key.extend(_analyzer.tokenize(question[position:match.start()]))
+        slot = _slot(match)
+        key.append(f"<{slot.kind}>")
+        slots.append(slot)
+        position = match.end()
+    key.extend(_analyzer.tokenize(question[position:]))
+    return tuple(key), slots
+
+
+def question_constraints(question: str) -> Tuple[Any, ...]:
+    """
+    Условия вопроса, которых не различают эмбеддинги: направление сравнения,
+    отрицание, порядок и литералы — по порядку появления. Ключ семантического
+    кэша SQL-ответов: перефразировки с теми же условиями совпадают, а
+    «больше 100» и «меньше 100» — нет.
+    """
+    key, slots = canonicalize(question)
+    constraints, slot_values = [], iter(slots)
+    for term in key:
+        if term.startswith("<"):
+            slot = next(slot_values)
+            constraints.append((slot.kind, slot.value))
+        elif term in _CONSTRAINT_TERMS:
+            constraints.append(_CONSTRAINT_TERMS[term])
+    return tuple(constraints)
+
+
+def _wildcards(literal: str, value: str) -> Optional[Tuple[str, str]]:
+    """Префикс и суффикс LIKE-шаблона вокруг значения (`'%Иван%'`), если кроме них в литерале ничего нет"""
+    start = literal.find(value)
+    if start < 0:
+        return None
+    prefix, suffix = literal[:start], literal[start + len(value):]
+    if prefix.strip("%") or suffix.strip("%"):
+        return None
+    return prefix, suffix
+
+
+def _match_literal(slot: Slot, literal: exp.Literal) -> Optional[Dict[str, Any]]:
+    if slot.kind == NUM:
+        if literal.is_string:
+            return None
+        try:
+            equal = Decimal(literal.this) == Decimal(slot.value)
+        except InvalidOperation:
+            return None
+        return {"format": NUM} if equal else None
+    if not literal.is_string:
+        return None
+    for fmt, value in (("iso", slot.value), ("raw", slot.raw)):
+        wildcards = _wildcards(literal.this, value)
+        if wildcards is not None:
+            return {"format": fmt, "prefix": wildcards[0], "suffix": wildcards[1]}
+    return None
+
+
+class SQLTemplate:
+    """SQL-запрос с параметрами на месте литералов вопроса (AST sqlglot с плейсхолдерами slot<i>)"""
+
+    def __init__(self, ast: exp.Expression, params: Dict[str, Dict[str, Any]], dialect: str):
+        self.ast = ast
+        self.params = params  # имя плейсхолдера -> номер слота и формат литерала
+        self.dialect = dialect
+        self.created_at = time.time()
+
+    @classmethod
+    def build(cls, sql: str, slots: List[Slot], dialect: str = "postgres") -> Optional['SQLTemplate']:
+        """
+        Шаблон из сгенерированного SQL. Каждый слот вопроса должен совпасть
+        ровно с одним литералом запроса, иначе подстановка неоднозначна и
+        шаблон не строится (None).
+        """
+        if not slots or len({(slot.kind, slot.value) for slot in slots}) != len(slots):
+            return None
+        fenced = _SQL_FENCE_RE.search(sql)
+        try:
+            statements = sqlglot.parse(fenced.group(1) if fenced else sql, read=dialect)
+        except Exception:
+            return None
+        if len(statements) != 1 or not isinstance(statements[0], exp.Query):
+            return None
+
+        ast = statements[0]
+        literals = list(ast.find_all(exp.Literal))
+        replacements, params = {}, {}
+        for index, slot in enumerate(slots):
+            matches = [(literal, info) for literal in literals if (info := _match_literal(slot, literal)) is not None]
+            if len(matches) != 1 or id(matches[0][0]) in replacements:
+                return None
+            literal, info = matches[0]
+            name = f"slot{index}"
+            replacements[id(literal)] = name
+            params[name] = {"slot": index, **info}
+
+        ast = ast.transform(
+            lambda node: exp.Placeholder(this=replacements[id(node)]) if id(node) in replacements else node,
+            copy=False,
+        )
+        return cls(ast, params, dialect)
+
+    def render(self, slots: List[Slot]) -> str:
+        def substitute(node):
+            if not isinstance(node, exp.Placeholder) or node.this not in self.params:
+                return node
+            param = self.params[node.this]
+            slot = slots[param["slot"]]
+            if param["format"] == NUM:
+                return exp.Literal.number(slot.value)
+            value = slot.value if param["format"] == "iso" else slot.raw
+            return exp.Literal.string(f"{param['prefix']}{value}{param['suffix']}")
+
+        return self.ast.transform(substitute).sql(dialect=self.dialect)
+
+
+class SQLTemplateCache:
+    """
+    Кэш SQL по шаблону вопроса: вопросы, различающиеся только числами,
+    датами и именами в кавычках, получают ранее сгенерированный запрос с
+    подставленными литералами — без поиска и без LLM.
+
+    Записи живут `ttl` секунд, вытесняются по LRU и сбрасываются при
+    изменении базы знаний: сразу — по подписке на KnowledgeBaseLoader, а
+    изменения из других процессов замечаются сверкой `kb_version()` не чаще
+    раза в `version_check_interval` секунд.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 3600.0,
+        kb_loader=None,
+        dialect: str = "postgres",
+        kb_version: Callable[[], str] = None,
+        version_check_interval: float = 5.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.kb_loader = kb_loader
+        self.dialect = dialect
+        self.kb_version = kb_version
+        self.version_check_interval = version_check_interval
+        self._templates: "OrderedDict[Tuple[str, ...], SQLTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = kb_version() if kb_version else None
+        self._version_checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        if kb_loader is not None:
+            kb_loader.subscribe(self._on_kb_change)
+
+    def close(self):
+        if self.kb_loader is not None:
+            self.kb_loader.unsubscribe(self._on_kb_change)
+
+    def _on_kb_change(self, collection_name: str, upserted, removed_ids):
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._templates.clear()
+
+    def _check_version(self):
+        if self.kb_version is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = self.kb_version()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def get(self, question: str) -> Optional[str]:
+        self._check_version()
+        key, slots = canonicalize(question)
+        with self._lock:
+            template = self._templates.get(key) if slots else None
+            if template is not None and template.created_at < time.time() - self.ttl:
+                del self._templates[key]
+                template = None
+            if template is None:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(key)
+            self.hits += 1
+        return template.render(slots)
+
+    def put(self, question: str, sql: str) -> bool:
+        """Запоминает шаблон; False — запрос не параметризуется по литералам вопроса"""
+        key, slots = canonicalize(question)
+        if not slots:
+            return False
+        template = SQLTemplate.build(sql, slots, self.dialect)
+        with self._lock:
+            if template is None:
+                self.rejected += 1
+                return False
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "rejected": self.rejected,
+            "size": len(self._templates),
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,3 @@
+from .src import Analyzer, StopwordFilter, RussianStemFilter, default_analyzer, normalize
+from .russian_stemmer import stem as russian_stem
+from .stopwords import RUSSIAN_STOPWORDS
\ No newline at end of file
@@ -0,0 +1,82 @@
+# Стеммер Snowball для русского языка (http://snowball.tartarus.org/algorithms/russian/stemmer.html)
+
+import re
+
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND = re.compile(r"(?:(?<=[ая])(?:вшись|вши|в)|ившись|ывшись|ивши|ывши|ив|ыв)$")
+_REFLEXIVE = re.compile(r"(?:ся|сь)$")
+_ADJECTIVE = r"(?:ими|ыми|его|ого|ему|ому|ее|ие|ые|ое|ей|ий|ый|ой|ем|им|ым|ом|их|ых|ую|юю|ая|яя|ою|ею)"
+_PARTICIPLE = r"(?:(?<=[ая])(?:ем|нн|вш|ющ|щ)|ивш|ывш|ующ)"
+_ADJECTIVAL = re.compile(rf"(?:{_PARTICIPLE})?{_ADJECTIVE}$")
+_VERB = re.compile(
+    r"(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)"
+    r"|ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)$"
+)
+_NOUN = re.compile(
+    r"(?:иями|ями|ами|иях|иям|ием|ией|ях|ям|ах|ам|ом|ем|ев|ов|ие|ье|еи|ии|ей|ой|ий|ию|ью|ия|ья|а|е|и|й|о|у|ы|ь|ю|я)$"
+)
+_DERIVATIONAL = re.compile(r"(?:ость|ост)$")
+_SUPERLATIVE = re.compile(r"(?:ейше|ейш)$")
+
+
+def _regions(word: str):
+    """Начала областей RV и R2 (по определению алгоритма Snowball)."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(pattern: re.Pattern, word: str, start: int):
+    """Удаляет окончание `pattern`, если оно целиком лежит в области с позиции `start`."""
+    match = pattern.search(word, start)
+    if match is None:
+        return word, False
+    return word[:match.start()], True
+
+
+def stem(word: str) -> str:
+    """Основа русского слова (ожидается строка в нижнем регистре, ё заменена на е)."""
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    word, found = _strip(_PERFECTIVE_GERUND, word, rv)
+    if not found:
+        word, _ = _strip(_REFLEXIVE, word, rv)
+        word, found = _strip(_ADJECTIVAL, word, rv)
+        if not found:
+            word, found = _strip(_VERB, word, rv)
+            if not found:
+                word, _ = _strip(_NOUN, word, rv)
+
+    # Шаг 2
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    word, _ = _strip(_DERIVATIONAL, word, max(r2, rv))
+
+    # Шаг 4
+    if word.endswith("нн") and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        word, found = _strip(_SUPERLATIVE, word, rv)
+        if found and word.endswith("нн"):
+            word = word[:-1]
+        elif word.endswith("ь") and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
@@ -0,0 +1,87 @@
+# src/utils/text_analyzer.py
+
+import re
+from functools import lru_cache
+from typing import Callable, FrozenSet, List, Optional, Sequence, Tuple
+
+from .russian_stemmer import stem as russian_stem
+from .stopwords import RUSSIAN_STOPWORDS
+
+_TOKEN_RE = re.compile(r"\w+")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Фильтр токена: возвращает новый токен или None, чтобы выбросить его
+TokenFilter = Callable[[str], Optional[str]]
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+class StopwordFilter:
+    def __init__(self, stopwords: FrozenSet[str] = RUSSIAN_STOPWORDS):
+        self.stopwords = stopwords
+
+    def __call__(self, token: str) -> Optional[str]:
+        return None if token in self.stopwords else token
+
+
+class RussianStemFilter:
+    """Стемминг кириллических слов; латиница (имена таблиц и колонок) и числа не меняются."""
+
+    def __init__(self, min_length: int = 3):
+        self.min_length = min_length
+
+    def __call__(self, token: str) -> Optional[str]:
+        if len(token) < self.min_length or not _CYRILLIC_RE.search(token):
+            return token
+        return russian_stem(token)
+
+
+class Analyzer:
+    """
+    Цепочка разбора текста для лексического поиска: нормализация, токены
+    `\\w+` и фильтры (по умолчанию стоп-слова и русский стеммер).
+
+    Один экземпляр используется и при построении индекса, и при запросах:
+    результат цепочки для каждого слова кэшируется в LRU на `cache_size`
+    слов, разбор целых запросов — в LRU на `query_cache_size` запросов.
+    """
+
+    def __init__(
+        self,
+        token_filters: Sequence[TokenFilter] = None,
+        cache_size: int = 100_000,
+        query_cache_size: int = 1024,
+        name: str = "ru-snowball",
+    ):
+        # Имя входит в отпечаток снимков индекса: другая цепочка — другой снимок
+        self.name = name
+        self.token_filters = list(token_filters) if token_filters is not None else [StopwordFilter(), RussianStemFilter()]
+        self._analyze_token = lru_cache(maxsize=cache_size)(self._apply_filters)
+        self._analyze_query = lru_cache(maxsize=query_cache_size)(self._tokenize_tuple)
+
+    def _apply_filters(self, token: str) -> Optional[str]:
+        for token_filter in self.token_filters:
+            token = token_filter(token)
+            if token is None:
+                return None
+        return token
+
+    def _tokenize_tuple(self, text: str) -> Tuple[str, ...]:
+        analyze_token = self._analyze_token
+        return tuple(term for term in map(analyze_token, _TOKEN_RE.findall(normalize(text))) if term is not None)
+
+    def tokenize(self, text: str) -> List[str]:
+        """Термы документа"""
+        return list(self._tokenize_tuple(text))
+
+    def analyze_query(self, query: str) -> Tuple[str, ...]:
+        """Термы запроса (кэшируются целиком: одни и те же вопросы приходят часто)"""
+        return self._analyze_query(query)
+
+    def cache_info(self):
+        return {"tokens": self._analyze_token.cache_info(), "queries": self._analyze_query.cache_info()}
+
+
+default_analyzer = Analyzer()
@@ -0,0 +1,8 @@
+# Служебные слова русского языка, не несущие смысла для поиска (после замены ё на е)
+
+RUSSIAN_STOPWORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его ее ей
+если есть еще же за здесь и из или им их к как ко когда кто ли либо мне может мы на над надо наш не него нее
+нет ни них но ну о об однако он она они оно от очень по под при с со так также такой там те тем то того тоже
+той только том ты у уже хотя чего чей чем что чтобы чье чья эта эти это этого этой этом этот я
+""".split())
@@ -0,0 +1 @@
+from .src import TextChunker, count_tokens
\ No newline at end of file
@@ -0,0 +1,217 @@
+# src/utils/text_chunker.py
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+
+# Текст без пустых строк (например, выгрузка PDF) не копим в один бесконечный блок
+_MAX_BLOCK_LINES = 500
+
+
+def count_tokens(text: str) -> int:
+    """Приближённое число токенов: слова и знаки препинания (без зависимости от токенизатора)."""
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class _Block:
+    kind: str  # heading | paragraph | table | code
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+class TextChunker:
+    """
+    Потоковый чанкер для базы знаний.
+
+    Принимает итератор строк (файл, страницы PDF, абзацы DOCX), поэтому большой
+    документ никогда не собирается в одну строку. Учитывает разметку markdown:
+    заголовок начинает новый чанк, а цепочка заголовков добавляется в начало
+    каждого чанка раздела; таблицы режутся только по строкам, с повтором шапки.
+    Между чанками одного раздела текста сохраняется перекрытие `chunk_overlap` токенов.
+    """
+
+    def __init__(self, chunk_size: int = 400, chunk_overlap: int = 50):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap должен быть меньше chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split(self, lines: Iterable[str]) -> Iterator[str]:
+        headings: List[Tuple[int, str]] = []
+        buffer: List[Tuple[str, str]] = []  # (kind, text)
+        buffer_tokens = 0
+
+        def breadcrumb() -> str:
+            return "\n".join(text for _, text in headings)
+
+        def emit() -> str:
+            body = "\n\n".join(text for _, text in buffer)
+            prefix = breadcrumb()
+            return f"{prefix}\n\n{body}" if prefix else body
+
+        for block in self._blocks(lines):
+            if block.kind == "heading":
+                if buffer:
+                    yield emit()
+                    buffer, buffer_tokens = [], 0
+                level = len(_HEADING_RE.match(block.lines[0]).group(1))
+                headings = [h for h in headings if h[0] < level] + [(level, block.lines[0])]
+                continue
+
+            budget = max(1, self.chunk_size - count_tokens(breadcrumb()))
+            for piece in self._fit(block, budget):
+                piece_tokens = count_tokens(piece)
+                if buffer and buffer_tokens + piece_tokens > budget:
+                    yield emit()
+                    overlap = self._overlap(buffer)
+                    overlap_tokens = count_tokens(overlap)
+                    if overlap and overlap_tokens + piece_tokens <= budget:
+                        buffer, buffer_tokens = [("paragraph", overlap)], overlap_tokens
+                    else:
+                        buffer, buffer_tokens = [], 0
+                buffer.append((block.kind, piece))
+                buffer_tokens += piece_tokens
+
+        if buffer:
+            yield emit()
+
+    def _overlap(self, buffer: List[Tuple[str, str]]) -> str:
+        # Перекрытие берём только из обычного текста: у таблиц повторяется шапка
+        if not self.chunk_overlap or buffer[-1][0] != "paragraph":
+            return ""
+
+        # Берём хвостовые строки целиком, а если не влезает даже одна — хвост её слов
+        tail, tail_tokens = [], 0
+        for line in reversed(buffer[-1][1].splitlines()):
+            line_tokens = count_tokens(line)
+            if tail_tokens + line_tokens > self.chunk_overlap:
+                if not tail:
+                    tail = [self._tail_words(line, self.chunk_overlap)]
+                break
+            tail.insert(0, line)
+            tail_tokens += line_tokens
+        return "\n".join(tail).strip()
+
+    @staticmethod
+    def _tail_words(line: str, max_tokens: int) -> str:
+        words, words_tokens = [], 0
+        for word in reversed(line.split()):
+            word_tokens = count_tokens(word)
+            if words_tokens + word_tokens > max_tokens:
+                break
+            words.insert(0, word)
+            words_tokens += word_tokens
+        return " ".join(words)
+
+    @staticmethod
+    def _blocks(lines: Iterable[str]) -> Iterator[_Block]:
+        current = None
+        in_code = False
+
+        for raw_line in lines:
+            for line in raw_line.splitlines() or [""]:
+                stripped = line.strip()
+
+                if in_code:
+                    current.lines.append(line)
+                    if stripped.startswith("```"):
+                        in_code = False
+                        yield current
+                        current = None
+                    continue
+
+                if stripped.startswith("```"):
+                    if current:
+                        yield current
+                    current = _Block("code", [line])
+                    in_code = True
+                    continue
+
+                if not stripped:
+                    if current:
+                        yield current
+                        current = None
+                    continue
+
+                if _HEADING_RE.match(stripped):
+                    if current:
+                        yield current
+                        current = None
+                    yield _Block("heading", [stripped])
+                    continue
+
+                kind = "table" if stripped.startswith("|") else "paragraph"
+                if current is not None and (current.kind != kind or (kind == "paragraph" and len(current.lines) >= _MAX_BLOCK_LINES)):
+                    yield current
+                    current = None
+                if current is None:
+                    current = _Block(kind)
+                current.lines.append(line.rstrip())
+
+        if current:
+            yield current
+
+    def _fit(self, block: _Block, budget: int) -> Iterator[str]:
+        """Режет блок, не влезающий в чанк, на части не больше `budget` токенов."""
+        text = block.text
+        if count_tokens(text) <= budget:
+            yield text
+            return
+
+        if block.kind == "table":
+            yield from self._split_table(block.lines, budget)
+        else:
+            yield from self._split_lines(block.lines, budget)
+
+    def _split_table(self, lines: List[str], budget: int) -> Iterator[str]:
+        header = lines[:2] if len(lines) > 1 and _TABLE_SEPARATOR_RE.match(lines[1].strip()) else lines[:1]
+        header_tokens = count_tokens("\n".join(header))
+        rows, rows_tokens = [], 0
+
+        for row in lines[len(header):]:
+            row_tokens = count_tokens(row)
+            if rows and header_tokens + rows_tokens + row_tokens > budget:
+                yield "\n".join(header + rows)
+                rows, rows_tokens = [], 0
+            rows.append(row)
+            rows_tokens += row_tokens
+
+        if rows:
+            yield "\n".join(header + rows)
+
+    def _split_lines(self, lines: List[str], budget: int) -> Iterator[str]:
+        part, part_tokens = [], 0
+        for line in lines:
+            for piece in self._split_words(line, budget):
+                piece_tokens = count_tokens(piece)
+                if part and part_tokens + piece_tokens > budget:
+                    yield "\n".join(part)
+                    part, part_tokens = [], 0
+                part.append(piece)
+                part_tokens += piece_tokens
+        if part:
+            yield "\n".join(part)
+
+    @staticmethod
+    def _split_words(line: str, budget: int) -> Iterator[str]:
+        if count_tokens(line) <= budget:
+            yield line
+            return
+        words, words_tokens = [], 0
+        for word in line.split():
+            word_tokens = count_tokens(word)
+            if words and words_tokens + word_tokens > budget:
+                yield " ".join(words)
+                words, words_tokens = [], 0
+            words.append(word)
+            words_tokens += word_tokens
+        if words:
+            yield " ".join(words)
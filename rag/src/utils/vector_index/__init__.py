@@ -0,0 +1,2 @@
+from .quantization import CompressedVectors, PCAProjector
+from .mirror import LocalVectorMirror, MirroredChromaClient
\ No newline at end of file
@@ -0,0 +1,355 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.utils.bm25_index_builder import DocStore
+from .quantization import CompressedVectors
+
+# Сколько записей читаем из Chroma за один запрос при загрузке зеркала
+_LOAD_PAGE = 1000
+
+
+def _as_matrix(embeddings, count: int) -> np.ndarray:
+    if not count:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(embeddings, dtype=np.float32).reshape(count, -1)
+
+
+class _CollectionMirror:
+    """
+    Локальная копия одной коллекции: документы в DocStore, векторы — сжатая
+    основа (CompressedVectors) и дописанные после неё float32-строки.
+    Удалённые строки помечаются маской; когда дописанных или удалённых
+    становится много, основа пересобирается. Исходные float32-векторы основы
+    (для точного пересчёта кандидатов) лежат memmap-файлом в `directory`, в
+    памяти — только сжатые коды. Запись — под `lock`.
+    """
+
+    def __init__(self, name: str, metric: str, dtype: str, pca_components: int, directory: str):
+        self.lock = threading.Lock()
+        self.name = name
+        self.directory = directory
+        self.originals_path = None
+        self.metric = metric
+        self.dtype = dtype
+        self.pca_components = pca_components
+        self.store = DocStore()
+        self.base: Optional[CompressedVectors] = None
+        self.extra = np.zeros((0, 0), dtype=np.float32)
+        self.extra_count = 0
+        self.deleted = np.zeros(0, dtype=bool)
+
+    @property
+    def base_count(self) -> int:
+        return len(self.base) if self.base is not None else 0
+
+    def reset(self, ids: Sequence[str], embeddings: np.ndarray, documents: Sequence[str], metadatas: Sequence[dict]):
+        store = DocStore()
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            store.append(doc_id, document or "", metadata or {})
+        base = None
+        if len(ids):
+            # PCA имеет смысл, только когда векторов заметно больше компонент
+            pca_components = self.pca_components if self.pca_components and len(ids) > self.pca_components else None
+            base = CompressedVectors.build(
+                embeddings, dtype=self.dtype, pca_components=pca_components, keep_originals=False
+            )
+            base.originals = self._spill(embeddings)
+        self.store, self.base = store, base
+        self.extra = np.zeros((0, embeddings.shape[1] if len(ids) else 0), dtype=np.float32)
+        self.extra_count = 0
+        self.deleted = np.zeros(len(ids), dtype=bool)
+
+    def _spill(self, embeddings: np.ndarray) -> np.ndarray:
+        """Пишет векторы в новый файл и открывает его через memmap; прежний файл удаляется"""
+        path = os.path.join(self.directory, f"{self.name}-{uuid.uuid4().hex}.npy")
+        originals = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=embeddings.shape)
+        originals[:] = embeddings
+        originals.flush()
+        # Идущие поиски дочитывают старый файл через своё отображение — удаление им не мешает
+        self.discard()
+        self.originals_path = path
+        return np.load(path, mmap_mode="r")
+
+    def discard(self):
+        if self.originals_path is not None:
+            try:
+                os.remove(self.originals_path)
+            except OSError:
+                pass
+            self.originals_path = None
+
+    def delete(self, ids: Sequence[str]) -> int:
+        removed = 0
+        for doc_id in ids:
+            row = self.store.delete(doc_id)
+            if row is not None:
+                self.deleted[row] = True
+                removed += 1
+        return removed
+
+    def upsert(self, ids: Sequence[str], embeddings: np.ndarray, documents: Sequence[str], metadatas: Sequence[dict]):
+        self.delete(ids)
+        count = self.extra_count + len(ids)
+        if self.extra.shape[1] != embeddings.shape[1] or count > len(self.extra):
+            # Буфер дописанных векторов растёт с запасом; старый остаётся у идущих поисков
+            grown = np.zeros((max(count, 2 * len(self.extra), 64), embeddings.shape[1]), dtype=np.float32)
+            if self.extra_count:
+                grown[:self.extra_count] = self.extra[:self.extra_count]
+            self.extra = grown
+        self.extra[self.extra_count:count] = embeddings
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.store.append(doc_id, document or "", metadata or {})
+        self.extra_count = count
+
+        deleted = np.zeros(len(self.store), dtype=bool)
+        deleted[:len(self.deleted)] = self.deleted
+        self.deleted = deleted
+
+    def needs_compaction(self) -> bool:
+        total = len(self.store)
+        dead = total - self.store.live_count
+        return self.extra_count > max(1000, self.base_count // 10) or (total and dead / total > 0.2)
+
+    def compacted(self) -> '_CollectionMirror':
+        """Новая копия с пересобранной основой из живых строк; эта копия не меняется"""
+        rows = list(self.store.rows())
+        docs = [self.store.doc(row) for row in rows]
+        mirror = _CollectionMirror(self.name, self.metric, self.dtype, self.pca_components, self.directory)
+        mirror.reset(
+            [doc["id"] for doc in docs],
+            self.vectors_at(rows),
+            [doc["text"] for doc in docs],
+            [doc["metadata"] for doc in docs],
+        )
+        return mirror
+
+    def vectors_at(self, rows: Sequence[int]) -> np.ndarray:
+        """float32-векторы строк (из исходников основы или из дописанных)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        dim = self.base.originals.shape[1] if self.base is not None else self.extra.shape[1]
+        out = np.empty((len(rows), dim), dtype=np.float32)
+        in_base = rows < self.base_count
+        if in_base.any():
+            out[in_base] = np.asarray(self.base.originals[rows[in_base]], dtype=np.float32)
+        if (~in_base).any():
+            out[~in_base] = self.extra[rows[~in_base] - self.base_count]
+        return out
+
+    def search(self, query: np.ndarray, n_results: int):
+        # Состояние берём под блокировкой: запись подменяет массивы целиком и только дописывает за extra_count
+        with self.lock:
+            store, base, extra, extra_count, deleted = self.store, self.base, self.extra, self.extra_count, self.deleted
+        base_count = len(base) if base is not None else 0
+        has_deleted = len(store) > store.live_count
+
+        rows_parts, distance_parts = [], []
+        if base_count:
+            candidates = ~deleted[:base_count] if has_deleted else None
+            rows, distances = base.search(query, top_k=n_results, metric=self.metric, candidates=candidates)
+            rows_parts.append(rows)
+            distance_parts.append(distances)
+        if extra_count:
+            vectors = extra[:extra_count]
+            query = np.asarray(query, dtype=np.float32).ravel()
+            distances = CompressedVectors._score(
+                vectors @ query, np.einsum("ij,ij->i", vectors, vectors), float(query @ query), self.metric
+            ).astype(np.float32)
+            rows = np.arange(base_count, base_count + extra_count, dtype=np.int64)
+            alive = ~deleted[rows]
+            rows_parts.append(rows[alive])
+            distance_parts.append(distances[alive])
+
+        if not rows_parts:
+            return store, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, distances = np.concatenate(rows_parts), np.concatenate(distance_parts)
+        order = np.argsort(distances, kind="stable")[:n_results]
+        return store, rows[order], distances[order]
+
+
+class LocalVectorMirror:
+    """
+    Копия коллекций Chroma в памяти процесса для семантического поиска без
+    HTTP: сжатые векторы (VECTOR_INDEX_DTYPE, опционально PCA) с точным
+    пересчётом лучших кандидатов по float32, как в CompressedVectors.
+
+    Загружается из Chroma при старте (`load`), дальше обновляется по подписке
+    на KnowledgeBaseLoader: векторы изменённых чанков перечитываются из Chroma
+    по ID. Chroma остаётся источником истины — изменения из других процессов
+    подхватываются фоновым потоком, который раз в `refresh_interval` секунд
+    сверяет число записей и перезагружает разошедшиеся коллекции (правки на
+    месте без изменения числа записей видны после `reload`). Перезагрузки и
+    изменения выполняются по очереди, новая копия коллекции подменяет старую
+    целиком — поиск не ждёт загрузки.
+
+    Исходные векторы для пересчёта хранятся в `directory` (по умолчанию —
+    временная директория, удаляемая вместе с зеркалом).
+    """
+
+    def __init__(
+        self,
+        chroma_client,
+        kb_loader=None,
+        collections: Sequence[str] = ("docs", "sql_examples", "t2t_docs"),
+        dtype: str = "int8",
+        pca_components: int = 0,
+        refresh_interval: float = 30.0,
+        directory: str = None,
+    ):
+        self.chroma_client = chroma_client
+        self.kb_loader = kb_loader
+        self.collection_names = list(collections)
+        self.dtype = dtype
+        self.pca_components = pca_components
+        self.refresh_interval = refresh_interval
+        self._mirrors: Dict[str, _CollectionMirror] = {}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="vector-mirror-")
+            weakref.finalize(self, shutil.rmtree, directory, True)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        if kb_loader is not None:
+            kb_loader.subscribe(self.apply_changes)
+
+    def __contains__(self, collection_name: str) -> bool:
+        return collection_name in self._mirrors
+
+    def load(self) -> 'LocalVectorMirror':
+        for name in self.collection_names:
+            try:
+                self.reload(name)
+            except Exception as e:
+                # Коллекции без зеркала ищутся через Chroma как раньше
+                print(f"⚠️ Зеркало коллекции {name} не загружено: {e}")
+        if self.refresh_interval > 0 and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="vector-mirror-refresh", daemon=True)
+            self._refresher.start()
+        return self
+
+    def reload(self, collection_name: str):
+        with self._reload_lock:
+            self._reload_locked(collection_name)
+
+    def _reload_locked(self, collection_name: str):
+        collection = self.chroma_client.get_collection(collection_name)
+        metric = (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+        ids, embeddings, documents, metadatas = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=_LOAD_PAGE, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+
+        mirror = _CollectionMirror(collection_name, metric, self.dtype, self.pca_components, self.directory)
+        mirror.reset(ids, _as_matrix(embeddings, len(ids)), documents, metadatas)
+        previous = self._mirrors.get(collection_name)
+        self._mirrors[collection_name] = mirror
+        if previous is not None:
+            previous.discard()
+        print(f"✅ Зеркало коллекции {collection_name}: {len(ids)} векторов")
+
+    def close(self):
+        self._stop.set()
+        if self.kb_loader is not None:
+            self.kb_loader.unsubscribe(self.apply_changes)
+
+    def apply_changes(self, collection_name: str, upserted, removed_ids: List[str]):
+        """Подписка на KnowledgeBaseLoader: векторы новых чанков читаются из Chroma по ID"""
+        if collection_name not in self._mirrors:
+            return
+        with self._reload_lock:
+            self._apply_changes_locked(collection_name, upserted, removed_ids)
+
+    def _apply_changes_locked(self, collection_name: str, upserted, removed_ids: List[str]):
+        ids = list(dict.fromkeys(doc.metadata["chunk_id"] for doc in upserted if doc.metadata.get("chunk_id")))
+        fetched = None
+        if ids:
+            fetched = self.chroma_client.get_collection(collection_name).get(
+                ids=ids, include=["embeddings", "documents", "metadatas"]
+            )
+        mirror = self._mirrors.get(collection_name)
+        with mirror.lock:
+            mirror.delete(removed_ids)
+            if fetched is not None and fetched["ids"]:
+                embeddings = _as_matrix(fetched["embeddings"], len(fetched["ids"]))
+                mirror.upsert(fetched["ids"], embeddings, fetched["documents"], fetched["metadatas"])
+        if mirror.needs_compaction():
+            # Пересборка идёт без блокировки поиска (запись и так одна — под _reload_lock),
+            # готовая копия подменяет старую целиком, как при reload
+            compacted = mirror.compacted()
+            self._mirrors[collection_name] = compacted
+            mirror.discard()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self):
+        """Перезагружает коллекции, число записей которых разошлось с Chroma"""
+        for name in list(self._mirrors):
+            try:
+                with self._reload_lock:
+                    if self.chroma_client.get_collection(name).count() != self._mirrors[name].store.live_count:
+                        self._reload_locked(name)
+            except Exception as e:
+                print(f"⚠️ Не удалось сверить зеркало {name} с Chroma: {e}")
+
+    def query(self, collection_name: str, query_embeddings, n_results: int = 10) -> Dict[str, Any]:
+        """Поиск в формате ответа `collection.query` Chroma"""
+        mirror = self._mirrors[collection_name]
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        for query in query_embeddings:
+            store, rows, distances = mirror.search(query, n_results)
+            docs = [store.doc(row) for row in rows.tolist()]
+            found = [(doc, distance) for doc, distance in zip(docs, distances.tolist()) if doc is not None]
+            result["ids"].append([doc["id"] for doc, _ in found])
+            result["distances"].append([distance for _, distance in found])
+            result["documents"].append([doc["text"] for doc, _ in found])
+            result["metadatas"].append([doc["metadata"] for doc, _ in found])
+        return result
+
+
+class _MirroredCollection:
+    def __init__(self, collection, mirror: LocalVectorMirror):
+        self._collection = collection
+        self._mirror = mirror
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def query(self, query_embeddings=None, n_results: int = 10, **kwargs):
+        # Фильтры и запросы текстом зеркало не обслуживает — их выполняет Chroma
+        if query_embeddings is None or kwargs or self._collection.name not in self._mirror:
+            return self._collection.query(query_embeddings=query_embeddings, n_results=n_results, **kwargs)
+        return self._mirror.query(self._collection.name, query_embeddings, n_results)
+
+
+class MirroredChromaClient:
+    """Клиент Chroma, у которого `query` зеркалированных коллекций выполняется локально; остальное — как есть"""
+
+    def __init__(self, chroma_client, mirror: LocalVectorMirror):
+        self._client = chroma_client
+        self.mirror = mirror
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def get_collection(self, *args, **kwargs):
+        return _MirroredCollection(self._client.get_collection(*args, **kwargs), self.mirror)
+
+    def get_or_create_collection(self, *args, **kwargs):
+        return _MirroredCollection(self._client.get_or_create_collection(*args, **kwargs), self.mirror)
@@ -0,0 +1,252 @@
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+SUPPORTED_METRICS = ("l2", "ip", "cosine")
+
+
+class PCAProjector:
+    """Линейная проекция на первые главные компоненты (обучается на самих векторах)."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # (n_components, dim)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, n_components: int) -> 'PCAProjector':
+        vectors = np.asarray(vectors, dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        # Главные компоненты через SVD центрированной матрицы
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:n_components])
+
+    @property
+    def n_components(self) -> int:
+        return self.components.shape[0]
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+
+class CompressedVectors:
+    """
+    Сжатое хранилище векторов для локальных индексов.
+
+    Векторы хранятся как float16 или int8 (симметричное скалярное квантование
+    с масштабом на строку), опционально после PCA или обрезки размерности.
+    Поиск идёт брутфорсом прямо по сжатому представлению, а лучшие кандидаты
+    пересчитываются по исходным float32-векторам (если они сохранены —
+    обычно это memmap на диске).
+    """
+
+    # Сколько строк разжимаем за раз при сканировании
+    _SCAN_BLOCK = 65_536
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        dtype: str,
+        scales: Optional[np.ndarray] = None,
+        norms_sq: Optional[np.ndarray] = None,
+        projector: Optional[PCAProjector] = None,
+        truncate_dim: Optional[int] = None,
+        originals: Optional[np.ndarray] = None,
+    ):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Неподдерживаемый тип хранения: {dtype}")
+        self.codes = codes
+        self.dtype = dtype
+        self.scales = scales
+        self.projector = projector
+        self.truncate_dim = truncate_dim
+        self.originals = originals
+        self.norms_sq = norms_sq if norms_sq is not None else self._compute_norms_sq()
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        dtype: str = "int8",
+        pca_components: int = None,
+        truncate_dim: int = None,
+        keep_originals: bool = True,
+    ) -> 'CompressedVectors':
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Ожидается матрица векторов (n, dim)")
+
+        projector = None
+        if pca_components:
+            projector = PCAProjector.fit(vectors, pca_components)
+            reduced = projector.transform(vectors)
+        elif truncate_dim:
+            reduced = vectors[:, :truncate_dim]
+        else:
+            reduced = vectors
+
+        codes, scales = cls._encode(reduced, dtype)
+        return cls(
+            codes=codes,
+            dtype=dtype,
+            scales=scales,
+            projector=projector,
+            truncate_dim=truncate_dim if not pca_components else None,
+            originals=vectors if keep_originals else None,
+        )
+
+    @staticmethod
+    def _encode(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if dtype == "float32":
+            return np.ascontiguousarray(vectors, dtype=np.float32), None
+        if dtype == "float16":
+            return vectors.astype(np.float16), None
+
+        # int8: x ≈ code * scale, scale = max|x| / 127 для каждой строки
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _decode_block(self, start: int, stop: int) -> np.ndarray:
+        block = np.asarray(self.codes[start:stop], dtype=np.float32)
+        if self.dtype == "int8":
+            block *= self.scales[start:stop, None]
+        return block
+
+    def _compute_norms_sq(self) -> np.ndarray:
+        norms = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self._SCAN_BLOCK):
+            stop = min(start + self._SCAN_BLOCK, len(self))
+            block = self._decode_block(start, stop)
+            norms[start:stop] = np.einsum("ij,ij->i", block, block)
+        return norms
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Память под сжатые векторы (без исходников для пересчёта)."""
+        total = self.codes.nbytes + self.norms_sq.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total
+
+    def project_query(self, query: np.ndarray) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if self.projector is not None:
+            return self.projector.transform(query[None, :])[0]
+        if self.truncate_dim:
+            return query[:self.truncate_dim]
+        return query
+
+    def decode(self) -> np.ndarray:
+        return self._decode_block(0, len(self))
+
+    @staticmethod
+    def _score(dots, norms_sq, query_norm_sq, metric):
+        """Переводит скалярные произведения в «расстояние» (меньше — ближе)."""
+        if metric == "l2":
+            return norms_sq - 2 * dots + query_norm_sq
+        if metric == "ip":
+            return 1.0 - dots
+        # cosine
+        denom = np.sqrt(np.maximum(norms_sq * query_norm_sq, 1e-12))
+        return 1.0 - dots / denom
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 5,
+        metric: str = "l2",
+        rescore_factor: int = 4,
+        candidates: np.ndarray = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает (индексы, расстояния) top_k ближайших векторов.
+        `candidates` — булева маска строк, участвующих в поиске (например, без удалённых).
+        """
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Неподдерживаемая метрика: {metric}")
+        if len(self) == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        projected = self.project_query(query)
+        query_norm_sq = float(projected @ projected)
+
+        distances = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self._SCAN_BLOCK):
+            stop = min(start + self._SCAN_BLOCK, len(self))
+            dots = self._decode_block(start, stop) @ projected
+            distances[start:stop] = self._score(dots, self.norms_sq[start:stop], query_norm_sq, metric)
+
+        if candidates is not None:
+            distances[~candidates] = np.inf
+
+        available = int(np.isfinite(distances).sum())
+        n_candidates = min(available, top_k * rescore_factor if self.originals is not None else top_k)
+        if n_candidates == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        top = np.argpartition(distances, n_candidates - 1)[:n_candidates]
+
+        if self.originals is not None:
+            # Точный пересчёт кандидатов по float32 (сортируем индексы — так дешевле читать memmap)
+            top = np.sort(top)
+            full_query = np.asarray(query, dtype=np.float32).ravel()
+            originals = np.asarray(self.originals[top], dtype=np.float32)
+            dots = originals @ full_query
+            norms_sq = np.einsum("ij,ij->i", originals, originals)
+            distances_top = self._score(dots, norms_sq, float(full_query @ full_query), metric)
+        else:
+            distances_top = distances[top]
+
+        order = np.argsort(distances_top, kind="stable")[:top_k]
+        return top[order].astype(np.int64), distances_top[order].astype(np.float32)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "codes.npy"), self.codes)
+        np.save(os.path.join(directory, "norms_sq.npy"), self.norms_sq)
+        if self.scales is not None:
+            np.save(os.path.join(directory, "scales.npy"), self.scales)
+        if self.originals is not None:
+            np.save(os.path.join(directory, "originals.npy"), np.asarray(self.originals, dtype=np.float32))
+        if self.projector is not None:
+            np.save(os.path.join(directory, "pca_mean.npy"), self.projector.mean)
+            np.save(os.path.join(directory, "pca_components.npy"), self.projector.components)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "truncate_dim": self.truncate_dim}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'CompressedVectors':
+        mmap_mode = "r" if mmap else None
+
+        def optional(name):
+            path = os.path.join(directory, name)
+            return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        pca_mean = optional("pca_mean.npy")
+        projector = None
+        if pca_mean is not None:
+            projector = PCAProjector(np.asarray(pca_mean), np.asarray(optional("pca_components.npy")))
+
+        return cls(
+            codes=np.load(os.path.join(directory, "codes.npy"), mmap_mode=mmap_mode),
+            dtype=meta["dtype"],
+            scales=optional("scales.npy"),
+            norms_sq=optional("norms_sq.npy"),
+            projector=projector,
+            truncate_dim=meta.get("truncate_dim"),
+            originals=optional("originals.npy"),
+        )
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+# Эмбеддинги считаются локально (без Yandex API) и не кэшируются на диск
+os.environ["EMBEDDING_PROVIDER"] = "hashing"
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+# Снимок BM25 пишется только туда, куда его явно направил тест (kb_path во временной папке)
+os.environ.setdefault("BM25_SNAPSHOT", "1")
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+else:
+    # Загрузчик подключается к Chroma из docker-compose через HttpClient — в тестах это клиент в памяти
+    chromadb.HttpClient = lambda *args, **kwargs: chromadb.EphemeralClient()
+
+
+@pytest.fixture
+def chroma_client():
+    if chromadb is None:
+        pytest.skip("chromadb не установлен")
+    client = chromadb.EphemeralClient()
+    # Клиенты в памяти одного процесса делят состояние — начинаем с пустой базы
+    for collection in client.list_collections():
+        client.delete_collection(getattr(collection, "name", collection))
+    return client
+
+
+@pytest.fixture
+def kb_path(tmp_path):
+    for collection_name in ("docs", "sql_examples", "t2t_docs"):
+        (tmp_path / collection_name).mkdir()
+    return tmp_path
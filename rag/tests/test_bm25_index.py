@@ -0,0 +1,113 @@
+import pytest
+from langchain_core.documents import Document
+
+from src.utils.bm25_index_builder import src as bm25_src
+from src.utils.bm25_index_builder import BM25IndexBuilder
+
+
+def doc(chunk_id: str, text: str, source: str = "a.md") -> Document:
+    return Document(page_content=text, metadata={"source": source, "chunk_id": chunk_id})
+
+
+DOCS = [
+    doc("docs_a#0", "Отдел кадров ведёт учёт сотрудников и их зарплат"),
+    doc("docs_a#1", "Склад хранит остатки материалов и готовой продукции"),
+    doc("docs_b#0", "Поставщики отгружают материалы по заказам на закупку", source="b.md"),
+    doc("docs_b#1", "Бухгалтерия начисляет зарплату сотрудникам ежемесячно", source="b.md"),
+]
+
+
+class FakeLoader:
+    """Минимальный загрузчик: документы из памяти и версия базы знаний, которую задаёт тест"""
+
+    def __init__(self, kb_path, docs, version="v1"):
+        self.kb_path = str(kb_path)
+        self.docs = list(docs)
+        self.version = version
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def files_fingerprint(self, collection_names):
+        return self.version
+
+    def load_docs(self, docs_type, docs_dir):
+        return list(self.docs)
+
+    def load_sql_examples(self):
+        return []
+
+    def duplicate_chunk_ids(self):
+        return set()
+
+
+@pytest.fixture(autouse=True)
+def no_background_merge(monkeypatch):
+    # Слияние сегментов тесты вызывают сами — без фонового потока
+    monkeypatch.setattr(bm25_src, "BM25_MAX_SEGMENTS", 1000)
+    monkeypatch.setattr(bm25_src, "BM25_MERGE_DELETED_RATIO", 1.0)
+    monkeypatch.setattr(bm25_src, "BM25_SHARDS", 0)
+
+
+def ids(results):
+    return [result["id"] for result in results]
+
+
+def test_build_and_search(tmp_path):
+    builder = BM25IndexBuilder(FakeLoader(tmp_path, DOCS)).build_index()
+    assert set(ids(builder.search("зарплата сотрудников", top_k=2))) == {"docs_a#0", "docs_b#1"}
+    assert builder.get("docs_a#1")["text"] == DOCS[1].page_content
+
+
+def test_add_replaces_by_id_and_remove_hides(tmp_path):
+    builder = BM25IndexBuilder(FakeLoader(tmp_path, DOCS)).build_index()
+
+    builder.add_documents([doc("docs_a#1", "Склад отгружает жирафов"), doc("docs_c#0", "Жирафы живут в зоопарке", "c.md")])
+    assert set(ids(builder.search("жирафы", top_k=5))) == {"docs_a#1", "docs_c#0"}
+    assert ids(builder.search("остатки материалов", top_k=5)).count("docs_a#1") == 0
+    assert len(builder.corpus) == 5
+
+    assert builder.remove_documents(["docs_c#0", "missing"]) == 1
+    assert ids(builder.search("жирафы", top_k=5)) == ["docs_a#1"]
+    assert builder.get("docs_c#0") is None
+
+
+def test_merge_matches_fresh_build_and_compacts_store(tmp_path):
+    loader = FakeLoader(tmp_path, DOCS)
+    builder = BM25IndexBuilder(loader).build_index()
+    extra = [doc(f"docs_x#{i}", f"Заказ номер {i} на закупку материалов у поставщика", "x.md") for i in range(6)]
+    for chunk in extra:
+        builder.add_documents([chunk])
+    builder.remove_documents(["docs_a#1", "docs_x#0", "docs_x#3"])
+    assert len(builder._segments) == 7
+
+    builder._merge()
+
+    live = [chunk for chunk in DOCS + extra if chunk.metadata["chunk_id"] not in {"docs_a#1", "docs_x#0", "docs_x#3"}]
+    fresh = BM25IndexBuilder(FakeLoader(tmp_path / "fresh", live)).build_index()
+    assert len(builder._segments) == 1
+    assert len(builder.store) == builder.store.live_count == len(live)
+    for query in ("закупка материалов", "зарплата", "поставщик заказ 5"):
+        merged, expected = builder.search(query, top_k=10), fresh.search(query, top_k=10)
+        assert ids(merged) == ids(expected)
+        assert [r["score"] for r in merged] == pytest.approx([r["score"] for r in expected])
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_src, "BM25_SNAPSHOT", True)
+    built = BM25IndexBuilder(FakeLoader(tmp_path, DOCS)).build_index()
+
+    # Та же версия базы знаний — индекс открывается из снимка, документы не читаются
+    reader = FakeLoader(tmp_path, [])
+    opened = BM25IndexBuilder(reader).build_index()
+    for query in ("зарплата сотрудников", "материалы"):
+        assert ids(opened.search(query, top_k=4)) == ids(built.search(query, top_k=4))
+    assert opened.get("docs_b#0") == built.get("docs_b#0")
+
+    # Новая версия — снимок не подходит, индекс строится заново
+    reader.version = "v2"
+    assert BM25IndexBuilder(reader).build_index().corpus == []
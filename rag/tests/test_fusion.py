@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from src.utils.fusion import IdSpace, fuse, RRF, WEIGHTED, NORMALIZED
+
+
+def ranking(ids, scores):
+    return np.asarray(ids, dtype=np.int64), np.asarray(scores, dtype=np.float64)
+
+
+def test_rrf_sums_reciprocal_ranks():
+    ids, scores = fuse([ranking([1, 2, 3], [0.9, 0.5, 0.1]), ranking([3, 1], [10.0, 5.0])], mode=RRF, top_k=None, k=60)
+    assert ids.tolist() == [1, 3, 2]
+    assert scores[0] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_weighted_uses_raw_scores_and_weights():
+    ids, scores = fuse([ranking([1, 2], [1.0, 3.0]), ranking([1], [4.0])], mode=WEIGHTED, weights=[1.0, 0.5], top_k=None)
+    assert ids.tolist() == [1, 2]
+    assert scores.tolist() == pytest.approx([3.0, 3.0])
+
+
+def test_normalized_scales_each_ranking():
+    ids, scores = fuse([ranking([1, 2, 3], [10.0, 20.0, 30.0]), ranking([1], [0.5])], mode=NORMALIZED, top_k=None)
+    # Единственный результат второго ретривера получает 1
+    assert dict(zip(ids.tolist(), scores.tolist())) == pytest.approx({1: 1.0, 2: 0.5, 3: 1.0})
+
+
+def test_ties_prefer_smaller_id_at_top_k_boundary():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 30))
+        ids = rng.permutation(100)[:n]
+        scores = rng.integers(0, 3, n).astype(np.float64)
+        top_k = int(rng.integers(1, 35))
+        fused_ids, _ = fuse([ranking(ids, scores)], mode=WEIGHTED, top_k=top_k)
+        expected = np.lexsort((ids, -scores))[:top_k]
+        assert fused_ids.tolist() == ids[expected].tolist()
+
+
+def test_rrf_tie_prefers_smaller_id():
+    # 7 и 5 стоят на первом и третьем местах в разных ранжированиях — счета равны
+    ids, _ = fuse([ranking([7, 3, 5], [3.0, 2.0, 1.0]), ranking([5, 3, 7], [3.0, 2.0, 1.0])], mode=RRF, top_k=1)
+    assert ids.tolist() == [5]
+
+
+@pytest.mark.parametrize("top_k", [0, -1])
+def test_non_positive_top_k_returns_empty(top_k):
+    ids, scores = fuse([ranking([1, 2], [1.0, 2.0])], top_k=top_k)
+    assert len(ids) == 0 and len(scores) == 0
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        fuse([ranking([1], [1.0])], mode="max")
+
+
+def test_id_space_keeps_known_rows_and_numbers_the_rest():
+    space = IdSpace(row_of={"a": 0, "b": 1}.get, size=2)
+    encoded = space.encode(["b", "x", "a", "x", "y"])
+    assert encoded.tolist() == [1, 2, 0, 2, 3]
+    assert space.extra_id(2) == "x" and space.extra_id(3) == "y" and space.extra_id(1) is None
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from src.constants import DOCS_COLLECTION_NAME, SQL_EXAMPLES_COLLECTION_NAME
+from src.utils.kb_loader import KnowledgeBaseLoader, sync_knowledge_base
+from src.utils.kb_loader.manifest import KBManifest
+
+DOCS_TEXT = "# Кадры\n\nОтдел кадров ведёт учёт сотрудников.\n\n## Зарплата\n\nЗарплата начисляется ежемесячно.\n"
+
+
+@pytest.fixture
+def loader(chroma_client, kb_path):
+    (kb_path / "docs" / "hr.md").write_text(DOCS_TEXT, encoding="utf-8")
+    (kb_path / "docs" / "stock.md").write_text("Склад хранит остатки материалов.\n", encoding="utf-8")
+    (kb_path / "sql_examples" / "salary.json").write_text(
+        json.dumps({"question": "Средняя зарплата", "sql": "SELECT avg(salary) FROM employees"}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    loader = KnowledgeBaseLoader(str(kb_path), "http://localhost:8000", "key", "folder")
+    yield loader
+    loader.parser.shutdown()
+
+
+def seed_legacy_ids(loader):
+    """Записи первой версии загрузчика: позиционные ID без манифеста"""
+    for collection_name, prefix, texts in (
+        (DOCS_COLLECTION_NAME, "doc", ["Отдел кадров ведёт учёт сотрудников.", "Склад хранит остатки материалов."]),
+        (SQL_EXAMPLES_COLLECTION_NAME, "sql", ["Средняя зарплата"]),
+    ):
+        loader.chroma_client.get_collection(collection_name).upsert(
+            ids=[f"{prefix}_{i}" for i in range(len(texts))],
+            documents=texts,
+            metadatas=[{"source": "legacy"} for _ in texts],
+            embeddings=loader.embedding_fn.embed_documents(texts),
+        )
+
+
+def collection_ids(loader, collection_name):
+    return set(loader.chroma_client.get_collection(collection_name).get(include=[])["ids"])
+
+
+def test_chunk_ids_are_stable(loader, kb_path):
+    path = str(kb_path / "docs" / "hr.md")
+    doc_id = KnowledgeBaseLoader.make_doc_id(DOCS_COLLECTION_NAME, "hr.md")
+    chunks = loader.load_path(path, DOCS_COLLECTION_NAME)
+    assert [chunk.metadata["chunk_id"] for chunk in chunks] == [f"{doc_id}#{n}" for n in range(len(chunks))]
+    assert [chunk.metadata["chunk_id"] for chunk in loader.load_path(path, DOCS_COLLECTION_NAME)] == \
+        [chunk.metadata["chunk_id"] for chunk in chunks]
+    assert doc_id != KnowledgeBaseLoader.make_doc_id(DOCS_COLLECTION_NAME, "stock.md")
+
+
+def test_partial_sync_keeps_legacy_ids_and_manifest_absent(loader, kb_path):
+    seed_legacy_ids(loader)
+
+    stats = sync_knowledge_base(loader, relpaths=["docs/hr.md"])
+
+    assert stats["added"] == 1
+    # Остальные файлы частичная синхронизация не записывала — их старые записи должны остаться
+    assert {"doc_0", "doc_1"} <= collection_ids(loader, DOCS_COLLECTION_NAME)
+    assert "sql_0" in collection_ids(loader, SQL_EXAMPLES_COLLECTION_NAME)
+    assert not os.path.exists(KBManifest.load(str(kb_path)).path)
+
+
+def test_full_sync_migrates_legacy_ids(loader, kb_path):
+    seed_legacy_ids(loader)
+    sync_knowledge_base(loader, relpaths=["docs/hr.md"])
+
+    stats = sync_knowledge_base(loader)
+
+    docs_ids = collection_ids(loader, DOCS_COLLECTION_NAME)
+    assert not {"doc_0", "doc_1"} & docs_ids
+    assert "sql_0" not in collection_ids(loader, SQL_EXAMPLES_COLLECTION_NAME)
+    manifest = KBManifest.load(str(kb_path))
+    assert set(manifest.entries) == {"docs/hr.md", "docs/stock.md", "sql_examples/salary.json"}
+    assert docs_ids == {chunk_id for relpath in ("docs/hr.md", "docs/stock.md") for chunk_id in manifest.get(relpath)["chunk_ids"]}
+    assert stats["added"] == 3
+
+    # Повторная полная синхронизация ничего не меняет
+    assert sync_knowledge_base(loader)["unchanged"] == 3
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from src.utils.vector_index import CompressedVectors
+
+
+def brute_force(vectors, query, top_k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return np.argsort(distances, kind="stable")[:top_k]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_rescored_search_matches_brute_force(dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(2000, 64)).astype(np.float32)
+    compressed = CompressedVectors.build(vectors, dtype=dtype)
+    for query in rng.normal(size=(20, 64)).astype(np.float32):
+        rows, distances = compressed.search(query, top_k=10)
+        assert rows.tolist() == brute_force(vectors, query, 10).tolist()
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_candidates_mask_excludes_rows():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(100, 16)).astype(np.float32)
+    compressed = CompressedVectors.build(vectors, dtype="int8")
+    candidates = np.ones(len(vectors), dtype=bool)
+    candidates[::2] = False
+    rows, _ = compressed.search(vectors[0], top_k=10, candidates=candidates)
+    assert len(rows) == 10 and all(row % 2 == 1 for row in rows)
+
+
+def test_empty_and_non_positive_top_k():
+    compressed = CompressedVectors.build(np.zeros((3, 4), dtype=np.float32))
+    assert len(compressed.search(np.zeros(4), top_k=0)[0]) == 0
@@ -0,0 +1,47 @@
+from src.utils.sql_template_cache import SQLTemplateCache, SQLTemplate, canonicalize, question_constraints
+
+
+def test_same_template_renders_new_literals():
+    cache = SQLTemplateCache()
+    assert cache.put(
+        "Сотрудники с зарплатой больше 100000 в отделе «Продажи»",
+        "SELECT name FROM employees WHERE salary > 100000 AND dept = 'Продажи'",
+    )
+    sql = cache.get("Сотрудники с зарплатой больше 150\u00a0000 в отделе «Склад»")
+    assert sql == "SELECT name FROM employees WHERE salary > 150000 AND dept = 'Склад'"
+    assert cache.get("Сотрудники с зарплатой меньше 150000 в отделе «Склад»") is None
+
+
+def test_string_literals_are_escaped():
+    key, slots = canonicalize("Заказы клиента «Иванов»")
+    template = SQLTemplate.build("SELECT * FROM orders WHERE client LIKE '%Иванов%'", slots)
+    _, other = canonicalize("Заказы клиента «О'Брайен»")
+    assert template.render(other) == "SELECT * FROM orders WHERE client LIKE '%О''Брайен%'"
+
+
+def test_dates_render_in_iso():
+    _, slots = canonicalize("Заказы после 01.02.2024")
+    template = SQLTemplate.build("SELECT * FROM orders WHERE created_at > '2024-02-01'", slots)
+    _, other = canonicalize("Заказы после 15.03.2025")
+    assert template.render(other) == "SELECT * FROM orders WHERE created_at > '2025-03-15'"
+
+
+def test_plain_space_separates_numbers():
+    _, slots = canonicalize("В отделе 5 100 сотрудников")
+    assert [slot.value for slot in slots] == ["5", "100"]
+    _, slots = canonicalize("Зарплата больше 150 000")
+    assert [slot.value for slot in slots] == ["150000"]
+
+
+def test_ambiguous_literals_are_not_templated():
+    _, slots = canonicalize("Товары дороже 100")
+    assert SQLTemplate.build("SELECT * FROM goods WHERE price > 100 OR old_price > 100", slots) is None
+    assert SQLTemplate.build("SELECT * FROM goods", slots) is None
+
+
+def test_question_constraints_keep_direction_negation_and_literals():
+    base = question_constraints("Сотрудники с зарплатой больше 100000")
+    assert base == question_constraints("Покажи работников, у которых зарплата больше 100000")
+    assert base != question_constraints("Сотрудники с зарплатой меньше 100000")
+    assert base != question_constraints("Сотрудники с зарплатой не больше 100000")
+    assert base != question_constraints("Сотрудники с зарплатой больше 200000")
@@ -0,0 +1,45 @@
+import pytest
+
+from src.utils.text_chunker import TextChunker
+
+
+MARKDOWN = """# Кадры
+
+Отдел кадров ведёт учёт сотрудников.
+
+## Зарплата
+
+Зарплата начисляется ежемесячно. Премия выплачивается раз в квартал.
+
+| Должность | Оклад |
+|-----------|-------|
+| Инженер   | 100   |
+| Техник    | 80    |
+"""
+
+
+def split(text, **kwargs):
+    return list(TextChunker(**kwargs).split(text.splitlines(keepends=True)))
+
+
+def test_headings_prefix_section_chunks():
+    chunks = split(MARKDOWN, chunk_size=400, chunk_overlap=50)
+    salary = [chunk for chunk in chunks if "начисляется" in chunk]
+    assert salary and salary[0].startswith("# Кадры\n## Зарплата")
+
+
+def test_split_is_deterministic():
+    # ID чанков — позиционные (`{doc_id}#{n}`), поэтому разбиение не должно зависеть от запуска
+    assert split(MARKDOWN * 20, chunk_size=60, chunk_overlap=10) == split(MARKDOWN * 20, chunk_size=60, chunk_overlap=10)
+
+
+def test_tables_keep_header_when_split():
+    rows = "".join(f"| Сотрудник {i} | {i * 10} |\n" for i in range(200))
+    chunks = split("| Имя | Оклад |\n|-----|-------|\n" + rows, chunk_size=80, chunk_overlap=10)
+    assert len(chunks) > 1
+    assert all(chunk.startswith("| Имя | Оклад |") for chunk in chunks)
+
+
+def test_overlap_must_be_smaller_than_size():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=50, chunk_overlap=50)